@@ -14,5 +14,6 @@ print()
 
 from .libs.XAsyncSockets import *
 from .libs.urlUtils 	 import *
+from .libs.fileCache 	 import *
 from .webRoute     		 import *
 from .microWebSrv2 		 import *
@@ -103,10 +103,8 @@ class HttpRequest :
                             self._response.ReturnNotFound()
                     elif self._method == 'OPTIONS' :
                         if self._mws2.CORSAllowAll :
-                            self._response.SetHeader( 'Access-Control-Allow-Methods',     '*'     )
-                            self._response.SetHeader( 'Access-Control-Allow-Headers',     '*'     )
-                            self._response.SetHeader( 'Access-Control-Allow-Credentials', 'true'  )
-                            self._response.SetHeader( 'Access-Control-Max-Age',           '86400' )
+                            for name, value in HttpResponse._CORS_PREFLIGHT_HEADERS.items() :
+                                self._response.SetHeader(name, value)
                         self._response.ReturnOk()
                     else :
                         self._response.ReturnMethodNotAllowed()
@@ -139,8 +137,8 @@ class HttpRequest :
                 if cntLen <= self._mws2._maxContentLen :
                     def onContentRecv(xasCli, content, arg) :
                         self._content = content
-                        self._routeRequest()
-                        self._content = None
+                        if not self._routeRequest() :
+                            self._content = None
                     try :
                         self._xasCli.AsyncRecvData( size       = cntLen,
                                                     onDataRecv = onContentRecv,
@@ -162,9 +160,24 @@ class HttpRequest :
         try :
             currentResp = self._response
             if self._routeResult.Args :
-                self._routeResult.Handler(self._mws2, self, self._routeResult.Args)
+                coro = self._routeResult.Handler(self._mws2, self, self._routeResult.Args)
             else :
-                self._routeResult.Handler(self._mws2, self)
+                coro = self._routeResult.Handler(self._mws2, self)
+            if coro is not None and hasattr(coro, 'send') :
+                # An "async def" handler, it runs on the asyncio loop later
+                # so the content is copied out of the receive buffer slot,
+                if self._content is not None :
+                    self._content = bytes(self._content)
+                routeCoro = self._routeCoroutine(coro, currentResp, self._routeResult, self._content)
+                if self._mws2._postToLoop(routeCoro) :
+                    return True
+                routeCoro.close()
+                coro.close()
+                self._mws2.Log( 'Route %s is a coroutine and requires StartManagedAsync().'
+                                % self._routeResult,
+                                self._mws2.ERROR )
+                currentResp.ReturnInternalServerError()
+                return False
             if not currentResp.HeadersSent :
                 self._mws2.Log( 'No response was sent from route %s.'
                                 % self._routeResult,
@@ -175,6 +188,27 @@ class HttpRequest :
                             % (self._routeResult, ex),
                             self._mws2.ERROR )
             currentResp.ReturnInternalServerError()
+        return False
+
+    # ------------------------------------------------------------------------
+
+    async def _routeCoroutine(self, coro, currentResp, routeResult, content) :
+        try :
+            await coro
+            if not currentResp.HeadersSent :
+                self._mws2.Log( 'No response was sent from route %s.'
+                                % routeResult,
+                                self._mws2.WARNING )
+                currentResp.ReturnNotImplemented()
+        except Exception as ex :
+            self._mws2.Log( 'Exception raised from route %s: %s'
+                            % (routeResult, ex),
+                            self._mws2.ERROR )
+            currentResp.ReturnInternalServerError()
+        finally :
+            # Unless a next request on the connection has set its own,
+            if self._content is content :
+                self._content = None
 
     # ------------------------------------------------------------------------
 
@@ -212,6 +246,25 @@ class HttpRequest :
 
     # ------------------------------------------------------------------------
 
+    def AcceptsEncoding(self, encoding) :
+        if not isinstance(encoding, str) or len(encoding) == 0 :
+            raise ValueError('"encoding" must be a not empty string.')
+        encoding = encoding.lower()
+        for enc in self.AcceptEncodings :
+            params = enc.split(';')
+            if params[0].strip().lower() == encoding :
+                for p in params[1:] :
+                    p = p.strip()
+                    if p.startswith('q=') :
+                        try :
+                            return float(p[2:]) > 0
+                        except :
+                            return False
+                return True
+        return False
+
+    # ------------------------------------------------------------------------
+
     def CheckBasicAuth(self, username, password) :
         if not isinstance(username, str) :
             raise ValueError('"username" must be a string.')
@@ -4,9 +4,31 @@ The MIT License (MIT)
 Copyright © 2019 Jean-Christophe Bos & HC² (www.hc2.fr)
 """
 
-from   os   import stat
+from   time import gmtime
 import json
 
+# ============================================================================
+# ===( _MemoryStream )========================================================
+# ============================================================================
+
+class _MemoryStream :
+
+    def __init__(self, buf) :
+        self._buf = buf
+        self._pos = 0
+
+    def readinto(self, b) :
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos+n]
+        self._pos += n
+        return n
+
+    def seek(self, pos) :
+        self._pos = pos
+
+    def close(self) :
+        self._buf = None
+
 # ============================================================================
 # ===( HttpResponse )=========================================================
 # ============================================================================
@@ -108,6 +130,23 @@ class HttpResponse :
     </html>
     """
 
+    _HTTP_DATE_DAYS   = ( 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun' )
+    _HTTP_DATE_MONTHS = ( 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec' )
+
+    _CACHE_CONTROL_IMMUTABLE = 'public, max-age=31536000, immutable'
+    _CACHE_CONTROL_REVALIDATE = 'no-cache'
+
+    _CORS_PREFLIGHT_HEADERS = {
+        'Access-Control-Allow-Methods'     : '*',
+        'Access-Control-Allow-Headers'     : '*',
+        'Access-Control-Allow-Credentials' : 'true',
+        'Access-Control-Max-Age'           : '86400'
+    }
+
+    _CHUNK_TRAILER = b'\r\n'
+    _CHUNK_LAST    = b'0\r\n\r\n'
+
     # ------------------------------------------------------------------------
 
     def __init__(self, microWebSrv2, request) :
@@ -116,13 +155,18 @@ class HttpResponse :
         self._xasCli          = request.XAsyncTCPClient
         self._headers         = microWebSrv2.DefaultHeaders
         self._allowCaching    = False
+        self._cacheControl    = None
         self._acAllowOrigin   = None
         self._contentType     = None
         self._contentCharset  = None
         self._contentLength   = 0
         self._stream          = None
+        self._streamRemaining = None
         self._sendingBuf      = None
+        self._chunkHdrLen     = None
         self._hdrSent         = False
+        self._sent            = False
+        self._sentEvent       = None
         self._onSent          = None
 
     # ------------------------------------------------------------------------
@@ -136,43 +180,150 @@ class HttpResponse :
 
     # ------------------------------------------------------------------------
 
+    @staticmethod
+    def _httpDate(sec) :
+        t = gmtime(sec)
+        return '%s, %02d %s %04d %02d:%02d:%02d GMT' % ( HttpResponse._HTTP_DATE_DAYS[t[6]],
+                                                         t[2],
+                                                         HttpResponse._HTTP_DATE_MONTHS[t[1]-1],
+                                                         t[0], t[3], t[4], t[5] )
+
+    # ------------------------------------------------------------------------
+
+    @staticmethod
+    def _isFingerprinted(filename) :
+        # Build outputs such as "chunk-ZLVXN7CX.js" carry a content hash in
+        # their name and never change under the same name.
+        name = filename.rsplit('/', 1)[-1].split('.', 1)[0]
+        if '-' in name :
+            h = name.rsplit('-', 1)[1]
+            return ( len(h) >= 8 and \
+                     all(c.isdigit() or c.isupper() for c in h) )
+        return False
+
+    # ------------------------------------------------------------------------
+
+    def _getRange(self, size) :
+        # Returns (first, last) for a single satisfiable byte range, None
+        # when the full content must be sent and False when unsatisfiable.
+        rng = self._request.GetHeader('Range')
+        if not rng.startswith('bytes=') or ',' in rng :
+            return None
+        ifRange = self._request.GetHeader('If-Range')
+        if ifRange and ifRange != self._headers.get('ETag') \
+                   and ifRange != self._headers.get('Last-Modified') :
+            return None
+        try :
+            first, last = rng[6:].split('-', 1)
+            if not first.strip() :
+                first = size - int(last)
+                last  = size - 1
+                if first == size :
+                    return False
+                if first < 0 :
+                    first = 0
+            else :
+                first = int(first)
+                last  = int(last) if last.strip() else size - 1
+                if last >= size :
+                    last = size - 1
+        except ValueError :
+            return None
+        if first > last or first >= size :
+            return False
+        return (first, last)
+
+    # ------------------------------------------------------------------------
+
+    def _isNotModified(self, etag, lastModified) :
+        inm = self._request.GetHeader('If-None-Match')
+        if inm :
+            for tag in inm.split(',') :
+                tag = tag.strip()
+                if tag == '*' or tag == etag or tag == 'W/' + etag :
+                    return True
+            return False
+        return (self._request.GetHeader('If-Modified-Since') == lastModified)
+
+    # ------------------------------------------------------------------------
+
+    def _readStreamData(self) :
+        buf = self._sendingBuf
+        if self._streamRemaining is not None :
+            if self._streamRemaining < len(buf) :
+                buf = buf[:self._streamRemaining]
+            n = self._stream.readinto(buf)
+            self._streamRemaining -= n
+        else :
+            n = self._stream.readinto(buf)
+        if n < len(self._sendingBuf) or self._streamRemaining == 0 :
+            self._closeStream()
+        return n
+
+    # ------------------------------------------------------------------------
+
+    def _readStreamChunk(self) :
+        # The chunk is framed in place : its size header is reserved at the
+        # start of the sending buffer and written once the data is read,
+        # zero padded to a fixed width, then comes the CRLF trailer and, for
+        # the last chunk, the final zero length chunk,
+        buf    = self._sendingBuf
+        hdrLen = self._chunkHdrLen
+        maxLen = len(buf) - hdrLen - len(HttpResponse._CHUNK_TRAILER) \
+                                   - len(HttpResponse._CHUNK_LAST)
+        n = self._stream.readinto(buf[hdrLen:hdrLen+maxLen])
+        if n < maxLen :
+            self._closeStream()
+        size         = '%x' % n
+        buf[:hdrLen] = ('0' * (hdrLen - 2 - len(size)) + size + '\r\n').encode()
+        end          = hdrLen + n
+        buf[end:end+2] = HttpResponse._CHUNK_TRAILER
+        end += 2
+        if n and not self._stream :
+            buf[end:end+5] = HttpResponse._CHUNK_LAST
+            end += 5
+        return end
+
+    # ------------------------------------------------------------------------
+
+    def _onFileSent(self, xasCli, arg) :
+        self._closeStream()
+        self._onDataSent(xasCli, arg)
+
+    # ------------------------------------------------------------------------
+
+    def _closeStream(self) :
+        try :
+            self._stream.close()
+        except :
+            pass
+        self._stream = None
+
+    # ------------------------------------------------------------------------
+
     def _onDataSent(self, xasCli, arg) :
+        # Sends one piece of the stream each time the previous one is sent,
+        # a chunk being framed in the same buffer as its data,
+        size = 0
         if self._stream :
             try :
-                n = self._stream.readinto(self._sendingBuf)
-                if n < len(self._sendingBuf) :
-                    self._stream.close()
-                    self._stream     = None
-                    self._sendingBuf = self._sendingBuf[:n]
+                if self._contentLength :
+                    size = self._readStreamData()
+                else :
+                    size = self._readStreamChunk()
             except :
                 self._xasCli.Close()
                 self._mws2.Log( 'Stream cannot be read for request "%s".'
                                 % self._request._path,
                                 self._mws2.ERROR )
                 return
-        if self._sendingBuf :
-            if self._contentLength :
-                self._xasCli.AsyncSendSendingBuffer( size       = len(self._sendingBuf),
-                                                     onDataSent = self._onDataSent )
-                if not self._stream :
-                    self._sendingBuf = None
-            else :
-                def onChunkHdrSent(xasCli, arg) :
-                    def onChunkDataSent(xasCli, arg) :
-                        def onLastChunkSent(xasCli, arg) :
-                            self._xasCli.AsyncSendData(b'0\r\n\r\n', onDataSent=self._onDataSent)
-                        if self._stream :
-                            onDataSent = self._onDataSent
-                        else :
-                            self._sendingBuf = None
-                            onDataSent       = onLastChunkSent
-                        self._xasCli.AsyncSendData(b'\r\n', onDataSent=onDataSent)
-                    self._xasCli.AsyncSendSendingBuffer( size       = len(self._sendingBuf),
-                                                         onDataSent = onChunkDataSent )
-                data = ('%x\r\n' % len(self._sendingBuf)).encode()
-                self._xasCli.AsyncSendData(data, onDataSent=onChunkHdrSent)
+        if size :
+            self._xasCli.AsyncSendSendingBuffer( size       = size,
+                                                 onDataSent = self._onDataSent )
         else :
             self._xasCli.OnClosed = None
+            self._xasCli.ResizeSendingBuffer(0)
+            self._setSent()
             if self._keepAlive :
                 self._request._waitForRecvRequest()
             else :
@@ -188,26 +339,58 @@ class HttpResponse :
 
     def _onClosed(self, xasCli, closedReason) :
         if self._stream :
-            try :
-                self._stream.close()
-            except :
-                pass
-            self._stream = None
+            self._closeStream()
         self._sendingBuf = None
+        self._setSent()
+
+    # ------------------------------------------------------------------------
+
+    def _setSent(self) :
+        self._sent = True
+        if self._sentEvent :
+            self._mws2._postToLoop(self._sentEvent.set)
+
+    # ------------------------------------------------------------------------
+
+    async def _waitSent(self) :
+        # The event is set from the pool's thread through the asyncio loop,
+        # the connection being closed also ends the wait,
+        if self._sent :
+            return
+        self._sentEvent = self._mws2._asyncio.Event()
+        if self._xasCli.OnClosed is None :
+            self._xasCli.OnClosed = self._onClosed
+        if not self._sent and self._xasCli.GetSocketObj().fileno() != -1 :
+            await self._sentEvent.wait()
+
+    # ------------------------------------------------------------------------
+
+    def __await__(self) :
+        # "await response.ReturnOk()" in an "async def" route handler waits
+        # until the response is entirely sent,
+        coro = self._waitSent()
+        return coro.__await__() if hasattr(coro, '__await__') else coro
+
+    __iter__ = __await__
+
+    # ------------------------------------------------------------------------
+
+    def _logResponse(self, code, reason) :
+        self._mws2.Log( 'From %s:%s %s%s %s >> [%s] %s',
+                        self._mws2.DEBUG,
+                        self._xasCli.CliAddr[0],
+                        self._xasCli.CliAddr[1],
+                        ('SSL-' if self.IsSSL else ''),
+                        self._request._method,
+                        self._request._path,
+                        code,
+                        reason )
 
     # ------------------------------------------------------------------------
 
     def _makeBaseResponseHdr(self, code) :
         reason = self._RESPONSE_CODES.get(code, ('Unknown reason', ))[0]
-        self._mws2.Log( 'From %s:%s %s%s %s >> [%s] %s'
-                        % ( self._xasCli.CliAddr[0],
-                            self._xasCli.CliAddr[1],
-                            ('SSL-' if self.IsSSL else ''),
-                            self._request._method,
-                            self._request._path,
-                            code,
-                            reason ),
-                        self._mws2.DEBUG )
+        self._logResponse(code, reason)
         if self._mws2.AllowAllOrigins :
             self._acAllowOrigin = self._request.Origin
         if self._acAllowOrigin :
@@ -221,17 +404,46 @@ class HttpResponse :
 
     # ------------------------------------------------------------------------
 
+    def _isKeepAliveFor(self, code) :
+        if (code >= 200 and code < 300) or code == 304 :
+            return self._request.IsKeepAlive
+        return False
+
+    # ------------------------------------------------------------------------
+
+    def _getCannedKey(self, code) :
+        # A response without content (error pages, CORS preflight, ...) only
+        # depends on what is in this key, so it is serialized once and then
+        # sent as is from the server's canned responses, it is not canned
+        # (None) when headers other than the default and preflight ones are
+        # set (ETag, Last-Modified, Content-Range, Vary, Location, ...),
+        defaults = self._mws2._defaultHeaders
+        for name, value in self._headers.items() :
+            if defaults.get(name) != value and \
+               HttpResponse._CORS_PREFLIGHT_HEADERS.get(name) != value :
+                return None
+        origin = self._request.Origin if self._mws2.AllowAllOrigins \
+                 else self._acAllowOrigin
+        return ( code,
+                 self._request._method,
+                 self._isKeepAliveFor(code),
+                 origin,
+                 self._allowCaching,
+                 self._cacheControl,
+                 self._contentCharset )
+
+    # ------------------------------------------------------------------------
+
     def _makeResponseHdr(self, code) :
-        if code >= 200 and code < 300 :
-            self._keepAlive = self._request.IsKeepAlive
-        else :
-            self._keepAlive = False
+        self._keepAlive = self._isKeepAliveFor(code)
         if self._keepAlive :
             self.SetHeader('Connection', 'Keep-Alive')
             self.SetHeader('Keep-Alive', 'timeout=%s' % self._mws2._timeoutSec)
         else :
             self.SetHeader('Connection', 'Close')
-        if self._allowCaching :
+        if self._cacheControl :
+            self.SetHeader('Cache-Control', self._cacheControl)
+        elif self._allowCaching :
             self.SetHeader('Cache-Control', 'public, max-age=31536000')
         else :
             self.SetHeader('Cache-Control', 'no-cache, no-store, must-revalidate')
@@ -253,12 +465,14 @@ class HttpResponse :
             self._mws2.Log( 'Response headers already sent for request "%s".'
                             % self._request._path,
                             self._mws2.WARNING )
-            return
+            return self
         self.SetHeader('Connection', 'Upgrade')
         self.SetHeader('Upgrade', upgrade)
         data = self._makeBaseResponseHdr(101)
         self._xasCli.AsyncSendData(data)
         self._hdrSent = True
+        self._sent    = True
+        return self
 
     # ------------------------------------------------------------------------
 
@@ -267,6 +481,14 @@ class HttpResponse :
             raise ValueError('"code" must be a positive integer.')
         if not hasattr(stream, 'readinto') or not hasattr(stream, 'close') :
             raise ValueError('"stream" must be a readable buffer protocol object.')
+        self._returnStream(code, stream)
+        return self
+
+    # ------------------------------------------------------------------------
+
+    def _returnStream(self, code, stream, isFile=False) :
+        # When isFile is True, the stream is a file opened from disk that the
+        # kernel can send by itself if the client socket allows it,
         if self._hdrSent :
             self._mws2.Log( 'Response headers already sent for request "%s".'
                             % self._request._path,
@@ -276,10 +498,41 @@ class HttpResponse :
             except :
                 pass
             return
+        if code == 200 and self._contentLength and hasattr(stream, 'seek') :
+            size = self._contentLength
+            self.SetHeader('Accept-Ranges', 'bytes')
+            rng = self._getRange(size)
+            if rng is False :
+                try :
+                    stream.close()
+                except :
+                    pass
+                self.SetHeader('Content-Range', 'bytes */%s' % size)
+                self._headers.pop('Content-Encoding', None)
+                self._contentType   = None
+                self._contentLength = 0
+                self.Return(416)
+                return
+            if rng :
+                stream.seek(rng[0])
+                code                  = 206
+                self._contentLength   = rng[1] - rng[0] + 1
+                self._streamRemaining = self._contentLength
+                self.SetHeader('Content-Range', 'bytes %s-%s/%s' % (rng[0], rng[1], size))
+        fileOffset = None
         if self._request._method != 'HEAD' :
             self._stream          = stream
-            self._sendingBuf      = memoryview(self._xasCli.SendingBuffer)
             self._xasCli.OnClosed = self._onClosed
+            if isFile and self._contentLength and self._xasCli.CanSendFile :
+                try :
+                    stream.fileno()
+                    fileOffset = stream.tell()
+                except :
+                    pass
+            if fileOffset is None :
+                if not self._contentLength or self._contentLength > len(self._xasCli.SendingBuffer) :
+                    self._xasCli.ResizeSendingBuffer(self._contentLength)
+                self._sendingBuf = memoryview(self._xasCli.SendingBuffer)
         else :
             try :
                 stream.close()
@@ -289,8 +542,17 @@ class HttpResponse :
             self._contentType = 'application/octet-stream'
         if not self._contentLength :
             self.SetHeader('Transfer-Encoding', 'chunked')
+            if self._sendingBuf is not None :
+                self._chunkHdrLen = len('%x' % len(self._sendingBuf)) + 2
         data = self._makeResponseHdr(code)
-        self._xasCli.AsyncSendData(data, onDataSent=self._onDataSent)
+        if fileOffset is not None :
+            self._xasCli.AsyncSendData(data)
+            self._xasCli.AsyncSendFile( file       = stream,
+                                        offset     = fileOffset,
+                                        size       = self._contentLength,
+                                        onDataSent = self._onFileSent )
+        else :
+            self._xasCli.AsyncSendData(data, onDataSent=self._onDataSent)
         self._hdrSent = True
 
     # ------------------------------------------------------------------------
@@ -302,9 +564,25 @@ class HttpResponse :
             self._mws2.Log( 'Response headers already sent for request "%s".'
                             % self._request._path,
                             self._mws2.WARNING )
-            return
+            return self
+        if code == 204 or code == 304 :
+            # No message body is allowed with these codes.
+            self._contentLength = 0
+            data = self._makeResponseHdr(code)
+            self._xasCli.AsyncSendData(data, onDataSent=self._onDataSent)
+            self._hdrSent = True
+            return self
+        cannedKey = None
         if not content :
-            respCode          = self._RESPONSE_CODES.get(code, ('Unknown reason', ''))
+            respCode  = self._RESPONSE_CODES.get(code, ('Unknown reason', ''))
+            cannedKey = self._getCannedKey(code)
+            data      = self._mws2._getCannedResponse(cannedKey) if cannedKey else None
+            if data :
+                self._keepAlive = cannedKey[2]
+                self._logResponse(code, respCode[0])
+                self._xasCli.AsyncSendData(data, onDataSent=self._onDataSent)
+                self._hdrSent = True
+                return self
             self._contentType = 'text/html'
             content           = self._CODE_CONTENT_TMPL % { 'code'    : code,
                                                             'reason'  : respCode[0],
@@ -320,8 +598,11 @@ class HttpResponse :
         data = self._makeResponseHdr(code)
         if self._request._method != 'HEAD' :
             data += bytes(content)
+        if cannedKey :
+            self._mws2._setCannedResponse(cannedKey, data)
         self._xasCli.AsyncSendData(data, onDataSent=self._onDataSent)
         self._hdrSent = True
+        return self
 
     # ------------------------------------------------------------------------
 
@@ -334,16 +615,19 @@ class HttpResponse :
         except :
             raise ValueError('"obj" cannot be converted into JSON format.')
         self.Return(code, content)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnOk(self, content=None) :
         self.Return(200, content)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnOkJSON(self, obj) :
         self.ReturnJSON(200, obj)
+        return self
 
     # ------------------------------------------------------------------------
 
@@ -352,28 +636,61 @@ class HttpResponse :
             raise ValueError('"filename" must be a not empty string.')
         if attachmentName is not None and not isinstance(attachmentName, str) :
             raise ValueError('"attachmentName" must be a string or None.')
-        try :
-            size = stat(filename)[6]
-        except :
+        st = self._mws2.StatPhysicalPath(filename)
+        if st is None :
             self.ReturnNotFound()
-            return
-        try :
-            file = open(filename, 'rb')
-        except :
-            self.ReturnForbidden()
-            return
+            return self
+        if not self._contentType :
+            self._contentType = self._mws2.GetMimeTypeFromFilename(filename)
+        if not self._cacheControl :
+            # Only fingerprinted files are kept without revalidation, the
+            # others are revalidated with the validators below (never with
+            # "no-store" that would make them useless),
+            if self._allowCaching and HttpResponse._isFingerprinted(filename) :
+                self._cacheControl = HttpResponse._CACHE_CONTROL_IMMUTABLE
+            else :
+                self._cacheControl = HttpResponse._CACHE_CONTROL_REVALIDATE
+        physPath = filename
+        encoding = ''
+        if self._request.AcceptsEncoding('gzip') :
+            gzSt = self._mws2.StatPhysicalPath(filename + '.gz')
+            if gzSt is not None :
+                st       = gzSt
+                physPath = filename + '.gz'
+                encoding = '-gz'
+                self.SetHeader('Content-Encoding', 'gzip')
+        self.SetHeader('Vary', 'Accept-Encoding')
+        etag         = '"%x-%x%s"' % (st[6], st[8], encoding)
+        lastModified = HttpResponse._httpDate(st[8])
+        self.SetHeader('ETag', etag)
+        self.SetHeader('Last-Modified', lastModified)
+        if self._isNotModified(etag, lastModified) :
+            self.ReturnNotModified()
+            return self
+        file = None
+        if self._mws2._fileCache is not None :
+            with self._mws2._fileCacheLock :
+                data = self._mws2._fileCache.Get(physPath, st[8], st[6])
+            if data is not None :
+                file = _MemoryStream(data)
+        if file is None :
+            try :
+                file = open(physPath, 'rb')
+            except :
+                self.ReturnForbidden()
+                return self
         if attachmentName :
             cd = 'attachment; filename="%s"' % attachmentName.replace('"', "'")
             self.SetHeader('Content-Disposition', cd)
-        if not self._contentType :
-            self._contentType = self._mws2.GetMimeTypeFromFilename(filename)
-        self._contentLength = size
-        self.ReturnStream(200, file)
+        self._contentLength = st[6]
+        self._returnStream(200, file, isFile=(type(file) is not _MemoryStream))
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnNotModified(self) :
         self.Return(304)
+        return self
 
     # ------------------------------------------------------------------------
 
@@ -382,11 +699,13 @@ class HttpResponse :
             raise ValueError('"location" must be a not empty string.')
         self.SetHeader('Location', location)
         self.Return(307)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnBadRequest(self) :
         self.Return(400)
+        return self
 
     # ------------------------------------------------------------------------
 
@@ -400,11 +719,13 @@ class HttpResponse :
             wwwAuth += (' realm="%s"' % realm.replace('"', "'")) if realm else ''
         self.SetHeader('WWW-Authenticate', wwwAuth)
         self.Return(401)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnForbidden(self) :
         self.Return(403)
+        return self
 
     # ------------------------------------------------------------------------
 
@@ -413,41 +734,49 @@ class HttpResponse :
             self.ReturnRedirect(self._mws2._notFoundURL)
         else :
             self.Return(404)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnMethodNotAllowed(self) :
         self.Return(405)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnEntityTooLarge(self) :
         self.Return(413)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnInternalServerError(self) :
         self.Return(500)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnNotImplemented(self) :
         self.Return(501)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnServiceUnavailable(self) :
         self.Return(503)
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnBasicAuthRequired(self) :
         self.ReturnUnauthorized('Basic')
+        return self
 
     # ------------------------------------------------------------------------
 
     def ReturnBearerAuthRequired(self) :
         self.ReturnUnauthorized('Bearer')
+        return self
 
     # ------------------------------------------------------------------------
 
@@ -481,6 +810,18 @@ class HttpResponse :
 
     # ------------------------------------------------------------------------
 
+    @property
+    def CacheControl(self) :
+        return self._cacheControl
+
+    @CacheControl.setter
+    def CacheControl(self, value) :
+        if value is not None and not isinstance(value, str) :
+            raise ValueError('"CacheControl" must be a string or None.')
+        self._cacheControl = value
+
+    # ------------------------------------------------------------------------
+
     @property
     def AccessControlAllowOrigin(self) :
         return self._acAllowOrigin
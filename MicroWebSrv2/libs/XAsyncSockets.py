@@ -4,12 +4,23 @@ Copyright © 2019 Jean-Christophe Bos & HC² (www.hc2.fr)
 """
 
 
-from   _thread  import allocate_lock, start_new_thread, stack_size
+from   _thread  import allocate_lock, start_new_thread, stack_size, get_ident
 from   time     import sleep
 from   select   import select
+import select   as     selectModule
 import socket
 import ssl
 
+try :
+    from heapq import heapify, heappop, heappush
+except :
+    from uheapq import heapify, heappop, heappush
+
+try :
+    from os import sendfile
+except :
+    sendfile = None
+
 try :
     from time import perf_counter
 except :
@@ -17,6 +28,188 @@ except :
     def perf_counter() :
         return ticks_ms() / 1000
 
+# ============================================================================
+# ===( XPoller )==============================================================
+# ============================================================================
+
+class XPoller :
+
+    EVENT_READ  = 0x01
+    EVENT_WRITE = 0x02
+    EVENT_ERROR = 0x04
+
+    # True when changed events are only seen by the next Poll call.
+    NeedsWakeUp = True
+
+    @staticmethod
+    def Create() :
+        if hasattr(selectModule, 'epoll') :
+            return XPollerEpoll()
+        if hasattr(selectModule, 'poll') :
+            return XPollerPoll()
+        return XPoller()
+
+    # ------------------------------------------------------------------------
+
+    def __init__(self) :
+        # The base class polls with select, subclasses use poll or epoll.
+        self._events = { }
+
+    # ------------------------------------------------------------------------
+
+    def SetEvents(self, socket, events) :
+        # Registers socket for events (EVENT_READ | EVENT_WRITE),
+        # or unregisters it when events is 0.
+        if events :
+            self._events[socket] = events
+        elif socket in self._events :
+            del self._events[socket]
+
+    # ------------------------------------------------------------------------
+
+    def Poll(self, timeoutSec) :
+        # Returns a list of (socket, events) with EVENT_READ, EVENT_WRITE
+        # and EVENT_ERROR flags.
+        rdList = [ ]
+        wrList = [ ]
+        for socket, events in list(self._events.items()) :
+            if events & XPoller.EVENT_READ :
+                rdList.append(socket)
+            if events & XPoller.EVENT_WRITE :
+                wrList.append(socket)
+        rd, wr, ex = select(rdList, wrList, rdList, timeoutSec)
+        result = { }
+        for socket in rd :
+            result[socket] = XPoller.EVENT_READ
+        for socket in wr :
+            result[socket] = result.get(socket, 0) | XPoller.EVENT_WRITE
+        for socket in ex :
+            result[socket] = result.get(socket, 0) | XPoller.EVENT_ERROR
+        return list(result.items())
+
+    # ------------------------------------------------------------------------
+
+    def Clear(self) :
+        for socket in list(self._events) :
+            self.SetEvents(socket, 0)
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def Count(self) :
+        return len(self._events)
+
+# ============================================================================
+# ===( XPollerPoll )==========================================================
+# ============================================================================
+
+class XPollerPoll(XPoller) :
+
+    _POLLIN   = getattr(selectModule, 'POLLIN',   0x001)
+    _POLLOUT  = getattr(selectModule, 'POLLOUT',  0x004)
+    _POLLERR  = getattr(selectModule, 'POLLERR',  0x008)
+    _POLLHUP  = getattr(selectModule, 'POLLHUP',  0x010)
+    _POLLNVAL = getattr(selectModule, 'POLLNVAL', 0x020)
+
+    def __init__(self) :
+        super().__init__()
+        self._poller  = self._createPoller()
+        self._sockets = { }
+
+    # ------------------------------------------------------------------------
+
+    def _createPoller(self) :
+        return selectModule.poll()
+
+    # ------------------------------------------------------------------------
+
+    def _mask(self, events) :
+        mask = 0
+        if events & XPoller.EVENT_READ :
+            mask |= self._POLLIN
+        if events & XPoller.EVENT_WRITE :
+            mask |= self._POLLOUT
+        return mask
+
+    # ------------------------------------------------------------------------
+
+    def SetEvents(self, socket, events) :
+        reg = self._events.get(socket)
+        if events :
+            if reg is None :
+                try :
+                    fd = socket.fileno()
+                except :
+                    fd = None
+                self._poller.register(socket, self._mask(events))
+                self._events[socket] = (events, fd)
+                if fd is not None :
+                    self._sockets[fd] = socket
+            elif reg[0] != events :
+                self._poller.modify(socket, self._mask(events))
+                self._events[socket] = (events, reg[1])
+        elif reg is not None :
+            del self._events[socket]
+            fd = reg[1]
+            if fd is not None and self._sockets.get(fd) is socket :
+                del self._sockets[fd]
+            try :
+                # By file descriptor as the socket may already be closed.
+                self._poller.unregister(socket if fd is None else fd)
+            except :
+                pass
+
+    # ------------------------------------------------------------------------
+
+    def _poll(self, timeoutSec) :
+        return self._poller.poll(int(timeoutSec * 1000))
+
+    # ------------------------------------------------------------------------
+
+    def Poll(self, timeoutSec) :
+        result = [ ]
+        for item in self._poll(timeoutSec) :
+            obj, mask = item[0], item[1]
+            socket = self._sockets.get(obj) if isinstance(obj, int) else obj
+            reg    = self._events.get(socket)
+            if reg is None :
+                continue
+            events = 0
+            if mask & self._POLLIN or \
+               (mask & self._POLLHUP and reg[0] & XPoller.EVENT_READ) :
+                # A hang up is read as the end of the stream.
+                events |= XPoller.EVENT_READ
+            if mask & self._POLLOUT :
+                events |= XPoller.EVENT_WRITE
+            if not events and mask & (self._POLLERR | self._POLLHUP | self._POLLNVAL) :
+                events = XPoller.EVENT_ERROR
+            if events :
+                result.append((socket, events))
+        return result
+
+# ============================================================================
+# ===( XPollerEpoll )=========================================================
+# ============================================================================
+
+class XPollerEpoll(XPollerPoll) :
+
+    _POLLIN   = getattr(selectModule, 'EPOLLIN',  0x001)
+    _POLLOUT  = getattr(selectModule, 'EPOLLOUT', 0x004)
+    _POLLERR  = getattr(selectModule, 'EPOLLERR', 0x008)
+    _POLLHUP  = getattr(selectModule, 'EPOLLHUP', 0x010)
+    _POLLNVAL = 0
+
+    # epoll applies changes to a wait in progress.
+    NeedsWakeUp = False
+
+    def _createPoller(self) :
+        return selectModule.epoll()
+
+    # ------------------------------------------------------------------------
+
+    def _poll(self, timeoutSec) :
+        return self._poller.poll(timeoutSec)
+
 # ============================================================================
 # ===( XAsyncSocketsPool )====================================================
 # ============================================================================
@@ -28,14 +221,25 @@ class XAsyncSocketsPool :
 
     _CHECK_SEC_INTERVAL = 1.0
 
-    def __init__(self) :
+    # Flags of the per socket state.
+    _SOCK_READ     = XPoller.EVENT_READ
+    _SOCK_WRITE    = XPoller.EVENT_WRITE
+    _SOCK_EVENTS   = XPoller.EVENT_READ | XPoller.EVENT_WRITE
+    _SOCK_HANDLING = 0x10
+    _SOCK_PENDING  = 0x20
+
+    def __init__(self, poller=None) :
+        if poller is not None and not isinstance(poller, XPoller) :
+            raise XAsyncSocketsPoolException('"poller" must be a XPoller or None.')
         self._processing   = None
         self._microWorkers = None
+        self._poller       = poller if poller else XPoller.Create()
         self._opLock       = allocate_lock()
         self._asyncSockets = { }
-        self._readList     = [ ]
-        self._writeList    = [ ]
-        self._handlingList = [ ]
+        self._socksState   = { }
+        self._pendingSocks = set()
+        self._expireHeap   = [ ]
+        self._expireSeq    = 0
         self._udpSockEvt   = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         for i in range(30) :
             self._udpSockEvtAddr = ('127.0.0.1', 54321+i)
@@ -62,30 +266,107 @@ class XAsyncSocketsPool :
             with self._opLock :
                 if socket in self._asyncSockets :
                     del self._asyncSockets[socket]
-                if socket in self._readList :
-                    self._readList.remove(socket)
-                if socket in self._writeList :
-                    self._writeList.remove(socket)
+                if self._socksState.pop(socket, 0) & XAsyncSocketsPool._SOCK_EVENTS :
+                    self._poller.SetEvents(socket, 0)
+                self._pendingSocks.discard(socket)
                 return True
         return False
 
     # ------------------------------------------------------------------------
 
-    def _socketListAdd(self, socket, socketsList) :
+    def _setSocketState(self, socket, flags, value) :
+        # Sets or clears flags in the state of socket and keeps the poller
+        # registration in line, returns True if the state has changed.
         with self._opLock :
-            if socket not in socketsList :
-                socketsList.append(socket)
-                return True
-        return False
+            state = self._socksState.get(socket, 0)
+            if value :
+                if socket not in self._asyncSockets and socket is not self._udpSockEvt :
+                    return False
+                newState = state | flags
+            else :
+                newState = state & ~flags
+            if newState == state :
+                return False
+            if newState :
+                self._socksState[socket] = newState
+            else :
+                del self._socksState[socket]
+            if flags & XAsyncSocketsPool._SOCK_PENDING :
+                if value :
+                    self._pendingSocks.add(socket)
+                else :
+                    self._pendingSocks.discard(socket)
+            if (state ^ newState) & XAsyncSocketsPool._SOCK_EVENTS :
+                self._poller.SetEvents(socket, newState & XAsyncSocketsPool._SOCK_EVENTS)
+            return True
 
     # ------------------------------------------------------------------------
 
-    def _socketListRemove(self, socket, socketsList) :
+    def _hasSocketState(self, socket, flags) :
+        return (self._socksState.get(socket, 0) & flags != 0)
+
+    # ------------------------------------------------------------------------
+
+    def _addExpireTimeout(self, asyncSocket, expireTimeSec) :
+        # A socket keeps at most one entry in the heap : a later timeout only
+        # updates the socket and the entry is moved when it comes first.
         with self._opLock :
-            if socket in socketsList :
-                socketsList.remove(socket)
-                return True
-        return False
+            queuedSec = asyncSocket._expireQueuedSec
+            if queuedSec is not None and queuedSec <= expireTimeSec :
+                return
+            wakeUp = ( not self._expireHeap or
+                       expireTimeSec < self._expireHeap[0][0] )
+            self._pushExpireEntry(asyncSocket, expireTimeSec)
+            if len(self._expireHeap) > 2 * len(self._asyncSockets) + 64 :
+                self._expireHeap = [ e for e in self._expireHeap
+                                     if e[2]._expireQueuedSec == e[0] and
+                                        self._isAsyncSocketIn(e[2]) ]
+                heapify(self._expireHeap)
+        if wakeUp and self._processing :
+            self._sendUDPSockEvent()
+
+    # ------------------------------------------------------------------------
+
+    def _pushExpireEntry(self, asyncSocket, expireTimeSec) :
+        self._expireSeq += 1
+        heappush(self._expireHeap, (expireTimeSec, self._expireSeq, asyncSocket))
+        asyncSocket._expireQueuedSec = expireTimeSec
+
+    # ------------------------------------------------------------------------
+
+    def _isAsyncSocketIn(self, asyncSocket) :
+        return (self._asyncSockets.get(asyncSocket.GetSocketObj()) is asyncSocket)
+
+    # ------------------------------------------------------------------------
+
+    def _popExpiredSockets(self, timeSec) :
+        expired = [ ]
+        with self._opLock :
+            while self._expireHeap and self._expireHeap[0][0] <= timeSec :
+                expireTimeSec, seq, asyncSocket = heappop(self._expireHeap)
+                if asyncSocket._expireQueuedSec != expireTimeSec :
+                    continue
+                asyncSocket._expireQueuedSec = None
+                if not self._isAsyncSocketIn(asyncSocket) :
+                    continue
+                expireTimeSec = asyncSocket.ExpireTimeSec
+                if expireTimeSec is None :
+                    continue
+                if expireTimeSec <= timeSec :
+                    expired.append(asyncSocket)
+                else :
+                    self._pushExpireEntry(asyncSocket, expireTimeSec)
+        return expired
+
+    # ------------------------------------------------------------------------
+
+    def _getWaitTimeout(self) :
+        if self._hasPendingToHandle() :
+            return 0
+        timeoutSec = XAsyncSocketsPool._CHECK_SEC_INTERVAL
+        if self._expireHeap :
+            timeoutSec = min(timeoutSec, max(0, self._expireHeap[0][0] - perf_counter()))
+        return timeoutSec
 
     # ------------------------------------------------------------------------
 
@@ -94,37 +375,49 @@ class XAsyncSocketsPool :
 
     # ------------------------------------------------------------------------
 
+    def _hasPendingToHandle(self) :
+        if not self._pendingSocks :
+            return False
+        with self._opLock :
+            pendingSocks = list(self._pendingSocks)
+        for sock in pendingSocks :
+            if not self._hasSocketState(sock, XAsyncSocketsPool._SOCK_HANDLING) :
+                return True
+        return False
+
+    # ------------------------------------------------------------------------
+
     def _processWaitEvents(self) :
 
         def jobExceptionalCondition(args) :
             if args[0].OnExceptionalCondition() :
                 self._removeSocket(args[1])
-            self._socketListRemove(args[1], self._handlingList)
+            self._setSocketState(args[1], XAsyncSocketsPool._SOCK_HANDLING, False)
 
         def jobReadyForWriting(args) :
             if args[0].OnReadyForWriting() :
                 self._removeSocket(args[1])
-            self._socketListRemove(args[1], self._handlingList)
+            self._setSocketState(args[1], XAsyncSocketsPool._SOCK_HANDLING, False)
+            if self._hasSocketState(args[1], XAsyncSocketsPool._SOCK_PENDING) :
+                self._sendUDPSockEvent()
 
         def jobReadyForReading(args) :
             if args[0].OnReadyForReading() :
                 self._removeSocket(args[1])
-            self._socketListRemove(args[1], self._handlingList)
+            self._setSocketState(args[1], XAsyncSocketsPool._SOCK_HANDLING, False)
+            if self._hasSocketState(args[1], XAsyncSocketsPool._SOCK_PENDING) :
+                self._sendUDPSockEvent()
 
         self._processing = True
         
-        self._socketListAdd(self._udpSockEvt, self._readList)
+        self._setSocketState(self._udpSockEvt, XAsyncSocketsPool._SOCK_READ, True)
 
-        timeSec       = perf_counter()
         udpSockEvtBuf = bytearray(32)
         
         while self._processing :
             try :
                 try :
-                    rd, wr, ex = select( self._readList,
-                                         self._writeList,
-                                         self._readList,
-                                         XAsyncSocketsPool._CHECK_SEC_INTERVAL )
+                    events = self._poller.Poll(self._getWaitTimeout())
                 except KeyboardInterrupt :
                     break
                 except :
@@ -132,41 +425,48 @@ class XAsyncSocketsPool :
                     continue
                 if not self._processing :
                     break
-                for socketsList in ex, wr, rd :
-                    for sock in socketsList :
-                        if sock == self._udpSockEvt :
-                            self._udpSockEvt.recv_into(udpSockEvtBuf)
-                        else :
-                            asyncSocket = self._asyncSockets.get(sock)
-                            if asyncSocket and asyncSocket.GetSocketObj() == sock and sock.fileno() != -1 :
-                                if self._socketListAdd(sock, self._handlingList) :
-                                    if socketsList is rd :
-                                        if self._microWorkers :
-                                            self._microWorkers.AddJob(jobReadyForReading, (asyncSocket, sock))
-                                        else :
-                                            jobReadyForReading((asyncSocket, sock))
-                                    elif socketsList is wr :
-                                        self._socketListRemove(sock, self._writeList)
-                                        if self._microWorkers :
-                                            self._microWorkers.AddJob(jobReadyForWriting, (asyncSocket, sock))
-                                        else :
-                                            jobReadyForWriting((asyncSocket, sock))
+                if self._pendingSocks :
+                    # Sockets with already received data are handled as ready
+                    # for reading, unless a job is still running for them.
+                    with self._opLock :
+                        pendingSocks = list(self._pendingSocks)
+                    for sock in pendingSocks :
+                        if not self._hasSocketState(sock, XAsyncSocketsPool._SOCK_HANDLING) :
+                            self._setSocketState(sock, XAsyncSocketsPool._SOCK_PENDING, False)
+                            events.append((sock, XPoller.EVENT_READ))
+                for sock, evt in events :
+                    if sock == self._udpSockEvt :
+                        self._udpSockEvt.recv_into(udpSockEvtBuf)
+                    else :
+                        asyncSocket = self._asyncSockets.get(sock)
+                        if asyncSocket and asyncSocket.GetSocketObj() == sock and sock.fileno() != -1 :
+                            if self._setSocketState(sock, XAsyncSocketsPool._SOCK_HANDLING, True) :
+                                if evt & XPoller.EVENT_ERROR :
+                                    self._removeSocket(sock)
+                                    if self._microWorkers :
+                                        self._microWorkers.AddJob(jobExceptionalCondition, (asyncSocket, sock))
                                     else :
-                                        self._removeSocket(sock)
-                                        if self._microWorkers :
-                                            self._microWorkers.AddJob(jobExceptionalCondition, (asyncSocket, sock))
-                                        else :
-                                            jobExceptionalCondition((asyncSocket, sock))
-                            else :
-                                self._removeSocket(sock)
-                                sock.close()
-                sec = perf_counter()
-                if sec > timeSec + XAsyncSocketsPool._CHECK_SEC_INTERVAL :
-                    timeSec = sec
-                    for asyncSocket in list(self._asyncSockets.values()) :
-                        if asyncSocket.ExpireTimeSec and \
-                           timeSec > asyncSocket.ExpireTimeSec :
-                            asyncSocket._close(XClosedReason.Timeout)
+                                        jobExceptionalCondition((asyncSocket, sock))
+                                elif evt & XPoller.EVENT_WRITE and \
+                                     self._setSocketState(sock, XAsyncSocketsPool._SOCK_WRITE, False) :
+                                    if self._microWorkers :
+                                        self._microWorkers.AddJob(jobReadyForWriting, (asyncSocket, sock))
+                                    else :
+                                        jobReadyForWriting((asyncSocket, sock))
+                                elif evt & XPoller.EVENT_READ and \
+                                     self._hasSocketState(sock, XAsyncSocketsPool._SOCK_READ) :
+                                    if self._microWorkers :
+                                        self._microWorkers.AddJob(jobReadyForReading, (asyncSocket, sock))
+                                    else :
+                                        jobReadyForReading((asyncSocket, sock))
+                                else :
+                                    self._setSocketState(sock, XAsyncSocketsPool._SOCK_HANDLING, False)
+                        else :
+                            self._removeSocket(sock)
+                            sock.close()
+                if self._expireHeap :
+                    for asyncSocket in self._popExpiredSockets(perf_counter()) :
+                        asyncSocket._close(XClosedReason.Timeout)
             except :
                 pass
 
@@ -179,8 +479,10 @@ class XAsyncSocketsPool :
             except :
                 pass
 
-        self._readList.clear()
-        self._writeList.clear()
+        self._socksState.clear()
+        self._pendingSocks.clear()
+        self._expireHeap.clear()
+        self._poller.Clear()
 
         self._processing = None
 
@@ -219,11 +521,24 @@ class XAsyncSocketsPool :
             socket = asyncSocket.GetSocketObj()
         except :
             raise XAsyncSocketsPoolException('NotifyNextReadyForReading : "asyncSocket" is incorrect.')
-        if notify :
-            if self._socketListAdd(socket, self._readList) :
-                self._sendUDPSockEvent()
-        else :
-            self._socketListRemove(socket, self._readList)
+        if self._setSocketState(socket, XAsyncSocketsPool._SOCK_READ, notify) and \
+           notify and self._poller.NeedsWakeUp :
+            self._sendUDPSockEvent()
+
+    # ------------------------------------------------------------------------
+
+    def NotifyPendingReading(self, asyncSocket) :
+        # Data is already received for asyncSocket, it is handled as ready
+        # for reading (and waits for reading after) without polling it. A
+        # running job for it wakes the loop up itself when it ends.
+        try :
+            socket = asyncSocket.GetSocketObj()
+        except :
+            raise XAsyncSocketsPoolException('NotifyPendingReading : "asyncSocket" is incorrect.')
+        flags = XAsyncSocketsPool._SOCK_READ | XAsyncSocketsPool._SOCK_PENDING
+        if self._setSocketState(socket, flags, True) and \
+           not self._hasSocketState(socket, XAsyncSocketsPool._SOCK_HANDLING) :
+            self._sendUDPSockEvent()
 
     # ------------------------------------------------------------------------
 
@@ -232,22 +547,25 @@ class XAsyncSocketsPool :
             socket = asyncSocket.GetSocketObj()
         except :
             raise XAsyncSocketsPoolException('NotifyNextReadyForWriting : "asyncSocket" is incorrect.')
-        if notify :
-            if self._socketListAdd(socket, self._writeList) :
-                self._sendUDPSockEvent()
-        else :
-            self._socketListRemove(socket, self._writeList)
+        if self._setSocketState(socket, XAsyncSocketsPool._SOCK_WRITE, notify) and \
+           notify and self._poller.NeedsWakeUp :
+            self._sendUDPSockEvent()
 
     # ------------------------------------------------------------------------
 
-    def AsyncWaitEvents(self, threadsCount=0) :
+    def AsyncWaitEvents(self, threadsCount=0, maxThreadsCount=None, threadsStackSize=None) :
         if self.WaitEventsProcessing :
             return
         self._processing = False
         if threadsCount > 0 :
             try :
-                if threadsCount > 1 :
-                    self._microWorkers = MicroWorkers(workersCount=threadsCount-1)
+                if maxThreadsCount is None or maxThreadsCount < threadsCount :
+                    maxThreadsCount = threadsCount
+                if maxThreadsCount > 1 :
+                    # At least one worker, the others are added on load.
+                    self._microWorkers = MicroWorkers( workersCount     = max(threadsCount-1, 1),
+                                                       workersStackSize = threadsStackSize,
+                                                       maxWorkersCount  = maxThreadsCount-1 )
                 start_new_thread(self._processWaitEvents, ())
                 while self._processing != True :
                     sleep(0.010)
@@ -272,6 +590,12 @@ class XAsyncSocketsPool :
 
     # ------------------------------------------------------------------------
 
+    @property
+    def Workers(self) :
+        return self._microWorkers
+
+    # ------------------------------------------------------------------------
+
     @property
     def WaitEventsProcessing(self) :
         return (self._processing is not None)
@@ -304,6 +628,7 @@ class XAsyncSocket :
         self._recvBufSlot      = recvBufSlot
         self._sendBufSlot      = sendBufSlot
         self._expireTimeSec    = None
+        self._expireQueuedSec  = None
         self._state            = None
         self._onClosed         = None
         try :
@@ -322,6 +647,7 @@ class XAsyncSocket :
         try :
             if timeoutSec and timeoutSec > 0 :
                 self._expireTimeSec = perf_counter() + timeoutSec
+                self._asyncSocketsPool._addExpireTimeout(self, self._expireTimeSec)
         except :
             raise XAsyncSocketException('"timeoutSec" is incorrect to set expire timeout.')
 
@@ -469,7 +795,8 @@ class XAsyncTCPServer(XAsyncSocket) :
                                        self._srvAddr,
                                        cliAddr,
                                        recvBufSlot,
-                                       sendBufSlot )
+                                       sendBufSlot,
+                                       self._bufSlots )
         try :
             self._onClientAccepted(self, asyncTCPCli)
         except Exception as ex :
@@ -498,6 +825,14 @@ class XAsyncTCPClientException(Exception) :
 
 class XAsyncTCPClient(XAsyncSocket) :
 
+    _RD_AHEAD_SIZE    = 512
+    _SENDMSG_MAX_BUFS = 32
+
+    # Kinds of the queued data to send.
+    _WR_DATA = 0x00
+    _WR_SLOT = 0x01
+    _WR_FILE = 0x02
+
     @staticmethod
     def Create( asyncSocketsPool,
                 srvAddr,
@@ -562,22 +897,30 @@ class XAsyncTCPClient(XAsyncSocket) :
 
     # ------------------------------------------------------------------------
 
-    def __init__(self, asyncSocketsPool, cliSocket, srvAddr, cliAddr, recvBufSlot, sendBufSlot) :
+    def __init__(self, asyncSocketsPool, cliSocket, srvAddr, cliAddr, recvBufSlot, sendBufSlot, bufSlots=None) :
         try :
             super().__init__(asyncSocketsPool, cliSocket, recvBufSlot, sendBufSlot)
+            self._bufSlots         = bufSlots
             self._srvAddr          = srvAddr
             self._cliAddr          = cliAddr if cliAddr else ('0.0.0.0', 0)
             self._onFailsToConnect = None
             self._onConnected      = None
             self._onDataRecv       = None
             self._onDataRecvArg    = None
-            self._onDataSent       = None
-            self._onDataSentArg    = None
             self._sizeToRecv       = None
             self._rdLinePos        = None
             self._rdLineEncoding   = None
             self._rdBufView        = None
-            self._wrBufView        = None
+            self._rdAhead          = None
+            self._rdAheadView      = None
+            self._rdAheadPos       = 0
+            self._rdAheadEnd       = 0
+            self._rdLoopThread     = None
+            self._wrQueue          = [ ]
+            self._wrQueuePos       = 0
+            self._wrLock           = allocate_lock()
+            self._wrSlotQueued     = False
+            self._wrGather         = None
             self._socketOpened     = (cliAddr is not None)
         except :
             raise XAsyncTCPClientException('Error to creating XAsyncTCPClient, arguments are incorrects.')
@@ -585,11 +928,12 @@ class XAsyncTCPClient(XAsyncSocket) :
     # ------------------------------------------------------------------------
 
     def Close(self) :
-        if self._wrBufView :
+        for view in self._getQueuedViews() :
             try :
-                self._socket.send(self._wrBufView)
+                if self._socket.send(view) < len(view) :
+                    break
             except :
-                pass
+                break
         try :
             self._socket.shutdown(socket.SHUT_RDWR)
         except :
@@ -598,86 +942,145 @@ class XAsyncTCPClient(XAsyncSocket) :
 
     # ------------------------------------------------------------------------
 
+    def _recvInto(self, buf) :
+        # Returns the number of bytes received, 0 if no data is available yet
+        # or None if the socket has been closed.
+        try :
+            if hasattr(self._socket, 'recv_into') :
+                n = self._socket.recv_into(buf)
+            else :
+                n = self._socket.readinto(buf)
+        except ssl.SSLError as sslErr :
+            if sslErr.args[0] != ssl.SSL_ERROR_WANT_READ :
+                self._close()
+                return None
+            return 0
+        except OSError as ex :
+            if ex.args and ex.args[0] in (11, 35) :
+                # EAGAIN / EWOULDBLOCK.
+                return 0
+            self._close()
+            return None
+        except :
+            self._close()
+            return None
+        if n is None :
+            return 0
+        if not n :
+            self._close(XClosedReason.ClosedByPeer)
+            return None
+        return n
+
+    # ------------------------------------------------------------------------
+
+    def _recvAhead(self) :
+        if not self._rdAhead :
+            self._rdAhead     = bytearray(XAsyncTCPClient._RD_AHEAD_SIZE)
+            self._rdAheadView = memoryview(self._rdAhead)
+        n = self._recvInto(self._rdAheadView)
+        if n :
+            self._rdAheadPos = 0
+            self._rdAheadEnd = n
+        return n
+
+    # ------------------------------------------------------------------------
+
+    def _findLineEnd(self) :
+        try :
+            return self._rdAhead.find(b'\n', self._rdAheadPos, self._rdAheadEnd)
+        except AttributeError :
+            # No bytearray.find on MicroPython.
+            i = bytes(self._rdAheadView[self._rdAheadPos:self._rdAheadEnd]).find(b'\n')
+            return (self._rdAheadPos + i) if i >= 0 else -1
+
+    # ------------------------------------------------------------------------
+
+    def _notifyRecv(self) :
+        # Data already read ahead is taken directly by the receiving loop
+        # when armed from one of its callbacks, or handed to the pool without
+        # polling otherwise, the socket only waits for reading when empty.
+        if self._rdAheadPos < self._rdAheadEnd and \
+           self._rdLoopThread != get_ident() :
+            self._asyncSocketsPool.NotifyPendingReading(self)
+        else :
+            self._asyncSocketsPool.NotifyNextReadyForReading(self, True)
+
+    # ------------------------------------------------------------------------
+
+    def _hasNextRecv(self) :
+        # After a receive callback, continues with data already received.
+        if self._rdLinePos is None and not self._sizeToRecv :
+            return False
+        return ( self._rdAheadPos < self._rdAheadEnd or \
+                 (self.IsSSL and self._socket.pending() > 0) )
+
+    # ------------------------------------------------------------------------
+
     def OnReadyForReading(self) :
+        # The thread running the receiving loop is kept to know when a
+        # receive is armed from one of its callbacks.
+        self._rdLoopThread = get_ident()
+        try :
+            return self._recvLoop()
+        finally :
+            self._rdLoopThread = None
+
+    # ------------------------------------------------------------------------
+
+    def _recvLoop(self) :
         while True :
             if self._rdLinePos is not None :
                 # In the context of reading a line,
-                while True :
+                if self._rdAheadPos == self._rdAheadEnd :
+                    if not self._recvAhead() :
+                        return
+                i    = self._findLineEnd()
+                end  = i if i >= 0 else self._rdAheadEnd
+                size = end - self._rdAheadPos
+                if self._rdLinePos + size > self._recvBufSlot.Size :
+                    self._close()
+                    return
+                lineBuf = self._recvBufSlot.Buffer
+                lineBuf[self._rdLinePos:self._rdLinePos+size] = self._rdAheadView[self._rdAheadPos:end]
+                self._rdLinePos += size
+                if i < 0 :
+                    self._rdAheadPos = self._rdAheadEnd
+                    continue
+                self._rdAheadPos = i + 1
+                lineLen = self._rdLinePos
+                if lineLen and lineBuf[lineLen-1] == 0x0D :
+                    lineLen -= 1
+                self._rdLinePos = None
+                self._asyncSocketsPool.NotifyNextReadyForReading(self, False)
+                self._removeExpireTimeout()
+                if self._onDataRecv :
+                    line = self._recvBufSlot.Buffer[:lineLen]
                     try :
-                        try :
-                            b = self._socket.recv(1)
-                        except ssl.SSLError as sslErr :
-                            if sslErr.args[0] != ssl.SSL_ERROR_WANT_READ :
-                                self._close()
-                            return
-                        except BlockingIOError as bioErr :
-                            if bioErr.errno != 35 :
-                                self._close()
-                            return
-                        except :
-                            self._close()
-                            return
+                        line = bytes(line).decode(self._rdLineEncoding)
                     except :
-                        self._close()
-                        return
-                    if b :
-                        if b == b'\n' :
-                            lineLen = self._rdLinePos 
-                            self._rdLinePos = None
-                            self._asyncSocketsPool.NotifyNextReadyForReading(self, False)
-                            self._removeExpireTimeout()
-                            if self._onDataRecv :
-                                line = self._recvBufSlot.Buffer[:lineLen]
-                                try :
-                                    line = bytes(line).decode(self._rdLineEncoding)
-                                except :
-                                    line = None
-                                try :
-                                    self._onDataRecv(self, line, self._onDataRecvArg)
-                                except Exception as ex :
-                                    raise XAsyncTCPClientException('Error when handling the "OnDataRecv" event : %s' % ex)
-                            if self.IsSSL and self._socket.pending() > 0 :
-                                break
-                            return
-                        elif b != b'\r' :
-                            try :
-                                if self._rdLinePos < self._recvBufSlot.Size :
-                                    self._recvBufSlot.Buffer[self._rdLinePos] = ord(b)
-                                    self._rdLinePos += 1
-                                else :
-                                    self._close()
-                                    return
-                            except :
-                                return
-                    else :
-                        self._close(XClosedReason.ClosedByPeer)
-                        return
+                        line = None
+                    try :
+                        self._onDataRecv(self, line, self._onDataRecvArg)
+                    except Exception as ex :
+                        raise XAsyncTCPClientException('Error when handling the "OnDataRecv" event : %s' % ex)
+                if not self._hasNextRecv() :
+                    return
             elif self._sizeToRecv :
                 # In the context of reading data,
                 recvBuf = self._rdBufView[-self._sizeToRecv:]
-                try :
-                    try :
-                        n = self._socket.recv_into(recvBuf)
-                    except ssl.SSLError as sslErr :
-                        if sslErr.args[0] != ssl.SSL_ERROR_WANT_READ :
-                            self._close()
-                        return
-                    except BlockingIOError as bioErr :
-                        if bioErr.errno != 35 :
-                            self._close()
+                if self._rdAheadPos == self._rdAheadEnd and \
+                   self._sizeToRecv < XAsyncTCPClient._RD_AHEAD_SIZE :
+                    # Small reads go through the read-ahead buffer to save calls.
+                    if not self._recvAhead() :
                         return
-                    except :
-                        self._close()
-                        return
-                except :
-                    try :
-                        n = self._socket.readinto(recvBuf)
-                    except :
-                        self._close()
+                if self._rdAheadPos < self._rdAheadEnd :
+                    n = min(self._sizeToRecv, self._rdAheadEnd - self._rdAheadPos)
+                    recvBuf[:n] = self._rdAheadView[self._rdAheadPos:self._rdAheadPos+n]
+                    self._rdAheadPos += n
+                else :
+                    n = self._recvInto(recvBuf)
+                    if not n :
                         return
-                if not n :
-                    self._close(XClosedReason.ClosedByPeer)
-                    return
                 self._sizeToRecv -= n
                 if not self._sizeToRecv :
                     data = self._rdBufView
@@ -689,7 +1092,7 @@ class XAsyncTCPClient(XAsyncSocket) :
                             self._onDataRecv(self, data, self._onDataRecvArg)
                         except Exception as ex :
                             raise XAsyncTCPClientException('Error when handling the "OnDataRecv" event : %s' % ex)
-                    if not self.IsSSL or self._socket.pending() == 0 :
+                    if not self._hasNextRecv() :
                         return
             else :
                 self._close(XClosedReason.ClosedByHost)
@@ -717,22 +1120,66 @@ class XAsyncTCPClient(XAsyncSocket) :
                 except Exception as ex :
                     raise XAsyncTCPClientException('Error when handling the "OnConnected" event : %s' % ex)
             return
-        if self._wrBufView :
+        if self._wrQueue :
+            if self._wrGather is None :
+                self._wrGather = hasattr(self._socket, 'sendmsg') and not self.IsSSL
+            views = self._getQueuedViews(XAsyncTCPClient._SENDMSG_MAX_BUFS)
+            n     = 0
             try :
-                n = self._socket.send(self._wrBufView)
+                if not views :
+                    # A file region comes first and is sent by the kernel.
+                    with self._wrLock :
+                        entry = self._wrQueue[0]
+                        pos   = self._wrQueuePos
+                    n = sendfile( self._socket.fileno(),
+                                  entry[0][0],
+                                  entry[0][1] + pos,
+                                  entry[1] - pos )
+                elif self._wrGather and len(views) > 1 :
+                    n = self._socket.sendmsg(views)
+                else :
+                    for view in views :
+                        sent  = self._socket.send(view)
+                        n    += sent
+                        if sent < len(view) :
+                            break
             except Exception as ex :
                 if hasattr(ssl, 'SSLEOFError') and isinstance(ex, ssl.SSLEOFError) :
                     self._close()
                     return True
-                else :
+                elif not n :
+                    if not views and \
+                       not (isinstance(ex, OSError) and ex.args and ex.args[0] in (11, 35)) :
+                        # The file region cannot be sent (bad file, broken pipe...).
+                        self._close()
+                        return True
                     self._asyncSocketsPool.NotifyNextReadyForWriting(self, True)
                     return
-            self._wrBufView = self._wrBufView[n:]
-            if self._wrBufView :
-                self._asyncSocketsPool.NotifyNextReadyForWriting(self, True)
-            elif self._onDataSent :
+            if not n and not views :
+                # The file is shorter than the queued region.
+                self._close()
+                return True
+            with self._wrLock :
+                count = 0
+                for entry in self._wrQueue :
+                    size = entry[1] - self._wrQueuePos
+                    if n < size :
+                        self._wrQueuePos += n
+                        break
+                    n               -= size
+                    count           += 1
+                    self._wrQueuePos = 0
+                    if entry[4] == XAsyncTCPClient._WR_SLOT :
+                        self._wrSlotQueued = False
+                sent = self._wrQueue[:count]
+                del self._wrQueue[:count]
+                if self._wrQueue :
+                    self._asyncSocketsPool.NotifyNextReadyForWriting(self, True)
+            for entry in sent :
+                if not entry[2] :
+                    continue
                 try :
-                    self._onDataSent(self, self._onDataSentArg)
+                    entry[2](self, entry[3])
                 except Exception as ex :
                     raise XAsyncTCPClientException('Error when handling the "OnDataSent" event : %s' % ex)
 
@@ -747,21 +1194,29 @@ class XAsyncTCPClient(XAsyncSocket) :
             self._rdLineEncoding = lineEncoding
             self._onDataRecv     = onLineRecv
             self._onDataRecvArg  = onLineRecvArg
-            self._asyncSocketsPool.NotifyNextReadyForReading(self, True)
+            self._notifyRecv()
             return True
         return False
 
     # ------------------------------------------------------------------------
 
-    def AsyncRecvData(self, size=None, onDataRecv=None, onDataRecvArg=None, timeoutSec=None) :
+    def AsyncRecvData(self, size=None, onDataRecv=None, onDataRecvArg=None, timeoutSec=None, recvBuf=None) :
+        # recvBuf is an optional writable memoryview, owned by the caller,
+        # that is filled and passed as is to "OnDataRecv" (size is ignored).
         if self._rdLinePos is not None or self._sizeToRecv :
             raise XAsyncTCPClientException('AsyncRecvData : Already waiting asynchronous receive.')
         if self._socket :
-            if size is None :
+            if recvBuf is not None :
+                size = len(recvBuf)
+                if not size :
+                    raise XAsyncTCPClientException('AsyncRecvData : "recvBuf" is empty.')
+            elif size is None :
                 size = self._recvBufSlot.Size
             elif not isinstance(size, int) or size <= 0 :
                 raise XAsyncTCPClientException('AsyncRecvData : "size" is incorrect.')
-            if size <= self._recvBufSlot.Size :
+            if recvBuf is not None :
+                self._rdBufView = recvBuf
+            elif size <= self._recvBufSlot.Size :
                 self._rdBufView = memoryview(self._recvBufSlot.Buffer)[:size]
             else :
                 try :
@@ -772,23 +1227,42 @@ class XAsyncTCPClient(XAsyncSocket) :
             self._sizeToRecv    = size
             self._onDataRecv    = onDataRecv
             self._onDataRecvArg = onDataRecvArg
-            self._asyncSocketsPool.NotifyNextReadyForReading(self, True)
+            self._notifyRecv()
             return True
         return False
 
     # ------------------------------------------------------------------------
 
+    def _queueSend(self, data, size, onDataSent, onDataSentArg, kind=_WR_DATA) :
+        # Each queued buffer keeps its own "OnDataSent" callback which is
+        # called as soon as the buffer is fully sent.
+        with self._wrLock :
+            self._wrQueue.append((data, size, onDataSent, onDataSentArg, kind))
+            if kind == XAsyncTCPClient._WR_SLOT :
+                self._wrSlotQueued = True
+        self._asyncSocketsPool.NotifyNextReadyForWriting(self, True)
+
+    # ------------------------------------------------------------------------
+
+    def _getQueuedViews(self, maxCount=None) :
+        # Returns the memory views queued before the first file region.
+        views = [ ]
+        with self._wrLock :
+            for entry in self._wrQueue[:maxCount] :
+                if entry[4] == XAsyncTCPClient._WR_FILE :
+                    break
+                views.append(entry[0])
+            if views and self._wrQueuePos :
+                views[0] = views[0][self._wrQueuePos:]
+        return views
+
+    # ------------------------------------------------------------------------
+
     def AsyncSendData(self, data, onDataSent=None, onDataSentArg=None) :
         if self._socket :
             try :
                 if bytes([data[0]]) :
-                    if self._wrBufView :
-                        self._wrBufView = memoryview(bytes(self._wrBufView) + data)
-                    else :
-                        self._wrBufView = memoryview(data)
-                    self._onDataSent    = onDataSent
-                    self._onDataSentArg = onDataSentArg
-                    self._asyncSocketsPool.NotifyNextReadyForWriting(self, True)
+                    self._queueSend(memoryview(data), len(data), onDataSent, onDataSentArg)
                     return True
             except :
                 pass
@@ -797,22 +1271,81 @@ class XAsyncTCPClient(XAsyncSocket) :
 
     # ------------------------------------------------------------------------
 
+    def AsyncSendDataList(self, dataList, onDataSent=None, onDataSentArg=None) :
+        # Queues all the buffers under one lock so that no other send can be
+        # queued between them, "OnDataSent" is called when the last is sent.
+        if self._socket :
+            entries = [ ]
+            try :
+                for data in dataList :
+                    if bytes([data[0]]) :
+                        entries.append([memoryview(data), len(data), None, None, XAsyncTCPClient._WR_DATA])
+            except :
+                entries = None
+            if not entries :
+                raise XAsyncTCPClientException('AsyncSendDataList : "dataList" is incorrect.')
+            entries[-1][2] = onDataSent
+            entries[-1][3] = onDataSentArg
+            with self._wrLock :
+                for entry in entries :
+                    self._wrQueue.append(tuple(entry))
+            self._asyncSocketsPool.NotifyNextReadyForWriting(self, True)
+            return True
+        return False
+
+    # ------------------------------------------------------------------------
+
     def AsyncSendSendingBuffer(self, size=None, onDataSent=None, onDataSentArg=None) :
-        if self._wrBufView :
+        if self._wrSlotQueued :
             raise XAsyncTCPClientException('AsyncSendBufferSlot : Already waiting to send data.')
         if self._socket :
             if size is None :
                 size = self._sendBufSlot.Size
             if size > 0 and size <= self._sendBufSlot.Size :
-                self._wrBufView     = memoryview(self._sendBufSlot.Buffer)[:size]
-                self._onDataSent    = onDataSent
-                self._onDataSentArg = onDataSentArg
-                self._asyncSocketsPool.NotifyNextReadyForWriting(self, True)
+                view = memoryview(self._sendBufSlot.Buffer)[:size]
+                self._queueSend(view, size, onDataSent, onDataSentArg, XAsyncTCPClient._WR_SLOT)
                 return True
         return False
 
     # ------------------------------------------------------------------------
 
+    def AsyncSendFile(self, file, offset, size, onDataSent=None, onDataSentArg=None) :
+        # Queues a region of an opened file to be sent by the kernel with
+        # sendfile, returns False if it cannot be used on this socket.
+        if not self._socket or not self.CanSendFile :
+            return False
+        try :
+            fd = file.fileno()
+        except :
+            return False
+        if not isinstance(offset, int) or offset < 0 or \
+           not isinstance(size, int) or size <= 0 :
+            raise XAsyncTCPClientException('AsyncSendFile : "offset" or "size" is incorrect.')
+        self._queueSend((fd, offset), size, onDataSent, onDataSentArg, XAsyncTCPClient._WR_FILE)
+        return True
+
+    # ------------------------------------------------------------------------
+
+    def ResizeSendingBuffer(self, size=None) :
+        # Exchanges the sending buffer slot for one of the size class fitting
+        # size (the largest class if None), returns True if it was exchanged.
+        if self._wrSlotQueued or self._bufSlots is None or self._sendBufSlot is None :
+            return False
+        slotsSize = self._bufSlots.GetSlotSizeFor(size)
+        if slotsSize == self._sendBufSlot.Size :
+            return False
+        slot = self._bufSlots.GetAvailableSlot(slotsSize)
+        if slot is None :
+            return False
+        if slot.Size == self._sendBufSlot.Size :
+            slot.Available = True
+            return False
+        self._sendBufSlot.Available = True
+        self._sendBufSlot           = slot
+        return True
+
+    # ------------------------------------------------------------------------
+
     def _doSSLHandshake(self) :
         count = 0
         while count < 10 :
@@ -848,6 +1381,7 @@ class XAsyncTCPClient(XAsyncSocket) :
             self._asyncSocketsPool.NotifyNextReadyForWriting(self, False)
             self._asyncSocketsPool.NotifyNextReadyForReading(self, False)
             self._asyncSocketsPool.RemoveAsyncSocket(self)
+            self._wrGather = None
             self._socket = ssl.wrap_socket( self._socket,
                                             keyfile     = keyfile,
                                             certfile    = certfile,
@@ -873,6 +1407,7 @@ class XAsyncTCPClient(XAsyncSocket) :
             self._asyncSocketsPool.NotifyNextReadyForWriting(self, False)
             self._asyncSocketsPool.NotifyNextReadyForReading(self, False)
             self._asyncSocketsPool.RemoveAsyncSocket(self)
+            self._wrGather = None
             self._socket = sslContext.wrap_socket( self._socket,
                                                    server_side             = serverSide,
                                                    do_handshake_on_connect = False )
@@ -901,6 +1436,10 @@ class XAsyncTCPClient(XAsyncSocket) :
     def SendingBuffer(self) :
         return self._sendBufSlot.Buffer
 
+    @property
+    def CanSendFile(self) :
+        return (sendfile is not None and not self.IsSSL)
+
     @property
     def OnFailsToConnect(self) :
         return self._onFailsToConnect
@@ -1055,6 +1594,8 @@ class XBufferSlot :
         self._size      = size
         self._keepAlloc = keepAlloc
         self._buffer    = bytearray(size) if keepAlloc else None
+        self._bufSlots  = None
+        self._freeList  = None
 
     @property
     def Available(self) :
@@ -1063,7 +1604,10 @@ class XBufferSlot :
     def Available(self, value) :
         if value and not self._keepAlloc :
             self._buffer = None
-        self._available = value
+        if value and self._bufSlots is not None :
+            self._bufSlots._releaseSlot(self)
+        else :
+            self._available = value
 
     @property
     def Size(self) :
@@ -1082,37 +1626,98 @@ class XBufferSlot :
 
 class XBufferSlots :
 
-    def __init__(self, slotsCount, slotsSize, keepAlloc=True) :
-        self._slotsCount = slotsCount
-        self._slotsSize  = slotsSize
-        self._slots      = [ ]
-        self._lock       = allocate_lock()
-        for i in range(slotsCount) :
-            self._slots.append(XBufferSlot(slotsSize, keepAlloc))
-
-    def GetAvailableSlot(self) :
-        ret = None
-        self._lock.acquire()
-        for slot in self._slots :
-            if slot.Available :
-                slot.Available = False
-                ret = slot
-                break
-        self._lock.release()
-        return ret
+    def __init__(self, slotsCount, slotsSize, keepAlloc=True, sizeClasses=None) :
+        # sizeClasses is an optional list of (slotsCount, slotsSize) to add
+        # slots of other sizes, each size class has its own free slots stack.
+        self._slotsCount     = 0
+        self._slotsSize      = slotsSize
+        self._slots          = [ ]
+        self._classes        = [ ]
+        self._lock           = allocate_lock()
+        self._inUseCount     = 0
+        self._highWaterMark  = 0
+        self._exhaustedCount = 0
+        classes = [ (slotsCount, slotsSize) ]
+        if sizeClasses :
+            classes.extend(sizeClasses)
+        for count, size in sorted(classes, key=lambda c: c[1]) :
+            if count <= 0 :
+                continue
+            if self._classes and self._classes[-1][0] == size :
+                freeList = self._classes[-1][1]
+            else :
+                freeList = [ ]
+                self._classes.append((size, freeList))
+            for i in range(count) :
+                slot           = XBufferSlot(size, keepAlloc)
+                slot._bufSlots = self
+                slot._freeList = freeList
+                self._slots.append(slot)
+                freeList.append(slot)
+            self._slotsCount += count
+
+    def _releaseSlot(self, slot) :
+        with self._lock :
+            if not slot._available :
+                slot._available = True
+                slot._freeList.append(slot)
+                self._inUseCount -= 1
+
+    def GetSlotSizeFor(self, size=None) :
+        # Smallest size class able to hold size, the largest one if there is
+        # none or if size is None.
+        if size is not None :
+            for slotsSize, freeList in self._classes :
+                if slotsSize >= size :
+                    return slotsSize
+        return self._classes[-1][0]
+
+    def GetAvailableSlot(self, minSize=None) :
+        with self._lock :
+            for slotsSize, freeList in self._classes :
+                if freeList and (minSize is None or slotsSize >= minSize) :
+                    slot            = freeList.pop()
+                    slot._available = False
+                    self._inUseCount += 1
+                    if self._inUseCount > self._highWaterMark :
+                        self._highWaterMark = self._inUseCount
+                    return slot
+            if minSize is None :
+                self._exhaustedCount += 1
+        return None
 
     @property
     def SlotsCount(self) :
-        return self.slotsCount
+        return self._slotsCount
 
     @property
     def SlotsSize(self) :
-        return self.slotsSize
+        return self._slotsSize
+
+    @property
+    def SizeClasses(self) :
+        return [ c[0] for c in self._classes ]
 
     @property
     def Slots(self) :
         return self._slots
 
+    @property
+    def AvailableCount(self) :
+        return self._slotsCount - self._inUseCount
+
+    @property
+    def InUseCount(self) :
+        return self._inUseCount
+
+    @property
+    def HighWaterMark(self) :
+        return self._highWaterMark
+
+    @property
+    def ExhaustedCount(self) :
+        return self._exhaustedCount
+
 # ============================================================================
 # ===( XFiFo )================================================================
 # ============================================================================
@@ -1165,86 +1770,189 @@ class MicroWorkersException(Exception) :
 
 class MicroWorkers :
 
-    def __init__(self, workersCount, workersStackSize=None) :
-        self._workersCount = 0
-        self._criticalLock = allocate_lock()
-        self._workersLock  = allocate_lock()
-        self._jobsPrcCount = 0
-        self._jobs         = [ ]
-        self._processing   = True
-        originalStackSize  = None
+    # Jobs are queued as linked nodes [function, arg, queuedAt, next] and each
+    # idle worker waits on its own lock, which is released to hand it a job,
+    # so exactly one worker is woken per job and none of them is spinning.
+    # Workers are added up to maxWorkersCount when all of them are busy and
+    # jobs wait in queue, and retired down to workersCount when they stay
+    # idle for idleRetireSec.
+
+    def __init__( self,
+                  workersCount,
+                  workersStackSize = None,
+                  maxWorkersCount  = None,
+                  scaleUpWaitSec   = 0.010,
+                  idleRetireSec    = 10 ) :
+        self._workersCount  = 0
+        self._criticalLock  = allocate_lock()
+        self._jobsFirst     = None
+        self._jobsLast      = None
+        self._jobsCount     = 0
+        self._jobsPrcCount  = 0
+        self._jobsDoneCount = 0
+        self._jobsWaitSec   = 0
+        self._jobsRunSec    = 0
+        self._maxJobWaitSec = 0
+        self._idleWorkers   = [ ]
+        self._processing    = True
         if not isinstance(workersCount, int) or workersCount <= 0 :
             raise MicroWorkersException('"workersCount" must be an integer greater than zero.')
+        if maxWorkersCount is None :
+            maxWorkersCount = workersCount
+        elif not isinstance(maxWorkersCount, int) or maxWorkersCount < workersCount :
+            raise MicroWorkersException('"maxWorkersCount" must be an integer not lower than "workersCount" or None.')
         if workersStackSize is not None :
             if not isinstance(workersStackSize, int) or workersStackSize <= 0 :
                 raise MicroWorkersException('"workersStackSize" must be an integer greater than zero or None.')
             try :
-                originalStackSize = stack_size(workersStackSize)
+                stack_size(stack_size(workersStackSize))
             except :
                 raise MicroWorkersException('"workersStackSize" of %s cannot be used.' % workersStackSize)
+        self._minCount       = workersCount
+        self._maxCount       = maxWorkersCount
+        self._stackSize      = workersStackSize
+        self._scaleUpWaitSec = scaleUpWaitSec
+        self._idleRetireSec  = idleRetireSec
         try :
             for _ in range(workersCount) :
-                start_new_thread(self._workerThreadFunc, (None, ))
-            while self._workersCount < workersCount :
-                sleep(0.010)
+                with self._criticalLock :
+                    self._workersCount += 1
+                self._startWorker()
         except Exception as ex :
             self.StopAll()
             raise MicroWorkersException('Error to create workers : %s' % ex)
-        if originalStackSize is not None :
-            stack_size(originalStackSize)
 
-    def _workerThreadFunc(self, arg) :
+    def _startWorker(self) :
+        # The worker is already counted.
+        originalStackSize = None
+        try :
+            if self._stackSize :
+                originalStackSize = stack_size(self._stackSize)
+            start_new_thread(self._workerThreadFunc, (None, ))
+        except :
+            with self._criticalLock :
+                self._workersCount -= 1
+            raise
+        finally :
+            if originalStackSize is not None :
+                stack_size(originalStackSize)
+
+    def _scaleUp(self) :
         with self._criticalLock :
+            if self._idleWorkers or self._workersCount >= self._maxCount or not self._processing :
+                return
             self._workersCount += 1
-        while self._processing :
-            jobFunc = None
-            self._workersLock.acquire()
-            if self._processing :
-                try :
-                    jobFunc, jobArg = self._jobs.pop(0)
-                except :
-                    self._workersLock.acquire()
-            try :
-                self._workersLock.release()
-            except :
-                pass
-            if jobFunc :
-                with self._criticalLock :
-                    self._jobsPrcCount += 1
+        try :
+            self._startWorker()
+        except :
+            pass
+
+    def _retireIdleWorker(self, now) :
+        # Must be called with the critical lock acquired.
+        idle = self._idleWorkers[0]
+        if now - idle[1] >= self._idleRetireSec and self._workersCount > self._minCount :
+            del self._idleWorkers[0]
+            self._workersCount -= 1
+            idle[2] = True
+            idle[0].release()
+
+    def _workerThreadFunc(self, arg) :
+        idle = [allocate_lock(), 0, False]  # wake-up lock, idle since, retired
+        idle[0].acquire()
+        lock = self._criticalLock
+        lock.acquire()
+        while self._processing and not idle[2] :
+            job = self._jobsFirst
+            if job :
+                self._jobsFirst = job[3]
+                if not self._jobsFirst :
+                    self._jobsLast = None
+                self._jobsCount    -= 1
+                self._jobsPrcCount += 1
+                lock.release()
+                startSec = perf_counter()
+                waitSec  = startSec - job[2]
+                if waitSec >= self._scaleUpWaitSec and self._jobsFirst :
+                    self._scaleUp()
                 try :
-                    jobFunc(jobArg)
+                    job[0](job[1])
                 except :
                     pass
-                with self._criticalLock :
-                    self._jobsPrcCount -= 1
-        with self._criticalLock :
+                runSec = perf_counter() - startSec
+                lock.acquire()
+                self._jobsPrcCount  -= 1
+                self._jobsDoneCount += 1
+                self._jobsWaitSec   += waitSec
+                self._jobsRunSec    += runSec
+                if waitSec > self._maxJobWaitSec :
+                    self._maxJobWaitSec = waitSec
+            else :
+                idle[1] = perf_counter()
+                if self._idleWorkers :
+                    self._retireIdleWorker(idle[1])
+                self._idleWorkers.append(idle)
+                lock.release()
+                idle[0].acquire()
+                lock.acquire()
+        if not idle[2] :
             self._workersCount -= 1
+        lock.release()
 
     def AddJob(self, function, arg=None) :
-        if function :
-            self._jobs.append( (function, arg) )
-            try :
-                self._workersLock.release()
-            except :
-                pass
+        if function and self._processing :
+            node = [function, arg, perf_counter(), None]
+            with self._criticalLock :
+                if self._jobsLast :
+                    self._jobsLast[3] = node
+                else :
+                    self._jobsFirst = node
+                self._jobsLast   = node
+                self._jobsCount += 1
+                if self._idleWorkers :
+                    # The last one to get idle is woken, the others keep
+                    # getting older and are retired if the load stays low.
+                    idle = self._idleWorkers.pop()
+                    if self._idleWorkers :
+                        self._retireIdleWorker(node[2])
+                    idle[0].release()
+                    return
+                scaleUp = ( self._jobsCount >= self._workersCount and \
+                            self._workersCount < self._maxCount )
+            if scaleUp :
+                self._scaleUp()
 
     def StopAll(self) :
         self._processing = False
-        self._jobs.clear()
-        try :
-            self._workersLock.release()
-        except :
-            pass
+        with self._criticalLock :
+            self._jobsFirst   = None
+            self._jobsLast    = None
+            self._jobsCount   = 0
+            idleWorkers       = self._idleWorkers
+            self._idleWorkers = [ ]
+        for idle in idleWorkers :
+            idle[0].release()
         while self._workersCount :
             sleep(0.010)
-            
+
     @property
     def Count(self) :
         return self._workersCount
 
+    @property
+    def MinCount(self) :
+        return self._minCount
+
+    @property
+    def MaxCount(self) :
+        return self._maxCount
+
+    @property
+    def IdleCount(self) :
+        return len(self._idleWorkers)
+
     @property
     def JobsInQueue(self) :
-        return len(self._jobs)
+        return self._jobsCount
 
     @property
     def JobsInProcess(self) :
@@ -1252,7 +1960,23 @@ class MicroWorkers :
 
     @property
     def IsWorking(self) :
-        return (len(self._jobs) > 0 or self._jobsPrcCount > 0)
+        return (self._jobsCount > 0 or self._jobsPrcCount > 0)
+
+    @property
+    def JobsDoneCount(self) :
+        return self._jobsDoneCount
+
+    @property
+    def JobsWaitSec(self) :
+        return self._jobsWaitSec
+
+    @property
+    def JobsRunSec(self) :
+        return self._jobsRunSec
+
+    @property
+    def MaxJobWaitSec(self) :
+        return self._maxJobWaitSec
 
 # ============================================================================
 # ============================================================================
@@ -0,0 +1,162 @@
+
+"""
+The MIT License (MIT)
+Copyright © 2019 Jean-Christophe Bos & HC² (www.hc2.fr)
+"""
+
+import gc
+
+try :
+    from collections import OrderedDict
+except ImportError :
+    from ucollections import OrderedDict
+
+# ============================================================================
+# ===( FileCache )============================================================
+# ============================================================================
+
+class FileCache :
+
+    # Keeps recently served files in RAM, at most "budget" bytes of them and
+    # none larger than "maxSize", keyed by filename and a version (mtime) so
+    # that a replaced file is read again, the least recently used files are
+    # dropped when the budget or the free memory ("minFree") is exceeded,
+
+    def __init__(self, budget=65536, maxSize=None, minFree=32768) :
+        if not isinstance(budget, int) or budget <= 0 :
+            raise ValueError('"budget" must be a positive integer.')
+        if maxSize is not None and (not isinstance(maxSize, int) or maxSize < 0) :
+            raise ValueError('"maxSize" must be a positive integer, zero or None.')
+        if not isinstance(minFree, int) or minFree < 0 :
+            raise ValueError('"minFree" must be a positive integer or zero.')
+        self._budget    = budget
+        self._maxSize   = budget // 4 if maxSize is None else maxSize
+        self._minFree   = minFree
+        self._size      = 0
+        self._hits      = 0
+        self._misses    = 0
+        self._evictions = 0
+        self._entries   = OrderedDict()
+
+    # ------------------------------------------------------------------------
+
+    def __len__(self) :
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+
+    @staticmethod
+    def _memFree() :
+        try :
+            return gc.mem_free()
+        except AttributeError :
+            return None
+
+    # ------------------------------------------------------------------------
+
+    def Get(self, filename, version, size=None) :
+        # Content of the file as a memoryview, read into the cache if needed,
+        # or None if it cannot be cached,
+        entry = self._entries.pop(filename, None)
+        if entry is not None :
+            if entry[0] == version :
+                self._entries[filename] = entry
+                self._hits += 1
+                return entry[1]
+            self._size -= len(entry[1])
+        self._misses += 1
+        if size is not None and size > self._maxSize :
+            return None
+        try :
+            with open(filename, 'rb') as file :
+                if size is None :
+                    size = file.seek(0, 2)
+                    file.seek(0)
+                if size > self._maxSize or not self._reserve(size) :
+                    return None
+                buf = bytearray(size)
+                n   = file.readinto(buf)
+        except (OSError, MemoryError) :
+            return None
+        data = memoryview(buf)[:n]
+        self._entries[filename] = (version, data)
+        self._size += n
+        return data
+
+    # ------------------------------------------------------------------------
+
+    def _reserve(self, size) :
+        while self._entries and self._size + size > self._budget :
+            self._evict()
+        free = FileCache._memFree()
+        if free is not None and free - size < self._minFree :
+            gc.collect()
+            while self._entries and FileCache._memFree() - size < self._minFree :
+                self._evict()
+                gc.collect()
+            return FileCache._memFree() - size >= self._minFree
+        return True
+
+    # ------------------------------------------------------------------------
+
+    def _evict(self) :
+        filename = next(iter(self._entries))
+        self._size      -= len(self._entries.pop(filename)[1])
+        self._evictions += 1
+
+    # ------------------------------------------------------------------------
+
+    def Trim(self) :
+        # Drops the least recently used files while the free memory is below
+        # "minFree" and returns their count,
+        count = 0
+        free  = FileCache._memFree()
+        if free is not None and free < self._minFree :
+            while self._entries and FileCache._memFree() < self._minFree :
+                self._evict()
+                gc.collect()
+                count += 1
+        return count
+
+    # ------------------------------------------------------------------------
+
+    def Invalidate(self, filename=None) :
+        if filename is None :
+            self._entries = OrderedDict()
+            self._size    = 0
+        elif filename in self._entries :
+            self._size -= len(self._entries.pop(filename)[1])
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def Budget(self) :
+        return self._budget
+
+    @property
+    def MaxSize(self) :
+        return self._maxSize
+
+    @property
+    def MinFree(self) :
+        return self._minFree
+
+    @property
+    def Size(self) :
+        return self._size
+
+    @property
+    def Hits(self) :
+        return self._hits
+
+    @property
+    def Misses(self) :
+        return self._misses
+
+    @property
+    def Evictions(self) :
+        return self._evictions
+
+# ============================================================================
+# ============================================================================
+# ============================================================================
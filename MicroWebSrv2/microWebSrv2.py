@@ -8,7 +8,9 @@ from .             import *
 from .httpRequest  import HttpRequest
 from os            import stat
 from sys           import implementation
-from _thread       import stack_size
+from time          import time as _time
+from _thread       import allocate_lock, stack_size
+from _thread       import start_new_thread as _startNewThread
 
 # ============================================================================
 # ===( MicroWebSrv2 )=========================================================
@@ -63,6 +65,10 @@ class MicroWebSrv2 :
 
     _STAT_MODE_DIR = 1 << 14
 
+    _STATIC_CACHE_MAX_ENTRIES = 128
+    _CANNED_MAX_ENTRIES       = 32
+    _LOG_RING_LEN             = 32
+
     DEBUG        = 0x00
     INFO         = 0x01
     WARNING      = 0x02
@@ -84,6 +90,8 @@ class MicroWebSrv2 :
         self._backlog         = None
         self._slotsCount      = None
         self._slotsSize       = None
+        self._largeSlotsCount = None
+        self._largeSlotsSize  = None
         self._keepAlloc       = None
         self._maxContentLen   = None
         self._bindAddr        = ('0.0.0.0', 80)
@@ -94,29 +102,37 @@ class MicroWebSrv2 :
         self._allowAllOrigins = False
         self._corsAllowAll    = False
         self._defaultHeaders  = { }
+        self._fileCache       = None
+        self._fileCacheLock   = allocate_lock()
+        self._staticCacheTTL  = 10
+        self._resolvedPaths   = { }
+        self._statResults     = { }
+        self._staticCacheLock = allocate_lock()
+        self._cannedResponses = { }
+        self._cannedKeys      = [ ]
+        self._cannedLock      = allocate_lock()
         self._onLogging       = None
+        self._logLevel        = MicroWebSrv2.DEBUG
+        self._logRing         = [ None ] * MicroWebSrv2._LOG_RING_LEN
+        self._logHead         = 0
+        self._logCount        = 0
+        self._logDropped      = 0
+        self._logLock         = allocate_lock()
+        self._logSignal       = allocate_lock()
+        self._logExited       = allocate_lock()
+        self._logThread       = False
+        self._logStop         = False
+        self._bufSlots        = None
+        self._asyncio         = None
+        self._loopSignal      = None
+        self._loopQueue       = [ ]
+        self._loopLock        = allocate_lock()
         self._xasSrv          = None
         self._xasPool         = None
         self.SetNormalConfig()
 
     # ------------------------------------------------------------------------
 
-    @staticmethod
-    def _physPathExists(physPath) :
-        try :
-            stat(physPath)
-            return True
-        except :
-            return False
-
-    # ------------------------------------------------------------------------
-
-    @staticmethod
-    def _physPathIsDir(physPath) :
-        return (stat(physPath)[0] & MicroWebSrv2._STAT_MODE_DIR != 0)
-
-    # ------------------------------------------------------------------------
-
     @staticmethod
     def LoadModule(modName) :
         if not isinstance(modName, str) or len(modName) == 0 :
@@ -167,6 +183,12 @@ class MicroWebSrv2 :
     @staticmethod
     def GetMimeTypeFromFilename(filename) :
         filename = filename.lower()
+        i        = filename.rfind('.')
+        if i >= 0 :
+            mimeType = MicroWebSrv2._MIME_TYPES.get(filename[i:])
+            if mimeType :
+                return mimeType
+        # Extensions added with several dots or without any,
         for ext in MicroWebSrv2._MIME_TYPES :
             if filename.endswith(ext) :
                 return MicroWebSrv2._MIME_TYPES[ext]
@@ -180,9 +202,10 @@ class MicroWebSrv2 :
         if self._xasSrv :
             raise MicroWebSrv2Exception('Server is already running.')
         try :
-            xBufSlots = XBufferSlots( slotsCount = self._slotsCount,
-                                      slotsSize  = self._slotsSize,
-                                      keepAlloc  = self._keepAlloc )
+            xBufSlots = XBufferSlots( slotsCount  = self._slotsCount,
+                                      slotsSize   = self._slotsSize,
+                                      keepAlloc   = self._keepAlloc,
+                                      sizeClasses = [ (self._largeSlotsCount, self._largeSlotsSize) ] )
         except :
             raise MicroWebSrv2Exception('Not enough memory to allocate slots.')
         try :
@@ -192,15 +215,19 @@ class MicroWebSrv2 :
                                                    bufSlots         = xBufSlots )
         except :
             raise MicroWebSrv2Exception('Cannot bind server on %s:%s.' % self._bindAddr)
+        self._bufSlots                = xBufSlots
         self._xasSrv.OnClientAccepted = self._onSrvClientAccepted
         self._xasSrv.OnClosed         = self._onSrvClosed
         self.Log('Server listening on %s:%s.' % self._bindAddr, MicroWebSrv2.INFO)
 
     # ------------------------------------------------------------------------
 
-    def StartManaged(self, parllProcCount=1, procStackSize=0) :
+    def StartManaged(self, parllProcCount=1, procStackSize=0, maxParllProcCount=None) :
         if not isinstance(parllProcCount, int) or parllProcCount < 0 :
             raise ValueError('"parllProcCount" must be a positive integer or zero.')
+        if maxParllProcCount is not None and \
+           ( not isinstance(maxParllProcCount, int) or maxParllProcCount < parllProcCount ) :
+            raise ValueError('"maxParllProcCount" must be an integer not lower than "parllProcCount" or None.')
         if not isinstance(procStackSize, int) or procStackSize < 0 :
             raise ValueError('"procStackSize" must be a positive integer or zero.')
         if self._xasSrv :
@@ -216,7 +243,9 @@ class MicroWebSrv2 :
             self.StartInPool(self._xasPool)
             try :
                 self.Log('Starts the managed pool to wait for I/O events.', MicroWebSrv2.INFO)
-                self._xasPool.AsyncWaitEvents(threadsCount=parllProcCount)
+                self._xasPool.AsyncWaitEvents( threadsCount     = parllProcCount,
+                                               maxThreadsCount  = maxParllProcCount,
+                                               threadsStackSize = procStackSize or None )
             except :
                 raise MicroWebSrv2Exception('Not enough memory to start %s parallel processes.' % parllProcCount)
         except Exception as ex :
@@ -230,6 +259,66 @@ class MicroWebSrv2 :
 
     # ------------------------------------------------------------------------
 
+    async def StartManagedAsync(self, parllProcCount=1, procStackSize=0, maxParllProcCount=None) :
+        # I/O events are still processed by the pool's threads but the route
+        # handlers declared with "async def", and the awaits on responses,
+        # run on the asyncio loop that awaits this until the server stops,
+        if not isinstance(parllProcCount, int) or parllProcCount <= 0 :
+            raise ValueError('"parllProcCount" must be an integer greater than zero.')
+        try :
+            import asyncio
+        except ImportError :
+            import uasyncio as asyncio
+        if hasattr(asyncio, 'ThreadSafeFlag') :
+            flag   = asyncio.ThreadSafeFlag()
+            signal = flag.set
+            wait   = flag.wait
+        else :
+            loop   = asyncio.get_event_loop()
+            event  = asyncio.Event()
+            signal = lambda : loop.call_soon_threadsafe(event.set)
+            async def wait() :
+                await event.wait()
+                event.clear()
+        self._asyncio    = asyncio
+        self._loopSignal = signal
+        # The loop only keeps weak references to the tasks on CPython, they
+        # are kept here until they are done,
+        tasks            = set()
+        try :
+            self.StartManaged(parllProcCount, procStackSize, maxParllProcCount)
+            while self._xasPool :
+                await wait()
+                with self._loopLock :
+                    items           = self._loopQueue
+                    self._loopQueue = [ ]
+                for item in items :
+                    if hasattr(item, 'send') :
+                        task = asyncio.create_task(item)
+                        if hasattr(task, 'add_done_callback') :
+                            tasks.add(task)
+                            task.add_done_callback(tasks.discard)
+                    else :
+                        item()
+        finally :
+            self._loopSignal = None
+            self.Stop()
+
+    # ------------------------------------------------------------------------
+
+    def _postToLoop(self, item) :
+        # Hands a coroutine, or a function to call, to the asyncio loop of
+        # StartManagedAsync() from any thread,
+        signal = self._loopSignal
+        if not signal :
+            return False
+        with self._loopLock :
+            self._loopQueue.append(item)
+        signal()
+        return True
+
+    # ------------------------------------------------------------------------
+
     def Stop(self) :
         if self._xasSrv :
             self._xasSrv.Close()
@@ -238,10 +327,118 @@ class MicroWebSrv2 :
             self.Log('Stops the managed pool.', MicroWebSrv2.INFO)
             self._xasPool.StopWaitEvents()
             self._xasPool = None
+        if self._loopSignal :
+            try :
+                self._loopSignal()
+            except :
+                pass
+        self._stopLogThread()
 
     # ------------------------------------------------------------------------
 
-    def Log(self, msg, msgType) :
+    def Log(self, msg, msgType, *args) :
+        # Messages are only stored in a ring of fixed size, they are
+        # formatted and written out by a thread draining it while the server
+        # runs (by Log itself otherwise), new messages are dropped and
+        # counted when the ring is full,
+        if msgType < self._logLevel :
+            return
+        with self._logLock :
+            if self._logCount == MicroWebSrv2._LOG_RING_LEN :
+                self._logDropped += 1
+                return
+            pos = (self._logHead + self._logCount) % MicroWebSrv2._LOG_RING_LEN
+            self._logRing[pos] = (msgType, msg, args)
+            self._logCount    += 1
+            if not self._logThread and self._xasSrv :
+                self._logThread = self._startLogThread()
+            thread = self._logThread
+        if thread :
+            try :
+                self._logSignal.release()
+            except :
+                pass
+        else :
+            self._drainLog()
+
+    # ------------------------------------------------------------------------
+
+    def _startLogThread(self) :
+        # Without threads, messages are written out by Log itself,
+        # the locks are held here whatever state a previous thread left
+        # them in, "_logExited" is only released when the thread ends,
+        self._logStop = False
+        self._logSignal.acquire(0)
+        self._logExited.acquire(0)
+        try :
+            _startNewThread(self._logThreadProcess, ())
+            return True
+        except :
+            self._logSignal.release()
+            self._logExited.release()
+            return False
+
+    # ------------------------------------------------------------------------
+
+    def _stopLogThread(self) :
+        # Wakes the thread up to make it end, waits for it and writes out
+        # what was logged meanwhile,
+        with self._logLock :
+            if not self._logThread :
+                return
+            self._logStop = True
+        try :
+            self._logSignal.release()
+        except :
+            pass
+        self._logExited.acquire()
+        self._logExited.release()
+        with self._logLock :
+            self._logThread = False
+        self._drainLog()
+
+    # ------------------------------------------------------------------------
+
+    def _logThreadProcess(self) :
+        try :
+            while True :
+                self._logSignal.acquire()
+                self._drainLog()
+                if self._logStop :
+                    break
+        finally :
+            self._logExited.release()
+
+    # ------------------------------------------------------------------------
+
+    def _drainLog(self) :
+        while True :
+            with self._logLock :
+                dropped = self._logDropped
+                if dropped :
+                    self._logDropped = 0
+                    entry            = None
+                elif self._logCount :
+                    entry                         = self._logRing[self._logHead]
+                    self._logRing[self._logHead]  = None
+                    self._logHead                 = (self._logHead + 1) % MicroWebSrv2._LOG_RING_LEN
+                    self._logCount               -= 1
+                else :
+                    return
+            if dropped :
+                self._writeLog('%s log messages dropped.' % dropped, MicroWebSrv2.WARNING)
+            else :
+                msgType, msg, args = entry
+                if args :
+                    try :
+                        msg = msg % args
+                    except Exception :
+                        msg = '%s %s' % (msg, args)
+                self._writeLog(msg, msgType)
+
+    # ------------------------------------------------------------------------
+
+    def _writeLog(self, msg, msgType) :
         if self._onLogging :
             try :
                 self._onLogging(self, str(msg), msgType)
@@ -258,18 +455,91 @@ class MicroWebSrv2 :
     def ResolvePhysicalPath(self, urlPath) :
         if not isinstance(urlPath, str) or len(urlPath) == 0 :
             raise ValueError('"urlPath" must be a not empty string.')
+        resolved = self._getStaticCache(self._resolvedPaths, urlPath)
+        if resolved :
+            return resolved[0]
+        physPath = self._rootPath + urlPath.replace('..', '/')
+        if physPath.endswith('/') :
+            physPath = physPath[:-1]
+        st = self.StatPhysicalPath(physPath)
+        if st is None :
+            physPath = None
+        elif st[0] & MicroWebSrv2._STAT_MODE_DIR != 0 :
+            for filename in MicroWebSrv2._DEFAULT_PAGES :
+                p = physPath + '/' + filename
+                if self.StatPhysicalPath(p) is not None :
+                    physPath = p
+                    break
+        self._setStaticCache(self._resolvedPaths, urlPath, (physPath, ))
+        return physPath
+
+    # ------------------------------------------------------------------------
+
+    def StatPhysicalPath(self, physPath) :
+        # Result of "stat" for physPath, or None if it does not exist, both
+        # kept in the static cache for "StaticCacheTTLSec" seconds,
+        result = self._getStaticCache(self._statResults, physPath)
+        if result :
+            return result[0]
         try :
-            physPath = self._rootPath + urlPath.replace('..', '/')
-            if physPath.endswith('/') :
-                physPath = physPath[:-1]
-            if MicroWebSrv2._physPathIsDir(physPath) :
-                for filename in MicroWebSrv2._DEFAULT_PAGES :
-                    p = physPath + '/' + filename
-                    if MicroWebSrv2._physPathExists(p) :
-                        return p
-            return physPath
+            st = stat(physPath)
         except :
-            return None
+            st = None
+        self._setStaticCache(self._statResults, physPath, (st, ))
+        return st
+
+    # ------------------------------------------------------------------------
+
+    def _getStaticCache(self, cache, key) :
+        with self._staticCacheLock :
+            entry = cache.get(key)
+        if entry and entry[0] > _time() :
+            return entry[1]
+        return None
+
+    # ------------------------------------------------------------------------
+
+    def _setStaticCache(self, cache, key, value) :
+        # When full, the entry expiring first (the oldest one set) is
+        # evicted, the caches are shared by the pool's threads,
+        if self._staticCacheTTL :
+            with self._staticCacheLock :
+                if key not in cache and \
+                   len(cache) >= MicroWebSrv2._STATIC_CACHE_MAX_ENTRIES :
+                    del cache[min(cache, key=lambda k : cache[k][0])]
+                cache[key] = (_time() + self._staticCacheTTL, value)
+
+    # ------------------------------------------------------------------------
+
+    def InvalidateStaticCache(self) :
+        with self._staticCacheLock :
+            self._resolvedPaths.clear()
+            self._statResults.clear()
+
+    # ------------------------------------------------------------------------
+
+    def _getCannedResponse(self, key) :
+        return self._cannedResponses.get(key)
+
+    # ------------------------------------------------------------------------
+
+    def _setCannedResponse(self, key, data) :
+        # The oldest response is evicted when full, keys are kept in their
+        # insertion order as dicts may not keep it on MicroPython,
+        with self._cannedLock :
+            if key in self._cannedResponses :
+                return
+            if len(self._cannedKeys) >= MicroWebSrv2._CANNED_MAX_ENTRIES :
+                del self._cannedResponses[self._cannedKeys.pop(0)]
+            self._cannedResponses[key] = data
+            self._cannedKeys.append(key)
+
+    # ------------------------------------------------------------------------
+
+    def _clearCannedResponses(self) :
+        with self._cannedLock :
+            self._cannedResponses.clear()
+            self._cannedKeys.clear()
 
     # ------------------------------------------------------------------------
 
@@ -335,41 +605,49 @@ class MicroWebSrv2 :
 
     def SetEmbeddedConfig(self) :
         self._validateChangeConf()
-        self._backlog       = 8
-        self._slotsCount    = 16
-        self._slotsSize     = 1024
-        self._keepAlloc     = True
-        self._maxContentLen = 16*1024
+        self._backlog         = 8
+        self._slotsCount      = 16
+        self._slotsSize       = 1024
+        self._largeSlotsCount = 0
+        self._largeSlotsSize  = 4*1024
+        self._keepAlloc       = True
+        self._maxContentLen   = 16*1024
 
     # ------------------------------------------------------------------------
 
     def SetLightConfig(self) :
         self._validateChangeConf()
-        self._backlog       = 64
-        self._slotsCount    = 128
-        self._slotsSize     = 1024
-        self._keepAlloc     = True
-        self._maxContentLen = 512*1024
+        self._backlog         = 64
+        self._slotsCount      = 128
+        self._slotsSize       = 1024
+        self._largeSlotsCount = 0
+        self._largeSlotsSize  = 8*1024
+        self._keepAlloc       = True
+        self._maxContentLen   = 512*1024
 
     # ------------------------------------------------------------------------
 
     def SetNormalConfig(self) :
         self._validateChangeConf()
-        self._backlog       = 256
-        self._slotsCount    = 512
-        self._slotsSize     = 4*1024
-        self._keepAlloc     = True
-        self._maxContentLen = 2*1024*1024
+        self._backlog         = 256
+        self._slotsCount      = 512
+        self._slotsSize       = 4*1024
+        self._largeSlotsCount = 16
+        self._largeSlotsSize  = 32*1024
+        self._keepAlloc       = True
+        self._maxContentLen   = 2*1024*1024
 
     # ------------------------------------------------------------------------
 
     def SetLargeConfig(self) :
         self._validateChangeConf()
-        self._backlog       = 512
-        self._slotsCount    = 2048
-        self._slotsSize     = 16*1024
-        self._keepAlloc     = True
-        self._maxContentLen = 8*1024*1024
+        self._backlog         = 512
+        self._slotsCount      = 2048
+        self._slotsSize       = 16*1024
+        self._largeSlotsCount = 64
+        self._largeSlotsSize  = 64*1024
+        self._keepAlloc       = True
+        self._maxContentLen   = 8*1024*1024
 
     # ------------------------------------------------------------------------
 
@@ -420,6 +698,44 @@ class MicroWebSrv2 :
 
     # ------------------------------------------------------------------------
 
+    @property
+    def LargeBufferSlotsCount(self) :
+        return self._largeSlotsCount
+
+    @LargeBufferSlotsCount.setter
+    def LargeBufferSlotsCount(self, value) :
+        if not isinstance(value, int) or value < 0 :
+            raise ValueError('"LargeBufferSlotsCount" must be a positive integer or zero.')
+        self._validateChangeConf('"LargeBufferSlotsCount"')
+        self._largeSlotsCount = value
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def LargeBufferSlotSize(self) :
+        return self._largeSlotsSize
+
+    @LargeBufferSlotSize.setter
+    def LargeBufferSlotSize(self, value) :
+        if not isinstance(value, int) or value <= 0 :
+            raise ValueError('"LargeBufferSlotSize" must be a positive integer.')
+        self._validateChangeConf('"LargeBufferSlotSize"')
+        self._largeSlotsSize = value
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def BufferSlots(self) :
+        return self._bufSlots
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def Workers(self) :
+        return self._xasPool.Workers if self._xasPool else None
+
+    # ------------------------------------------------------------------------
+
     @property
     def KeepAllocBufferSlots(self) :
         return self._keepAlloc
@@ -490,6 +806,7 @@ class MicroWebSrv2 :
         if not isinstance(value, int) or value <= 0 :
             raise ValueError('"RequestsTimeoutSec" must be a positive integer.')
         self._timeoutSec = value
+        self._clearCannedResponses()
 
     # ------------------------------------------------------------------------
 
@@ -526,6 +843,7 @@ class MicroWebSrv2 :
         if not isinstance(value, bool) :
             raise ValueError('"CORSAllowAll" must be a boolean.')
         self._corsAllowAll = value
+        self._clearCannedResponses()
 
     # ------------------------------------------------------------------------
 
@@ -538,6 +856,44 @@ class MicroWebSrv2 :
         if not isinstance(value, dict) :
             raise ValueError('"DefaultHeaders" must be a dict.')
         self._defaultHeaders = value.copy()
+        self._clearCannedResponses()
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def FileCache(self) :
+        return self._fileCache
+
+    @FileCache.setter
+    def FileCache(self, value) :
+        if value is not None and not isinstance(value, FileCache) :
+            raise ValueError('"FileCache" must be a FileCache class or None.')
+        self._fileCache = value
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def StaticCacheTTLSec(self) :
+        return self._staticCacheTTL
+
+    @StaticCacheTTLSec.setter
+    def StaticCacheTTLSec(self, value) :
+        if not isinstance(value, int) or value < 0 :
+            raise ValueError('"StaticCacheTTLSec" must be a positive integer or zero.')
+        self._staticCacheTTL = value
+        self.InvalidateStaticCache()
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def LogLevel(self) :
+        return self._logLevel
+
+    @LogLevel.setter
+    def LogLevel(self, value) :
+        if value not in MicroWebSrv2.MSG_TYPE_STR :
+            raise ValueError('"LogLevel" must be DEBUG, INFO, WARNING or ERROR.')
+        self._logLevel = value
 
     # ------------------------------------------------------------------------
 
@@ -7,6 +7,70 @@ Copyright © 2019 Jean-Christophe Bos & HC² (www.hc2.fr)
 from hashlib  import sha1
 from binascii import b2a_base64
 from struct   import pack
+from _thread  import allocate_lock
+
+# ============================================================================
+# ===( Payload unmasking )====================================================
+# ============================================================================
+
+# Unmasking is done word-at-a-time: on MicroPython by a viper function that
+# XORs 32 bits words in place (compiled from source to keep this module
+# loadable on ports without native code emitter), elsewhere by XORing 1 KB
+# chunks as big integers, and byte per byte as a last resort,
+
+_UNMASK_CHUNK_LEN = 1024
+
+_VIPER_UNMASK_SRC = """
+@micropython.viper
+def _unmaskViper(buf:ptr8, n:int, key:ptr8) :
+    addr = int(buf)
+    i    = 0
+    while i < n and (addr + i) & 3 != 0 :
+        buf[i] = buf[i] ^ key[i & 3]
+        i += 1
+    s  = i & 3
+    k  = key[s] | (key[(s+1) & 3] << 8) | (key[(s+2) & 3] << 16) | (key[(s+3) & 3] << 24)
+    w  = ptr32(addr + i)
+    wn = (n - i) >> 2
+    j  = 0
+    while j < wn :
+        w[j] = w[j] ^ k
+        j += 1
+    i += wn << 2
+    while i < n :
+        buf[i] = buf[i] ^ key[i & 3]
+        i += 1
+"""
+
+try :
+    import micropython
+    exec(_VIPER_UNMASK_SRC)
+except :
+    _unmaskViper = None
+
+try :
+    _bigIntXOR = (int.from_bytes(b'\xFF' * _UNMASK_CHUNK_LEN, 'little') > 0)
+except :
+    _bigIntXOR = False
+
+def _unmask(data, maskingKey) :
+    n = len(data)
+    if _unmaskViper :
+        _unmaskViper(data, n, maskingKey)
+    elif _bigIntXOR :
+        view = memoryview(data)
+        size = min(_UNMASK_CHUNK_LEN, (n + 3) & ~3)
+        key  = int.from_bytes(maskingKey * (size >> 2), 'little')
+        i    = 0
+        while i < n :
+            if n - i < size :
+                size = n - i
+                key &= (1 << (size << 3)) - 1
+            view[i:i+size] = ( int.from_bytes(view[i:i+size], 'little') ^ key ).to_bytes(size, 'little')
+            i += size
+    else :
+        for i in range(n) :
+            data[i] ^= maskingKey[i & 3]
 
 # ============================================================================
 # ===( MicroWebSrv2 : WebSockets Module )=====================================
@@ -57,6 +121,11 @@ class WebSockets :
 
     # ------------------------------------------------------------------------
 
+    def CreateHub(self, maxQueueLength=8, overflowPolicy=None) :
+        return WebSocketsHub(maxQueueLength, overflowPolicy)
+
+    # ------------------------------------------------------------------------
+
     @property
     def OnWebSocketProtocol(self) :
         return self._onWebSocketProtocol
@@ -95,6 +164,15 @@ class WebSocket :
     _MSG_TYPE_TEXT  = 0x01
     _MSG_TYPE_BIN   = 0x02
 
+    _ST_HEADER      = 0x00
+    _ST_LEN_16      = 0x01
+    _ST_LEN_64      = 0x02
+    _ST_MASK        = 0x03
+    _ST_PAYLOAD     = 0x04
+    _ST_CONTROL     = 0x05
+
+    _MSG_BUF_MIN_LEN = 256
+
     # ------------------------------------------------------------------------
 
     def __init__(self, wsMod, mws2, request) :
@@ -103,22 +181,46 @@ class WebSocket :
         self._request             = request
         self._xasCli              = request.XAsyncTCPClient
         self._currentMsgType      = None
-        self._currentMsgData      = None
         self._isClosed            = False
         self._waitFrameTimeoutSec = 300
         self._maxRecvMsgLen       = mws2.MaxRequestContentLength
         self._onTextMsg           = None
         self._onBinMsg            = None
         self._onClosed            = None
+        self._hubs                = None
+
+        # Frame parser state and its fixed scratch buffers: the header and
+        # its extended length share one area, each field having its own
+        # view created once, to receive frames without any allocation,
+        self._state               = WebSocket._ST_HEADER
+        self._fin                 = False
+        self._opcode              = 0
+        self._masked              = False
+        self._frameLen            = 0
+        self._hdrBuf              = bytearray(10)
+        hdrView                   = memoryview(self._hdrBuf)
+        self._hdrView             = hdrView[:2]
+        self._len16View           = hdrView[2:4]
+        self._len64View           = hdrView[2:10]
+        self._maskingKey          = bytearray(4)
+        self._maskView            = memoryview(self._maskingKey)
+        self._ctrlView            = memoryview(bytearray(0x7D))
+        self._onFrameRecv         = self._onFrameDataRecv
+
+        # Reassembly buffer, grown on demand up to the max message length
+        # and kept from message to message,
+        self._msgBuf              = None
+        self._msgView             = None
+        self._msgLen              = 0
 
         onWSAccepted    = wsMod.OnWebSocketAccepted
 
-        self._mws2.Log( '%sWebSocket %s from %s:%s.'
-                        % ( ('SSL-' if request.IsSSL else ''),
-                            'accepted' if onWSAccepted else 'denied',
-                            self._xasCli.CliAddr[0],
-                            self._xasCli.CliAddr[1] ),
-                        self._mws2.INFO )
+        self._mws2.Log( '%sWebSocket %s from %s:%s.',
+                        self._mws2.INFO,
+                        ('SSL-' if request.IsSSL else ''),
+                        'accepted' if onWSAccepted else 'denied',
+                        self._xasCli.CliAddr[0],
+                        self._xasCli.CliAddr[1] )
 
         if not onWSAccepted :
             self._close(1001, 'Going away...')
@@ -138,15 +240,21 @@ class WebSocket :
 
     # ------------------------------------------------------------------------
 
-    def _recvData(self, onRecv, size=None) :
-        self._xasCli.AsyncRecvData( size       = size,
-                                    onDataRecv = onRecv,
-                                    timeoutSec = self._mws2.RequestsTimeoutSec )
+    def _recvData(self, state, recvBuf, timeoutSec=None) :
+        self._state = state
+        self._xasCli.AsyncRecvData( onDataRecv = self._onFrameRecv,
+                                    timeoutSec = timeoutSec or self._mws2.RequestsTimeoutSec,
+                                    recvBuf    = recvBuf )
 
     # ------------------------------------------------------------------------
 
     def _onXAsCliClosed(self, xasCli, closedReason) :
         self._isClosed = True
+        self._msgBuf   = None
+        self._msgView  = None
+        if self._hubs :
+            for hub in self._hubs[:] :
+                hub.Unsubscribe(self)
         if self._onClosed :
             try :
                 self._onClosed(self)
@@ -157,13 +265,23 @@ class WebSocket :
     # ------------------------------------------------------------------------
 
     def _waitFrame(self) :
-        
-        def onHdrStartingRecv(xasCli, data, arg) :
+        self._recvData(WebSocket._ST_HEADER, self._hdrView, self._waitFrameTimeoutSec)
+
+    # ------------------------------------------------------------------------
+
+    def _onFrameDataRecv(self, xasCli, data, arg) :
+
+        state = self._state
 
-            fin    = data[0] & 0x80 > 0
-            opcode = data[0] & 0x0F
-            masked = data[1] & 0x80 > 0
-            length = data[1] & 0x7F
+        if state == WebSocket._ST_HEADER :
+            # Frame starts with 2 bytes of header,
+            hdr           = self._hdrBuf
+            fin           = hdr[0] & 0x80 > 0
+            opcode        = hdr[0] & 0x0F
+            length        = hdr[1] & 0x7F
+            self._fin     = fin
+            self._opcode  = opcode
+            self._masked  = hdr[1] & 0x80 > 0
 
             # Control frame ?
             isCtrlFrame = ( opcode != WebSocket._OP_FRAME_TEXT and \
@@ -180,163 +298,190 @@ class WebSocket :
                    opcode == WebSocket._OP_FRAME_BIN ) ) :
                 # Bad frame in the context,
                 self._close(1002, 'Protocol error (bad frame in the context)')
-                return
-
-            def endOfHeader(dataLen, maskingKey) :
-
-                def onPayloadDataRecv(xasCli, data, arg) :
-
-                    if maskingKey :
-                        for i in range(dataLen) :
-                            data[i] ^= maskingKey[i%4]
-                    
-                    if self._currentMsgData :
-                        try :
-                            self._currentMsgData += data
-                        except :
-                            # Frame is too large for memory allocation,
-                            self._close(1009, 'Frame is too large to be processed')
-                            return
-                    else :
-                        self._currentMsgData = data
-
-                    if fin :
-                        # Frame is fully received,
-                        if self._currentMsgType == WebSocket._MSG_TYPE_TEXT :
-                            # Text frame,
-                            if self._onTextMsg :
-                                try :
-                                    msg = bytes(self._currentMsgData).decode('UTF-8')
-                                    try :
-                                        self._onTextMsg(self, msg)
-                                    except Exception as ex :
-                                        self._mws2.Log( 'Exception raised from "WebSocket.OnTextMessage" handler: %s' % ex,
-                                                        self._mws2.ERROR )
-                                        self._close(1011, 'Unexpected error while processing text message')
-                                        return
-                                except :
-                                    self._mws2.Log( 'Error during UTF-8 decoding of websocket text message.',
-                                                    self._mws2.WARNING )
-                                    self._close(1007, 'Error to decode UTF-8 text message')
-                                    return
-                            else :
-                                self._close(1003, 'Text messages are not implemented')
-                                return
-                        elif self._currentMsgType == WebSocket._MSG_TYPE_BIN :
-                            # Binary frame,
-                            if self._onBinMsg :
-                                try :
-                                    self._onBinMsg(self, bytes(self._currentMsgData))
-                                except Exception as ex :
-                                    self._mws2.Log( 'Exception raised from "WebSocket.OnBinaryMessage" handler: %s' % ex,
-                                                    self._mws2.ERROR )
-                                    self._close(1011, 'Unexpected error while processing binary message')
-                                    return
-                            else :
-                                self._close(1003, 'Binary messages are not implemented')
-                                return
-
-                        self._currentMsgType = None
-                        self._currentMsgData = None
-                    
-                    self._waitFrame()
-                    
-                    # - End of onPayloadDataRecv -
-
-                if not isCtrlFrame :
-                    # Message frame or continuation frame,
-                    if self._maxRecvMsgLen :
-                        l = dataLen
-                        if self._currentMsgData :
-                            l += len(self._currentMsgData)
-                        if l > self._maxRecvMsgLen :
-                            # Message length exceeds the defined limit,
-                            self._close(1009, 'Frame is too large to be processed')
-                            return
-                    if opcode == WebSocket._OP_FRAME_TEXT :
-                        self._currentMsgType = WebSocket._MSG_TYPE_TEXT
-                    elif opcode == WebSocket._OP_FRAME_BIN :
-                        self._currentMsgType = WebSocket._MSG_TYPE_BIN
-                    try :
-                        self._recvData(onPayloadDataRecv, dataLen)
-                    except :
-                        # Frame is too large for memory allocation,
-                        self._close(1009, 'Frame is too large to be processed')
-                elif opcode == WebSocket._OP_FRAME_PING :
-                    # Ping control frame,
-                    if dataLen > 0 :
-                        def onPingDataRecv(xasCli, data, arg) :
-                            data = bytearray(data)
-                            self._sendFrame(WebSocket._OP_FRAME_PONG, data)
-                            self._waitFrame()
-                        self._recvData(onPingDataRecv, dataLen)
-                    else :
-                        self._sendFrame(WebSocket._OP_FRAME_PONG)
-                        self._waitFrame()
-                elif opcode == WebSocket._OP_FRAME_PONG :
-                    # Pong control frame,
-                    if dataLen > 0 :
-                        def onPongDataRecv(xasCli, data, arg) :
-                            self._waitFrame()
-                        self._recvData(onPongDataRecv, dataLen)
-                    else :
-                        self._waitFrame()
-                elif opcode == WebSocket._OP_FRAME_CLOSE :
-                    # Close control frame,')
-                    if dataLen > 0 :
-                        def onCloseDataRecv(xasCli, data, arg) :
-                            self._close()
-                        self._recvData(onCloseDataRecv, dataLen)
-                    else :
-                        self._close()
-                else :
-                    # Unknown frame type,
-                    self._close(1002, 'Protocol error (bad opcode)')
-
-                # - End of endOfHeader -
-
-            def getMaskingKey(dataLen) :
-                
-                if masked :
-                    # Frame is masked by the next 4 bytes key,
-                    def onMaskingKeyRecv(xasCli, data, arg) :
-                        endOfHeader(dataLen=dataLen, maskingKey=bytes(data))
-                    self._recvData(onMaskingKeyRecv, 4)
-                else :
-                    # Frame is not masked,
-                    endOfHeader(dataLen=dataLen, maskingKey=None)
-
-                # - End of getMaskingKey -
-
-            if length == 0 and not isCtrlFrame :
+            elif length == 0 and not isCtrlFrame :
                 # Bad frame for a no control frame without payload data,
                 self._close(1002, 'Protocol error (payload data required)')
             elif length <= 0x7D :
                 # Frame length <= 0x7D,
-                getMaskingKey(dataLen=length)
+                self._onFrameLength(length)
             elif isCtrlFrame :
                 # Bad frame for length of control frame > 0x7D,
                 self._close(1002, 'Protocol error (bad control frame length)')
             elif length == 0x7E :
                 # Frame length is encoded on next 16 bits,
-                def onLenExt1Recv(xasCli, data, arg) :
-                    length = (data[0] << 8) + data[1]
-                    if length < 0x7E :
-                        # Bad frame for 16 bits length < 0x7E,
-                        self._close(1002, 'Protocol error (bad length encoding)')
-                    else :
-                        getMaskingKey(dataLen=length)
-                self._recvData(onLenExt1Recv, 2)
+                self._recvData(WebSocket._ST_LEN_16, self._len16View)
             else :
-                # Frame length is encoded on next 64 bits.
-                # It's too large and not implemented,
+                # Frame length is encoded on next 64 bits,
+                self._recvData(WebSocket._ST_LEN_64, self._len64View)
+
+        elif state == WebSocket._ST_LEN_16 :
+            length = (self._hdrBuf[2] << 8) + self._hdrBuf[3]
+            if length < 0x7E :
+                # Bad frame for 16 bits length < 0x7E,
+                self._close(1002, 'Protocol error (bad length encoding)')
+            else :
+                self._onFrameLength(length)
+
+        elif state == WebSocket._ST_LEN_64 :
+            hdr = self._hdrBuf
+            if hdr[2] & 0x80 :
+                # Bad frame for most significant bit set,
+                self._close(1002, 'Protocol error (bad length encoding)')
+                return
+            length = 0
+            for i in range(2, 10) :
+                length = (length << 8) + hdr[i]
+            if length <= 0xFFFF :
+                # Bad frame for 64 bits length <= 0xFFFF,
+                self._close(1002, 'Protocol error (bad length encoding)')
+            else :
+                self._onFrameLength(length)
+
+        elif state == WebSocket._ST_MASK :
+            self._onFrameHeaderEnd()
+
+        elif state == WebSocket._ST_PAYLOAD :
+            # Message frame or continuation frame fully received,
+            if self._masked :
+                _unmask(data, self._maskingKey)
+            self._msgLen += self._frameLen
+            if self._fin and not self._onMessage() :
+                return
+            self._waitFrame()
+
+        elif state == WebSocket._ST_CONTROL :
+            if self._masked :
+                _unmask(data, self._maskingKey)
+            self._onControlFrame(data)
+
+    # ------------------------------------------------------------------------
+
+    def _onFrameLength(self, length) :
+        self._frameLen = length
+        if self._opcode <= WebSocket._OP_FRAME_BIN :
+            # Message frame or continuation frame,
+            size = self._msgLen + length
+            if self._maxRecvMsgLen and size > self._maxRecvMsgLen :
+                # Message length exceeds the defined limit,
+                self._close(1009, 'Frame is too large to be processed')
+                return
+            try :
+                self._reserveMsgBuf(size)
+            except :
+                # Frame is too large for memory allocation,
                 self._close(1009, 'Frame is too large to be processed')
+                return
+            if self._opcode == WebSocket._OP_FRAME_TEXT :
+                self._currentMsgType = WebSocket._MSG_TYPE_TEXT
+            elif self._opcode == WebSocket._OP_FRAME_BIN :
+                self._currentMsgType = WebSocket._MSG_TYPE_BIN
+        if self._masked :
+            # Frame is masked by the next 4 bytes key,
+            self._recvData(WebSocket._ST_MASK, self._maskView)
+        else :
+            # Frame is not masked,
+            self._onFrameHeaderEnd()
+
+    # ------------------------------------------------------------------------
+
+    def _onFrameHeaderEnd(self) :
+        opcode = self._opcode
+        length = self._frameLen
+        if opcode <= WebSocket._OP_FRAME_BIN :
+            # Payload is received in place at the end of the message,
+            pos = self._msgLen
+            self._recvData(WebSocket._ST_PAYLOAD, self._msgView[pos:pos+length])
+        elif opcode == WebSocket._OP_FRAME_PING or \
+             opcode == WebSocket._OP_FRAME_PONG or \
+             opcode == WebSocket._OP_FRAME_CLOSE :
+            if length > 0 :
+                self._recvData(WebSocket._ST_CONTROL, self._ctrlView[:length])
+            else :
+                self._onControlFrame(None)
+        else :
+            # Unknown frame type,
+            self._close(1002, 'Protocol error (bad opcode)')
+
+    # ------------------------------------------------------------------------
 
-            # - End of onHdrStartingRecv -
+    def _onControlFrame(self, data) :
+        if self._opcode == WebSocket._OP_FRAME_PING :
+            # Ping control frame,
+            self._sendFrame(WebSocket._OP_FRAME_PONG, data)
+            self._waitFrame()
+        elif self._opcode == WebSocket._OP_FRAME_PONG :
+            # Pong control frame,
+            self._waitFrame()
+        else :
+            # Close control frame,
+            self._close()
 
-        self._xasCli.AsyncRecvData( size       = 2,
-                                    onDataRecv = onHdrStartingRecv,
-                                    timeoutSec = self._waitFrameTimeoutSec )
+    # ------------------------------------------------------------------------
+
+    def _reserveMsgBuf(self, size) :
+        buf = self._msgBuf
+        if not buf or len(buf) < size :
+            newSize = max(size, (len(buf) * 2) if buf else WebSocket._MSG_BUF_MIN_LEN)
+            if self._maxRecvMsgLen :
+                newSize = min(newSize, self._maxRecvMsgLen)
+            newBuf = bytearray(newSize)
+            if self._msgLen :
+                newBuf[:self._msgLen] = self._msgView[:self._msgLen]
+            self._msgBuf  = newBuf
+            self._msgView = memoryview(newBuf)
+
+    # ------------------------------------------------------------------------
+
+    def _onMessage(self) :
+        msgType              = self._currentMsgType
+        msgData              = self._msgView[:self._msgLen]
+        self._currentMsgType = None
+        self._msgLen         = 0
+        if msgType == WebSocket._MSG_TYPE_TEXT :
+            # Text message,
+            if self._onTextMsg :
+                try :
+                    msg = str(msgData, 'UTF-8')
+                except :
+                    self._mws2.Log( 'Error during UTF-8 decoding of websocket text message.',
+                                    self._mws2.WARNING )
+                    self._close(1007, 'Error to decode UTF-8 text message')
+                    return False
+                try :
+                    self._onTextMsg(self, msg)
+                except Exception as ex :
+                    self._mws2.Log( 'Exception raised from "WebSocket.OnTextMessage" handler: %s' % ex,
+                                    self._mws2.ERROR )
+                    self._close(1011, 'Unexpected error while processing text message')
+                    return False
+            else :
+                self._close(1003, 'Text messages are not implemented')
+                return False
+        elif msgType == WebSocket._MSG_TYPE_BIN :
+            # Binary message,
+            if self._onBinMsg :
+                try :
+                    self._onBinMsg(self, bytes(msgData))
+                except Exception as ex :
+                    self._mws2.Log( 'Exception raised from "WebSocket.OnBinaryMessage" handler: %s' % ex,
+                                    self._mws2.ERROR )
+                    self._close(1011, 'Unexpected error while processing binary message')
+                    return False
+            else :
+                self._close(1003, 'Binary messages are not implemented')
+                return False
+        return True
+
+    # ------------------------------------------------------------------------
+
+    @staticmethod
+    def _frameHeader(opcode, length, fin=True) :
+        b0 = (opcode | 0x80) if fin else opcode
+        if length <= 0x7D :
+            return bytes([ b0, length ])
+        if length <= 0xFFFF :
+            return bytes([ b0, 0x7E ]) + pack('>H', length)
+        return bytes([ b0, 0x7F ]) + pack('>Q', length)
 
     # ------------------------------------------------------------------------
 
@@ -344,12 +489,14 @@ class WebSocket :
         try :
             if opcode >= 0x00 and opcode <= 0x0F :
                 length = len(data) if data else 0
-                if length <= 0xFFFF :
-                    data = bytes([ (opcode | 0x80) if fin else opcode ] )  \
-                         + bytes([ length if length <= 0x7D else 0x7E ] )  \
-                         + (pack('>H', length) if length >= 0x7E else b'') \
-                         + (bytes(data) if data else b'')
-                    return self._xasCli.AsyncSendData(data)
+                hdr    = WebSocket._frameHeader(opcode, length, fin)
+                if not length :
+                    return self._xasCli.AsyncSendData(hdr)
+                # Header and payload are queued together as two buffers to
+                # avoid copying the payload, that is sent as is if immutable,
+                if not isinstance(data, bytes) :
+                    data = bytes(data)
+                return self._xasCli.AsyncSendDataList((hdr, data))
         except :
             pass
         return False
@@ -472,6 +619,222 @@ class WebSocket :
             raise ValueError('"OnClosed" must be a function.')
         self._onClosed = value
 
+# ============================================================================
+# ===( WebSocketsHub )========================================================
+# ============================================================================
+
+class WebSocketsHub :
+
+    DROP_OLDEST     = 0x01
+    COALESCE_LATEST = 0x02
+    DISCONNECT      = 0x03
+
+    _POLICIES       = (DROP_OLDEST, COALESCE_LATEST, DISCONNECT)
+
+    # ------------------------------------------------------------------------
+
+    def __init__(self, maxQueueLength=8, overflowPolicy=None) :
+        # Each subscriber has one batch of frames in flight at most on its
+        # socket and a bounded queue of (channel, frame) waiting for it,
+        self._channels      = { }
+        self._queues        = { }
+        self._lock          = allocate_lock()
+        self._maxQueueLen   = 8
+        self._policy        = WebSocketsHub.DROP_OLDEST
+        self._droppedCount  = 0
+        self._onFrameSent   = self._onFrameDataSent
+        self.MaxQueueLength = maxQueueLength
+        if overflowPolicy is not None :
+            self.OverflowPolicy = overflowPolicy
+
+    # ------------------------------------------------------------------------
+
+    def _sendQueued(self, webSocket, frames) :
+        # Only the last frame of the batch notifies that it has been sent,
+        xasCli = webSocket._xasCli
+        count  = len(frames)
+        sent   = 0
+        try :
+            while sent < count and \
+                  xasCli.AsyncSendData( frames[sent],
+                                        onDataSent    = self._onFrameSent if sent == count-1 else None,
+                                        onDataSentArg = webSocket ) :
+                sent += 1
+        except :
+            pass
+        if sent == count :
+            return
+        # Socket is closed, frames are dropped until it is unsubscribed,
+        with self._lock :
+            self._droppedCount += count - sent
+            queue = self._queues.get(webSocket)
+            if queue :
+                self._droppedCount += len(queue[1])
+                queue[0] = False
+                del queue[1][:]
+
+    # ------------------------------------------------------------------------
+
+    def _onFrameDataSent(self, xasCli, webSocket) :
+        with self._lock :
+            queue = self._queues.get(webSocket)
+            if not queue :
+                return
+            if not queue[1] :
+                queue[0] = False
+                return
+            frames = [ entry[1] for entry in queue[1] ]
+            del queue[1][:]
+        self._sendQueued(webSocket, frames)
+
+    # ------------------------------------------------------------------------
+
+    def _broadcast(self, channel, opcode, data) :
+        # The message is framed once and the same bytes are shared by all
+        # the subscribers of the channel,
+        frame   = WebSocket._frameHeader(opcode, len(data)) + data
+        toSend  = [ ]
+        toClose = [ ]
+        with self._lock :
+            subs = self._channels.get(channel)
+            if not subs :
+                return 0
+            for webSocket in subs :
+                queue = self._queues[webSocket]
+                if not queue[0] :
+                    queue[0] = True
+                    toSend.append(webSocket)
+                    continue
+                pending = queue[1]
+                if len(pending) >= self._maxQueueLen :
+                    # Subscriber queue is full,
+                    if self._policy == WebSocketsHub.DISCONNECT :
+                        toClose.append(webSocket)
+                        continue
+                    count = len(pending)
+                    if self._policy == WebSocketsHub.COALESCE_LATEST :
+                        for i in range(count-1, -1, -1) :
+                            if pending[i][0] == channel :
+                                del pending[i]
+                    if len(pending) == count :
+                        del pending[0]
+                    self._droppedCount += count - len(pending)
+                pending.append((channel, frame))
+            count = len(subs) - len(toClose)
+        for webSocket in toSend :
+            self._sendQueued(webSocket, [ frame ])
+        for webSocket in toClose :
+            webSocket._mws2.Log( 'WebSocket send queue overflow, closing %s:%s.',
+                                 webSocket._mws2.WARNING,
+                                 webSocket._xasCli.CliAddr[0],
+                                 webSocket._xasCli.CliAddr[1] )
+            webSocket._close(1008, 'Send queue overflow')
+        return count
+
+    # ------------------------------------------------------------------------
+
+    def Subscribe(self, webSocket, channel) :
+        if not isinstance(webSocket, WebSocket) :
+            raise ValueError('"webSocket" must be a WebSocket object.')
+        if not isinstance(channel, str) or len(channel) == 0 :
+            raise ValueError('"channel" must be a not empty string.')
+        if webSocket.IsClosed :
+            return False
+        with self._lock :
+            subs = self._channels.get(channel)
+            if subs is None :
+                subs = self._channels[channel] = [ ]
+            if webSocket not in subs :
+                subs.append(webSocket)
+            if webSocket not in self._queues :
+                self._queues[webSocket] = [ False, [ ] ]
+        if webSocket._hubs is None :
+            webSocket._hubs = [ ]
+        if self not in webSocket._hubs :
+            webSocket._hubs.append(self)
+        if webSocket.IsClosed :
+            # Closed meanwhile,
+            self.Unsubscribe(webSocket)
+            return False
+        return True
+
+    # ------------------------------------------------------------------------
+
+    def Unsubscribe(self, webSocket, channel=None) :
+        with self._lock :
+            for name in ([channel] if channel else list(self._channels)) :
+                subs = self._channels.get(name)
+                if subs and webSocket in subs :
+                    subs.remove(webSocket)
+                    if not subs :
+                        del self._channels[name]
+            for subs in self._channels.values() :
+                if webSocket in subs :
+                    return
+            self._queues.pop(webSocket, None)
+        if webSocket._hubs and self in webSocket._hubs :
+            webSocket._hubs.remove(self)
+
+    # ------------------------------------------------------------------------
+
+    def GetSubscribersCount(self, channel) :
+        with self._lock :
+            subs = self._channels.get(channel)
+            return len(subs) if subs else 0
+
+    # ------------------------------------------------------------------------
+
+    def SendTextMessage(self, channel, msg) :
+        if not isinstance(msg, str) or len(msg) == 0 :
+            raise ValueError('"msg" must be a not empty string.')
+        return self._broadcast(channel, WebSocket._OP_FRAME_TEXT, msg.encode('UTF-8'))
+
+    # ------------------------------------------------------------------------
+
+    def SendBinaryMessage(self, channel, msg) :
+        try :
+            bytes([msg[0]])
+        except :
+            raise ValueError('"msg" must be a not empty bytes object.')
+        return self._broadcast(channel, WebSocket._OP_FRAME_BIN, bytes(msg))
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def Channels(self) :
+        with self._lock :
+            return list(self._channels)
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def MaxQueueLength(self) :
+        return self._maxQueueLen
+
+    @MaxQueueLength.setter
+    def MaxQueueLength(self, value) :
+        if not isinstance(value, int) or value < 1 :
+            raise ValueError('"MaxQueueLength" must be an integer >= 1.')
+        self._maxQueueLen = value
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def OverflowPolicy(self) :
+        return self._policy
+
+    @OverflowPolicy.setter
+    def OverflowPolicy(self, value) :
+        if value not in WebSocketsHub._POLICIES :
+            raise ValueError('"OverflowPolicy" must be DROP_OLDEST, COALESCE_LATEST or DISCONNECT.')
+        self._policy = value
+
+    # ------------------------------------------------------------------------
+
+    @property
+    def DroppedCount(self) :
+        return self._droppedCount
+
 # ============================================================================
 # ============================================================================
 # ============================================================================
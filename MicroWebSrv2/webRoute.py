@@ -28,8 +28,8 @@ def WebRoute(method=None, routePath=None, name=None) :
 # ============================================================================
 
 def RegisterRoute(handler, method, routePath, name=None) :
-    if type(handler) is not type(lambda x:x) :
-        raise ValueError('"handler" must be a function.')
+    if type(handler) not in _HANDLER_TYPES :
+        raise ValueError('"handler" must be a function or a coroutine function.')
     if not isinstance(method, str) or len(method) == 0 :
         raise ValueError('"method" requires a not empty string.')
     if not isinstance(routePath, str) or len(routePath) == 0 :
@@ -41,29 +41,37 @@ def RegisterRoute(handler, method, routePath, name=None) :
     method = method.upper()
     if len(routePath) > 1 and routePath.endswith('/') :
         routePath = routePath[:-1]
-    # Route -> '/users/<uID>/addresses/<addrID>/test/<anotherID>'
-    # Regex -> '/users/(\w*)/addresses/(\w*)/test/(\w*)$'
-    # Args  -> ['uID', 'addrID', 'anotherID']
+    # Route -> '/users/<uID>/files/<path:filename>'
+    # Trie  -> 'users' -> <auto> -> 'files' -> <path>
+    # Args  -> ['uid', 'filename']
     argNames = [ ]
-    regex    = ''
+    node     = _routesTrie
     try :
-        for i, part in enumerate(routePath.lower().split('/')) :
-            if i > 0 :
-                if part.startswith('<') and part.endswith('>') :
-                    argName = part[1:-1]
-                    if not argName :
-                        raise Exception
-                    argNames.append(argName)
-                    regex += '/([\\w.]*)'
+        parts = routePath.lower().split('/')[1:]
+        args  = [ _parseArgPart(part) for part in parts ]
+        for i, arg in enumerate(args) :
+            if arg :
+                if arg[0] is _convPath and i != len(parts) - 1 :
+                    raise Exception
+                argNames.append(arg[1])
+        if argNames :
+            for i, arg in enumerate(args) :
+                if arg :
+                    node = node.GetParamChild(arg[0])
                 else :
-                    regex += '/' + part
-        regex = re.compile(regex + '$')
+                    node = node.GetStaticChild(parts[i])
     except :
         raise ValueError('Bad route path: "%s".' % routePath)
-    for regRoute in _registeredRoutes :
-        if regRoute.Method == method and regRoute.Regex == regex :
+    if argNames :
+        if method in node.Routes :
             raise ValueError('Duplicated route: "%s".' % routePath)
-    regRoute = _registeredRoute(handler, method, routePath, name, regex, argNames)
+    elif (method, routePath.lower()) in _staticRoutes :
+        raise ValueError('Duplicated route: "%s".' % routePath)
+    regRoute = _registeredRoute(handler, method, routePath, name, argNames)
+    if argNames :
+        node.Routes[method] = regRoute
+    else :
+        _staticRoutes[(method, routePath.lower())] = regRoute
     _registeredRoutes.append(regRoute)
 
 # ============================================================================
@@ -72,24 +80,23 @@ def RegisterRoute(handler, method, routePath, name=None) :
 
 def ResolveRoute(method, path) :
     try :
-        path = path.lower()
         if len(path) > 1 and path.endswith('/') :
             path = path[:-1]
-        for regRoute in _registeredRoutes :
-            if regRoute.Method == method :
-                reMatch = regRoute.Regex.match(path)
-                if reMatch :
-                    if not regRoute.ArgNames :
-                        return RouteResult(regRoute)
-                    args = { }
-                    for i, argName in enumerate(regRoute.ArgNames) :
-                        argValue = reMatch.group(i+1)
-                        try :
-                            argValue = int(argValue)
-                        except :
-                            pass
-                        args[argName] = argValue
-                    return RouteResult(regRoute, args)
+        lowerPath = path.lower()
+        regRoute  = _staticRoutes.get((method, lowerPath))
+        if regRoute :
+            return RouteResult(regRoute)
+        argValues = [ ]
+        regRoute  = _routesTrie.Match( method,
+                                       lowerPath.split('/')[1:],
+                                       path.split('/')[1:],
+                                       0,
+                                       argValues )
+        if regRoute :
+            args = { }
+            for i, argName in enumerate(regRoute.ArgNames) :
+                args[argName] = argValues[i]
+            return RouteResult(regRoute, args)
     except :
         pass
     return None
@@ -105,13 +112,15 @@ def PathFromRoute(routeName, routeArgs={ }) :
         raise ValueError('"routeArgs" must be a dict.')
     for regRoute in _registeredRoutes :
         if regRoute.Name == routeName :
-            path = regRoute.RoutePath
-            for argName in regRoute.ArgNames :
-                arg = routeArgs.get(argName, None)
-                if arg is None :
-                    raise ValueError('"routeArgs" does not contains "%s" for route %s.' % (argName, routeName))
-                path = path.replace('<%s>' % argName, str(arg))
-            return path
+            parts = regRoute.RoutePath.split('/')
+            for i, part in enumerate(parts) :
+                arg = _parseArgPart(part.lower())
+                if arg :
+                    value = routeArgs.get(arg[1], None)
+                    if value is None :
+                        raise ValueError('"routeArgs" does not contains "%s" for route %s.' % (arg[1], routeName))
+                    parts[i] = str(value)
+            return '/'.join(parts)
     raise ValueError('"routeName" is not a registered route (%s).' % routeName)
 
 # ============================================================================
@@ -167,18 +176,133 @@ PATCH   = 'PATCH'
 
 _registeredRoutes = [ ]
 
+# An "async def" handler is not a plain function on MicroPython,
+async def _coroutineFunc() :
+    pass
+
+_HANDLER_TYPES = ( type(lambda x:x), type(_coroutineFunc) )
+
+# Routes without arguments, by (method, lowered path),
+_staticRoutes = { }
+
 # ------------------------------------------------------------------------
 
 class _registeredRoute :
 
-    def __init__(self, handler, method, routePath, name, regex, argNames) :
+    def __init__(self, handler, method, routePath, name, argNames) :
         self.Handler   = handler
         self.Method    = method
         self.RoutePath = routePath
         self.Name      = name
-        self.Regex     = regex
         self.ArgNames  = argNames
 
+# ============================================================================
+# ===( Private route arguments converters )===================================
+# ============================================================================
+
+# A converter returns the value of a path segment, or None if it does not
+# match. The path converter takes all the remaining segments and keeps
+# their case, as do int and str, the auto one keeps the legacy behavior.
+
+def _convAuto(value) :
+    if value and value.isdigit() :
+        return int(value)
+    return value
+
+def _convInt(value) :
+    if value and (value.isdigit() or (value[0] == '-' and value[1:].isdigit())) :
+        return int(value)
+    return None
+
+def _convStr(value) :
+    return value if value else None
+
+def _convPath(value) :
+    return value if value else None
+
+_CONVERTERS = {
+    'int'  : _convInt,
+    'str'  : _convStr,
+    'path' : _convPath
+}
+
+# ------------------------------------------------------------------------
+
+def _parseArgPart(part) :
+    # '<name>' -> (_convAuto, 'name') and '<int:name>' -> (_convInt, 'name'),
+    if part.startswith('<') and part.endswith('>') :
+        part = part[1:-1]
+        if ':' in part :
+            convName, argName = part.split(':', 1)
+            conv = _CONVERTERS[convName]
+        else :
+            conv, argName = _convAuto, part
+        if not argName :
+            raise ValueError()
+        return (conv, argName)
+    return None
+
+# ============================================================================
+# ===( Private routes trie )==================================================
+# ============================================================================
+
+class _routeNode :
+
+    def __init__(self) :
+        self.Static = { }
+        self.Params = [ ]
+        self.Routes = { }
+
+    def GetStaticChild(self, part) :
+        node = self.Static.get(part)
+        if node is None :
+            node = _routeNode()
+            self.Static[part] = node
+        return node
+
+    def GetParamChild(self, conv) :
+        for c, node in self.Params :
+            if c is conv :
+                return node
+        node = _routeNode()
+        self.Params.append((conv, node))
+        # Typed converters are tried before the auto one and path is last,
+        self.Params.sort(key=lambda p: _PARAMS_ORDER.index(p[0]))
+        return node
+
+    def Match(self, method, lowerParts, parts, i, argValues) :
+        # Static segments win over arguments, the first matching route in
+        # this order is returned and argValues is filled with its values,
+        if i == len(parts) :
+            return self.Routes.get(method)
+        node = self.Static.get(lowerParts[i])
+        if node :
+            regRoute = node.Match(method, lowerParts, parts, i+1, argValues)
+            if regRoute :
+                return regRoute
+        for conv, node in self.Params :
+            if conv is _convPath :
+                value = _convPath('/'.join(parts[i:]))
+                if value is not None and method in node.Routes :
+                    argValues.append(value)
+                    return node.Routes[method]
+                continue
+            if conv is _convAuto :
+                value = _convAuto(lowerParts[i])
+            else :
+                value = conv(parts[i])
+            if value is not None :
+                argValues.append(value)
+                regRoute = node.Match(method, lowerParts, parts, i+1, argValues)
+                if regRoute :
+                    return regRoute
+                argValues.pop()
+        return None
+
+_PARAMS_ORDER = [ _convInt, _convStr, _convAuto, _convPath ]
+
+_routesTrie = _routeNode()
+
 # ============================================================================
 # ============================================================================
 # ============================================================================
@@ -1,6 +1,9 @@
 # Copyright 2021 (c) Erik de Lange
 # Released under MIT license
 
-from .sendfile import sendfile
+from .filecache import FileCache
+from .log import Logger, logger
+from .manifest import Manifest, http_date, mimetype
+from .sendfile import BufferPool, sendbuffer, sendfile
 from .server import HTTPServer
-from .response import HTTPResponse
\ No newline at end of file
+from .response import CannedResponse, HTTPResponse
\ No newline at end of file
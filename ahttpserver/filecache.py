@@ -0,0 +1,128 @@
+# In-memory LRU cache for file contents
+#
+# Keeps recently served files in RAM so they are not read from (SD card) flash
+# again on every request. The cache holds at most budget bytes, files larger
+# than max_size are never cached. Entries are keyed by file name and a version
+# (e.g. the mtime, or an ETag derived from it) so a replaced file is read again.
+# Content is returned as a memoryview which can be sliced without copying.
+#
+# When free memory drops below min_free the least recently used files are
+# dropped, both when a new file is loaded and whenever trim() is called.
+#
+# Usage:
+#
+#   cache = FileCache(budget=131072)
+#   data = cache.get("/sd/www/index.html", etag)  # None if not cacheable
+#   print(cache.hits, cache.misses)
+#
+# Released under MIT license
+
+import gc
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ucollections import OrderedDict
+
+
+def _mem_free():
+    try:
+        return gc.mem_free()
+    except AttributeError:  # no gc.mem_free() outside MicroPython
+        return None
+
+
+class FileCache:
+
+    def __init__(self, budget=65536, max_size=None, min_free=32768):
+        """ Create an empty file cache
+
+        :param int budget: maximum number of bytes of file content kept in RAM
+        :param int max_size: largest file which is cached, default a quarter of the budget
+        :param int min_free: free memory to keep for the rest of the application
+        """
+        self.budget = budget
+        self.max_size = budget // 4 if max_size is None else max_size
+        self.min_free = min_free
+        self.size = 0  # bytes of file content in the cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # filename: (version, memoryview), least recently used first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, filename, version, size=None):
+        """ Get the content of a file, reading it into the cache if needed
+
+        :param str filename: name of the file
+        :param version: value which changes when the file changes, e.g. mtime or ETag
+        :param int size: file size if known, saves loading files which are too large
+        :return memoryview: file content or None if the file is not cached and cannot be
+        """
+        entry = self._entries.pop(filename, None)
+        if entry is not None:
+            if entry[0] == version:
+                self._entries[filename] = entry  # now most recently used
+                self.hits += 1
+                return entry[1]
+            self.size -= len(entry[1])
+        self.misses += 1
+        if size is not None and size > self.max_size:
+            return None
+        try:
+            with open(filename, "rb") as fp:
+                if size is None:
+                    size = fp.seek(0, 2)
+                    fp.seek(0)
+                if size > self.max_size or not self._reserve(size):
+                    return None
+                buffer = bytearray(size)
+                n = fp.readinto(buffer)
+        except (OSError, MemoryError):
+            return None
+        data = memoryview(buffer)[:n]
+        self._entries[filename] = (version, data)
+        self.size += n
+        return data
+
+    def _reserve(self, size):
+        # make room for size bytes within the budget and the free memory limit
+        while self._entries and self.size + size > self.budget:
+            self._evict()
+        free = _mem_free()
+        if free is not None and free - size < self.min_free:
+            gc.collect()
+            while self._entries and _mem_free() - size < self.min_free:
+                self._evict()
+                gc.collect()
+            return _mem_free() - size >= self.min_free
+        return True
+
+    def _evict(self):
+        filename = next(iter(self._entries))
+        self.size -= len(self._entries.pop(filename)[1])
+        self.evictions += 1
+
+    def trim(self):
+        """ Drop least recently used files while free memory is below min_free
+
+        :return int: number of files dropped
+        """
+        count = 0
+        free = _mem_free()
+        if free is not None and free < self.min_free:
+            while self._entries and _mem_free() < self.min_free:
+                self._evict()
+                gc.collect()
+                count += 1
+        return count
+
+    def invalidate(self, filename=None):
+        """ Remove a file from the cache, or all files if no name is given """
+        if filename is None:
+            self._entries = OrderedDict()
+            self.size = 0
+        elif filename in self._entries:
+            self.size -= len(self._entries.pop(filename)[1])
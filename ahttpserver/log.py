@@ -0,0 +1,126 @@
+# Deferred, level filtered logging
+#
+# Writing to the console (a slow UART) or an SD card from inside a request
+# handler stalls the server for as long as the write takes. A Logger only
+# checks the level and stores the message and its arguments in a ring buffer
+# of fixed size, the text is formatted and written later by run(), a task which
+# drains the buffer in the background. When the buffer is full new messages
+# are dropped (and counted) instead of waiting for the sink.
+#
+# Messages below the logger level are rejected before anything is formatted,
+# so pass arguments separately instead of building the string in the caller.
+#
+# Usage:
+#
+#   from ahttpserver.log import logger, INFO
+#
+#   logger.level = INFO
+#   logger.debug("request %s %s from %s", method, url, peer)  # not stored
+#   logger.info("sent %s (%d bytes)", path, size)
+#
+#   asyncio.create_task(logger.run())  # drain to the console
+#
+#   with open("/sd/server.log", "a") as f:
+#       asyncio.create_task(logger.run(sink=f.write))  # or to a file
+#
+# Released under MIT license
+
+import uasyncio as asyncio
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+def _print(line):
+    print(line, end="")
+
+
+class Logger:
+
+    def __init__(self, level=INFO, capacity=32):
+        """ Create a logger with an empty ring buffer
+
+        :param int level: messages below this level are ignored
+        :param int capacity: number of messages kept until the buffer is drained
+        """
+        self.level = level
+        self.dropped = 0  # messages lost because the buffer was full
+        self._ring = [None] * capacity
+        self._head = 0  # index of the oldest message
+        self._count = 0  # number of messages in the buffer
+
+    def __len__(self):
+        return self._count
+
+    def log(self, level, msg, *args):
+        """ Store a message, formatting is deferred until the buffer is drained
+
+        :param int level: DEBUG, INFO, WARNING or ERROR
+        :param str msg: message, may contain %-style placeholders for args
+        """
+        if level < self.level:
+            return
+        capacity = len(self._ring)
+        if self._count == capacity:
+            self.dropped += 1
+            return
+        self._ring[(self._head + self._count) % capacity] = (level, msg, args)
+        self._count += 1
+
+    def debug(self, msg, *args):
+        if self.level <= DEBUG:
+            self.log(DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        if self.level <= INFO:
+            self.log(INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        if self.level <= WARNING:
+            self.log(WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        if self.level <= ERROR:
+            self.log(ERROR, msg, *args)
+
+    def flush(self, sink=_print):
+        """ Format and write all buffered messages
+
+        :param sink: function which is called with every line of text
+        :return int: number of messages written
+        """
+        written = 0
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            sink(f"WARNING: {dropped} log messages dropped\n")
+        while self._count:
+            level, msg, args = self._ring[self._head]
+            self._ring[self._head] = None
+            self._head = (self._head + 1) % len(self._ring)
+            self._count -= 1
+            if args:
+                try:
+                    msg = msg % args
+                except Exception:
+                    msg = f"{msg} {args}"
+            sink(f"{_LEVEL_NAMES.get(level, level)}: {msg}\n")
+            written += 1
+        return written
+
+    async def run(self, interval=0.1, sink=_print):
+        """ Drain the buffer every interval seconds, runs forever as a separate task
+
+        :param float interval: seconds between two drains
+        :param sink: function which is called with every line of text
+        """
+        while True:
+            if self._count or self.dropped:
+                self.flush(sink)
+            await asyncio.sleep(interval)
+
+
+logger = Logger()  # shared by the server and the application
@@ -0,0 +1,159 @@
+# Static file manifest
+#
+# Maps the URL path of every file below a web root to what is needed to answer
+# a request for it: mime type, size, ETag, Last-Modified and the same for a
+# precompressed .gz sidecar if one exists. Looking up a file is a single dict
+# access, the filesystem is only touched to open the file being sent.
+#
+# The manifest is either built by walking the web root (typically once at boot)
+# or loaded from a JSON file written at deploy time. refresh() reloads it when
+# that file has changed.
+#
+# Usage:
+#
+#   manifest = Manifest("/sd/www")
+#   if not manifest.load():
+#       manifest.build()
+#   entry = manifest.get("/index.html")  # None if there is no such file
+#
+# Create the JSON file on the build host with:
+#
+#   python ahttpserver/manifest.py www
+#
+# Released under MIT license
+
+import json
+import os
+import time
+
+MANIFEST_FILE = "static-manifest.json"
+
+MIME_TYPES = {
+    "html": "text/html",
+    "js": "application/javascript",
+    "css": "text/css",
+    "ico": "image/x-icon",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "svg": "image/svg+xml",
+    "json": "application/json"
+}
+
+_DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def mimetype(filename, default="text/plain"):
+    """ Get the mime type from the extension of a file name """
+    return MIME_TYPES.get(filename.rsplit(".", 1)[-1].lower(), default)
+
+
+def http_date(seconds):
+    """ Format a timestamp (same epoch as os.stat) as an HTTP date """
+    t = time.gmtime(int(seconds))
+    return "%s, %02d %s %04d %02d:%02d:%02d GMT" % (_DAYS[t[6]], t[2], _MONTHS[t[1] - 1],
+                                                    t[0], t[3], t[4], t[5])
+
+
+def _variant(stat, suffix=""):
+    # size, ETag and Last-Modified of one representation of a file
+    return stat[6], '"%x-%x%s"' % (stat[6], int(stat[8]), suffix), http_date(stat[8])
+
+
+def _walk(path, url=""):
+    for name in os.listdir(path):
+        stat = os.stat(path + "/" + name)
+        if stat[0] & 0x4000:  # directory
+            yield from _walk(path + "/" + name, url + "/" + name)
+        else:
+            yield url + "/" + name, stat
+
+
+class Manifest:
+
+    def __init__(self, root, filename=MANIFEST_FILE):
+        """ Create an empty manifest, fill it with load() or build()
+
+        :param str root: directory the URL paths are relative to
+        :param str filename: name of the JSON manifest file in root
+        """
+        self.root = root
+        self.filename = filename
+        self._entries = {}
+        self._mtime = None  # modification time of the loaded manifest file
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        """ Look up a URL path
+
+        :param str path: URL path, e.g. "/index.html"
+        :return tuple: (mimetype, size, etag, last_modified, gz) or None if unknown,
+                       gz is (size, etag, last_modified) of the .gz sidecar or None
+        """
+        return self._entries.get(path)
+
+    def build(self):
+        """ Walk the web root and index every file """
+        stats = {}
+        for url, stat in _walk(self.root):
+            stats[url] = stat
+        entries = {}
+        for url, stat in stats.items():
+            if url.endswith(".gz") and url[:-3] in stats or url == "/" + self.filename:
+                continue
+            gz = stats.get(url + ".gz")
+            entries[url] = (mimetype(url),) + _variant(stat) + \
+                           ((_variant(gz, "-gz") if gz is not None else None),)
+        self._entries = entries
+        self._mtime = None
+
+    def load(self):
+        """ Load the manifest file from the web root
+
+        :return bool: True if loaded, False if the file is missing or invalid
+        """
+        path = self.root + "/" + self.filename
+        try:
+            mtime = os.stat(path)[8]
+            with open(path) as fp:
+                data = json.load(fp)
+            entries = {}
+            for url, entry in data.items():
+                gz = entry[4]
+                entries[url] = tuple(entry[:4]) + ((tuple(gz) if gz else None),)
+        except (OSError, ValueError, IndexError, TypeError):
+            return False
+        self._entries = entries
+        self._mtime = mtime
+        return True
+
+    def refresh(self):
+        """ Reload the manifest if its file changed since it was loaded
+
+        :return bool: True if reloaded
+        """
+        if self._mtime is None:
+            return False
+        try:
+            if os.stat(self.root + "/" + self.filename)[8] == self._mtime:
+                return False
+        except OSError:
+            return False
+        return self.load()
+
+    def save(self):
+        """ Write the manifest to its file in the web root """
+        with open(self.root + "/" + self.filename, "w") as fp:
+            json.dump(self._entries, fp)
+
+
+if __name__ == "__main__":
+    import sys
+
+    manifest = Manifest(sys.argv[1].rstrip("/"))
+    manifest.build()
+    manifest.save()
+    print("%s: %d files" % (manifest.root + "/" + manifest.filename, len(manifest)))
@@ -0,0 +1,140 @@
+# Buffered stream reader for HTTP request heads
+#
+# The request line and header fields of a request are read into one buffer
+# which is allocated once per connection and reused for every request on it
+# (see keep-alive in server.py). Line ends are located in the buffer itself,
+# so no bytes object is created per line. Data received after the head (a
+# request body or the next pipelined request) stays in the buffer and is
+# returned first by read(), readexactly() and readline(), which are used by
+# handlers just like those of the underlying stream reader. The number of
+# bytes which handlers read after the head is counted, so the server can skip
+# an unread request body before the next request on the connection.
+#
+# For MicroPython applications which process HTTP requests.
+#
+# Released under MIT license
+
+from .url import _find
+
+
+class HeadTooLarge(Exception):
+    pass
+
+
+class BufferedReader:
+
+    def __init__(self, reader, size=2048):
+        """ Wrap a stream reader
+
+        :param StreamReader reader: stream to read the request from
+        :param int size: buffer size, the maximum length of a request head
+        """
+        self.reader = reader
+        self.buffer = bytearray(size)
+        self._bmview = memoryview(self.buffer)
+        self._start = 0  # first byte in buffer not yet consumed
+        self._end = 0  # end of data in buffer
+        self.consumed = 0  # bytes read after the head of the current request
+
+    async def _fill(self):
+        """ Append data from the stream to the buffer, return number of bytes read """
+        free = self._bmview[self._end:]
+        if hasattr(self.reader, "readinto"):
+            n = await self.reader.readinto(free)
+        else:
+            data = await self.reader.read(len(free))
+            n = len(data)
+            free[:n] = data
+        self._end += n
+        return n
+
+    async def read_head(self):
+        """ Read the request line and header fields into the buffer.
+
+        Empty lines preceding the request line are skipped.
+
+        :return int: length of the head in the buffer, excluding the empty line
+                     which ends it, or 0 if the connection closed before a complete head arrived
+        :raises HeadTooLarge: if the head does not fit in the buffer
+        """
+        if self._start < self._end:  # move data received after the previous request to the front
+            self.buffer[:self._end - self._start] = bytes(self._bmview[self._start:self._end])
+        self._end -= self._start
+        self._start = 0
+
+        line = 0  # start of current line
+        scan = 0  # start of not yet searched data
+        while True:
+            lf = _find(self.buffer, b"\n", scan, self._end)
+            if lf == -1:
+                if self._end == len(self.buffer):
+                    raise HeadTooLarge(f"Request head exceeds {len(self.buffer)} bytes")
+                scan = self._end
+                if await self._fill() == 0:
+                    return 0
+                continue
+            if lf - line <= 1 and self.buffer[line] in (0x0D, 0x0A):  # empty line
+                if line != 0:
+                    self._start = lf + 1
+                    self.consumed = 0
+                    return line
+                self.buffer[:self._end - lf - 1] = bytes(self._bmview[lf + 1:self._end])
+                self._end -= lf + 1
+                scan = 0
+                continue
+            line = scan = lf + 1
+
+    def _take(self, n):
+        """ Return up to n (all if n < 0) bytes from the data in the buffer after the head """
+        if n < 0 or n > self._end - self._start:
+            n = self._end - self._start
+        data = bytes(self._bmview[self._start:self._start + n])
+        self._start += n
+        self.consumed += n
+        return data
+
+    async def _read(self, n):
+        """ Read up to n (all if n < 0) bytes from the stream """
+        data = await self.reader.read(n)
+        self.consumed += len(data)
+        return data
+
+    async def read(self, n=-1):
+        if self._start == self._end:
+            return await self._read(n)
+        data = self._take(n)
+        if n < 0:
+            return data + await self._read(n)
+        if len(data) < n:
+            data += await self._read(n - len(data))
+        return data
+
+    async def readexactly(self, n):
+        data = self._take(n)
+        if len(data) < n:
+            rest = await self.reader.readexactly(n - len(data))
+            self.consumed += len(rest)
+            data += rest
+        return data
+
+    async def readline(self):
+        lf = _find(self.buffer, b"\n", self._start, self._end)
+        if lf != -1:
+            return self._take(lf + 1 - self._start)
+        data = self._take(-1)
+        line = await self.reader.readline()
+        self.consumed += len(line)
+        return data + line
+
+    async def skip(self, n):
+        """ Discard the next n bytes, e.g. a request body which the handler did not read
+
+        :return bool: False if the connection closed before n bytes were discarded
+        """
+        n -= len(self._take(n))
+        while n > 0:
+            data = await self._read(min(n, len(self.buffer)))
+            if not data:
+                return False
+            n -= len(data)
+        return True
@@ -3,14 +3,29 @@
 # For HTTP/1.1 specification see: https://www.ietf.org/rfc/rfc2616.txt
 # For MIME types see: https://www.iana.org/assignments/media-types/media-types.xhtml
 #
+# Responses which never change (error pages, CORS preflight, fixed JSON) can
+# be serialized once at startup as a CannedResponse, including the body. It is
+# sent with a single write and can be connected directly to a route with
+# HTTPServer.canned(), so no handler runs at all.
+#
+#   preflight = CannedResponse(204, close=False, header={"Access-Control-Allow-Origin": "*"})
+#   app.canned("OPTIONS", "/api/status", preflight)
+#
 # Copyright 2022 (c) Erik de Lange
 # Released under MIT license
 
 
 reason = {
     200: "OK",
+    204: "No Content",
+    206: "Partial Content",
+    304: "Not Modified",
     400: "Bad Request",
-    404: "Not Found"
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error"
 }
 
 class HTTPResponse:
@@ -20,7 +35,8 @@ class HTTPResponse:
 
         :param int status: HTTP status code
         :param str mimetype: HTTP mime type
-        :param bool close: if true close connection else keep alive
+        :param bool close: if true close connection else keep alive, which
+                           requires a Content-Length header to delimit the body
         :param dict header: key,value pairs for HTTP response header fields
         """
         self.status = status
@@ -31,17 +47,45 @@ class HTTPResponse:
         else:
             self.header=header
 
+    def head(self):
+        """ Return status line and header fields as one string """
+        lines = [f"HTTP/1.1 {self.status} {reason.get(self.status, 'NA')}\n"]
+        if self.mimetype is not None:
+            lines.append(f"Content-Type: {self.mimetype}\n")
+        lines.append("Connection: close\n" if self.close else "Connection: keep-alive\n")
+        for key, value in self.header.items():
+            lines.append(f"{key}: {value}\n")
+        lines.append("\n")
+        return "".join(lines)
+
     async def send(self, writer):
         """ Send response to stream writer """
-        writer.write(f"HTTP/1.1 {self.status} {reason.get(self.status, 'NA')}\n")
-        if self.mimetype is not None:
-            writer.write(f"Content-Type: {self.mimetype}\n")
-        if self.close:
-            writer.write("Connection: close\n")
-        else:
-            writer.write("Connection: keep-alive\n")
-        if len(self.header) > 0:
-            for key, value in self.header.items():
-                writer.write(f"{key}: {value}\n")
-        writer.write("\n")
+        writer.write(self.head())
+        # the server only keeps the connection alive if the client can find the end of the body
+        writer.keep_alive = not self.close and (self.status in (204, 304) or
+                                                any(key.lower() == "content-length" for key in self.header))
+        await writer.drain()
+
+
+class CannedResponse:
+
+    def __init__(self, status, mimetype=None, body=b"", close=False, header=None):
+        """ Serialize a complete response, header and body, once
+
+        :param int status: HTTP status code
+        :param str mimetype: HTTP mime type
+        :param bytes body: content of the response, Content-Length is added for it
+        :param bool close: if true close connection else keep alive
+        :param dict header: key,value pairs for HTTP response header fields
+        """
+        header = dict(header) if header else {}
+        if status not in (204, 304):
+            header["Content-Length"] = len(body)
+        self.close = close
+        self.data = HTTPResponse(status, mimetype, close, header).head().encode("utf-8") + body
+
+    async def send(self, writer):
+        """ Send the whole response to stream writer with a single write """
+        writer.write(self.data)
+        writer.keep_alive = not self.close
         await writer.drain()
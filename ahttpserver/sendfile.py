@@ -1,22 +1,145 @@
 # Memory efficient file transfer
 #
+# Every transfer checks out its own buffer from a bounded BufferPool and returns
+# it when done, so concurrent transfers never share a buffer. Buffers are
+# allocated on first use. When free memory is low a smaller buffer is used for
+# the transfer and released afterwards instead of being kept in the pool.
+#
+# Usage:
+#
+#   pool = BufferPool(count=4, size=8192)  # at most 4 concurrent transfers
+#   sent, rate = await sendfile(writer, "index.html", pool)
+#   sent, rate = await sendfile(writer, "main.js", pool, offset=1024, length=4096)
+#   sent, rate = await sendbuffer(writer, cache.get("index.html", etag))
+#
 # Copyright 2021 (c) Erik de Lange
 # Released under MIT license
 
-_buffer = bytearray(512)  # adjust size to your systems available memory
-_bmview = memoryview(_buffer)  # reuse pre-allocated _buffer
+import gc
+
+import uasyncio as asyncio
+
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
 
+    def ticks_diff(new, old):
+        return new - old
 
-async def sendfile(conn, filename):
+
+class BufferPool:
+
+    def __init__(self, count=2, size=4096, min_size=512):
+        """ Create a pool of send buffers
+
+        :param int count: maximum number of buffers, and thus of concurrent transfers
+        :param int size: size of a buffer in bytes, adjust to your systems available memory
+        :param int min_size: size of the buffer used when free memory is low
+        """
+        self.count = count
+        self.size = size
+        self.min_size = min_size
+        self._free = []  # allocated buffers not in use
+        self._allocated = 0  # buffers in use or in self._free
+
+    def _allocate(self):
+        size = self.size
+        try:
+            if gc.mem_free() < 2 * size:  # keep memory for the rest of the application
+                gc.collect()
+                if gc.mem_free() < 2 * size:
+                    size = self.min_size
+        except AttributeError:  # no gc.mem_free() outside MicroPython
+            pass
+        try:
+            buffer = bytearray(size)
+        except MemoryError:
+            buffer = bytearray(self.min_size)
+        self._allocated += 1
+        return buffer
+
+    async def get(self):
+        """ Check out a buffer, wait until one is returned if all are in use """
+        while True:
+            if self._free:
+                return self._free.pop()
+            if self._allocated < self.count:
+                return self._allocate()
+            await asyncio.sleep(0.01)
+
+    def put(self, buffer):
+        """ Return a buffer to the pool """
+        if len(buffer) < self.size:  # allocated under memory pressure, do not keep
+            self._allocated -= 1
+        else:
+            self._free.append(buffer)
+
+
+_pool = BufferPool()
+
+
+async def sendfile(conn, filename, pool=None, offset=0, length=None):
     """ Send a file to a connection in chunks - lowering memory usage.
 
     :param socket conn: connection to send the file content to
     :param str filename: name of file to send
+    :param BufferPool pool: pool to take the send buffer from, default a pool of two 4 KB buffers
+    :param int offset: position in the file to start sending from
+    :param int length: number of bytes to send, default up to the end of the file
+    :return tuple: number of bytes sent and transfer rate in bytes/sec
     """
-    with open(filename, "rb") as fp:
-        while True:
-            n = fp.readinto(_buffer)
-            if n == 0:
-                break
-            conn.write(_bmview[:n])
-            await conn.drain()
+    if pool is None:
+        pool = _pool
+    buffer = await pool.get()
+    bmview = memoryview(buffer)
+    sent = 0
+    start = ticks_ms()
+    try:
+        with open(filename, "rb") as fp:
+            if offset:
+                fp.seek(offset)
+            while length is None or sent < length:
+                if length is not None and length - sent < len(buffer):
+                    n = fp.readinto(bmview[:length - sent])
+                else:
+                    n = fp.readinto(buffer)
+                if n == 0:
+                    break
+                conn.write(bmview[:n])
+                await conn.drain()
+                sent += n
+    finally:
+        pool.put(buffer)
+    elapsed = ticks_diff(ticks_ms(), start)
+    return sent, (sent * 1000 // elapsed if elapsed > 0 else sent)
+
+
+async def sendbuffer(conn, buffer, offset=0, length=None, chunk_size=4096):
+    """ Send (a window of) a buffer already in memory, e.g. from a FileCache.
+
+    The buffer is written in memoryview slices of chunk_size, so the stream
+    never has to copy more than one chunk at a time.
+
+    :param socket conn: connection to send the content to
+    :param buffer: bytes, bytearray or memoryview to send
+    :param int offset: position in the buffer to start sending from
+    :param int length: number of bytes to send, default up to the end of the buffer
+    :param int chunk_size: number of bytes written per drain
+    :return tuple: number of bytes sent and transfer rate in bytes/sec
+    """
+    bmview = memoryview(buffer)
+    end = len(bmview) if length is None else min(offset + length, len(bmview))
+    sent = 0
+    start = ticks_ms()
+    while offset < end:
+        n = min(chunk_size, end - offset)
+        conn.write(bmview[offset:offset + n])
+        await conn.drain()
+        offset += n
+        sent += n
+    elapsed = ticks_diff(ticks_ms(), start)
+    return sent, (sent * 1000 // elapsed if elapsed > 0 else sent)
@@ -20,12 +20,23 @@
 #
 # Handlers for the (method, path) combinations must be decorated with @route,
 # and declared before the server is started. Every handler receives a stream-
-# reader and writer and an object with details from the request (see url.py
-# for exact content). The handler must construct and send a correct HTTP
-# response. To avoid typos use the HTTPResponse component from response.py.
-# When leaving the handler the connection is closed.
+# reader (buffered, see reader.py) and writer and an object with details from
+# the request (see url.py for exact content). The handler must construct and
+# send a correct HTTP response. To avoid typos use the HTTPResponse component
+# from response.py.
+# When leaving the handler the connection is closed, unless the response was
+# sent with close=False and a Content-Length header. In that case the server
+# waits on the same connection for the next request (HTTP/1.1 keep-alive) for
+# at most keepalive_timeout seconds and max_requests requests. A request body
+# which the handler did not read is skipped first, or the connection is closed
+# if that body is chunked or larger than max_skip_body bytes.
+# Requests are logged at DEBUG level via the shared logger from log.py, which
+# only writes them out when its level is lowered and its run() task is started.
 # Any (method, path) combination which has not been declared using @route
-# will, when received by the server, result in a 404 HTTP error.
+# will, when received by the server, be passed to the function decorated with
+# @fallback, or if there is none result in a 404 HTTP error.
+# Fixed responses (e.g. CORS preflight) can be connected to (method, path) with
+# canned() instead of a handler, they are sent as is with a single write.
 #
 # Copyright 2021 (c) Erik de Lange
 # Released under MIT license
@@ -34,7 +45,9 @@ import errno
 
 import uasyncio as asyncio
 
-from .response import HTTPResponse
+from .log import logger
+from .reader import BufferedReader, HeadTooLarge
+from .response import CannedResponse, HTTPResponse
 from .url import HTTPRequest, InvalidRequest
 
 
@@ -44,13 +57,19 @@ class HTTPServerError(Exception):
 
 class HTTPServer:
 
-    def __init__(self, host="0.0.0.0", port=80, backlog=5, timeout=30):
+    def __init__(self, host="0.0.0.0", port=80, backlog=5, timeout=30, keepalive_timeout=5, max_requests=100,
+                 head_size=2048, max_skip_body=4096):
         self.host = host
         self.port = port
         self.backlog = backlog
         self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout  # seconds an idle kept alive connection waits for a next request
+        self.max_requests = max_requests  # requests handled on one connection before it is closed
+        self.head_size = head_size  # maximum length in bytes of request line plus header fields
+        self.max_skip_body = max_skip_body  # largest unread request body skipped to keep the connection alive
         self._server = None
         self._routes = dict()  # stores link between (method, path) and function to execute
+        self._fallback = None  # function to execute when no route matches (method, path)
 
     def route(self, method="GET", path="/"):
         """ Decorator which connects method and path to the decorated function. """
@@ -60,49 +79,78 @@ class HTTPServer:
 
         def wrapper(function):
             self._routes[(method, path)] = function
+            return function  # allows stacking @route for several (method, path) combinations
+
+        return wrapper
+
+    def canned(self, method, path, response):
+        """ Connect method and path to a CannedResponse which is sent without calling a handler. """
+
+        if (method, path) in self._routes:
+            raise HTTPServerError(f"route{(method, path)} already registered")
+
+        self._routes[(method, path)] = response
+
+    def fallback(self):
+        """ Decorator which connects all unrouted (method, path) combinations to the decorated function. """
+
+        def wrapper(function):
+            self._fallback = function
+            return function
 
         return wrapper
 
     async def _handle_request(self, reader, writer):
         try:
-            request_line = await asyncio.wait_for(reader.readline(), self.timeout)
-
-            if request_line in [b"", b"\r\n"]:
-                print(f"empty request line from {writer.get_extra_info('peername')[0]}")
-                return
-
-            print(f"request_line {request_line} from {writer.get_extra_info('peername')[0]}")
-
-            try:
-                request = HTTPRequest(request_line)
-            except InvalidRequest as e:
-                while True:
-                    # read and discard header fields
-                    if await asyncio.wait_for(reader.readline(), self.timeout) in [b"", b"\r\n"]:
-                        break
-                response = HTTPResponse(400, "text/plain", close=True)
-                await response.send(writer)
-                writer.write(repr(e).encode("utf-8"))
-                return
+            reader = BufferedReader(reader, self.head_size)  # buffer is reused for all requests on this connection
+            count = 0  # requests handled on this connection
 
             while True:
-                # read header fields and add name / value to dict 'header'
-                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                # a kept alive connection only waits keepalive_timeout seconds for the next request
+                timeout = self.timeout if count == 0 else self.keepalive_timeout
+                try:
+                    length = await asyncio.wait_for(reader.read_head(), timeout)
+                except HeadTooLarge as e:
+                    response = HTTPResponse(431, "text/plain", close=True)
+                    await response.send(writer)
+                    writer.write(repr(e).encode("utf-8"))
+                    return
+
+                if length == 0:
+                    if count == 0:
+                        logger.debug("empty request from %s", writer.get_extra_info("peername")[0])
+                    return
+
+                count += 1
+
+                try:
+                    request = HTTPRequest(reader.buffer, length)
+                except InvalidRequest as e:
+                    response = HTTPResponse(400, "text/plain", close=True)
+                    await response.send(writer)
+                    writer.write(repr(e).encode("utf-8"))
+                    return
+
+                logger.debug("request %s %s from %s", request.method, request.url, writer.get_extra_info("peername")[0])
+
+                writer.keep_alive = False  # set by HTTPResponse.send()
+
+                # search function which is connected to (method, path)
+                func = self._routes.get((request.method, request.path), self._fallback)
+                if type(func) is CannedResponse:
+                    await func.send(writer)
+                elif func:
+                    await func(reader, writer, request)
+                else:  # no function found for (method, path) combination
+                    await _NOT_FOUND.send(writer)
+
+                await writer.drain()
+
+                if not writer.keep_alive or not _client_keep_alive(request) or count >= self.max_requests:
+                    break
 
-                if line in [b"", b"\r\n"]:
+                if not await self._skip_body(reader, request):
                     break
-                else:
-                    if line.find(b":") != -1:
-                        name, value = line.split(b':', 1)
-                        request.header[name] = value.strip()
-
-            # search function which is connected to (method, path)
-            func = self._routes.get((request.method, request.path))
-            if func:
-                await func(reader, writer, request)
-            else:  # no function found for (method, path) combination
-                response = HTTPResponse(404)
-                await response.send(writer)
 
         except asyncio.TimeoutError:
             pass
@@ -116,6 +164,23 @@ class HTTPServer:
             writer.close()
             await writer.wait_closed()
 
+    async def _skip_body(self, reader, request):
+        """ Discard the part of the request body which the handler left unread.
+
+        :return bool: True if the connection can be kept alive for the next request
+        """
+        if request.get_header(b"transfer-encoding") is not None:
+            return False  # the end of a chunked body is not tracked
+        try:
+            left = int(request.get_header(b"content-length", b"0")) - reader.consumed
+        except ValueError:
+            return False
+        if left <= 0:
+            return True
+        if left > self.max_skip_body:
+            return False
+        return await asyncio.wait_for(reader.skip(left), self.keepalive_timeout)
+
     async def start(self):
         print(f"HTTP server started on {self.host}:{self.port}")
         self._server = await asyncio.start_server(self._handle_request, self.host, self.port, self.backlog)
@@ -128,3 +193,14 @@ class HTTPServer:
             print("HTTP server stopped")
         else:
             print("HTTP server was not started")
+
+
+_NOT_FOUND = CannedResponse(404, close=True)
+
+
+def _client_keep_alive(request):
+    """ Return True if the client accepts to keep the connection open after this request. """
+    connection = request.get_header(b"connection", b"").lower()
+    if request.version == "1.0":
+        return connection == b"keep-alive"
+    return connection != b"close"
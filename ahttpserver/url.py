@@ -27,12 +27,48 @@ class InvalidRequest(Exception):
     pass
 
 
+METHODS = ("GET", "HEAD", "POST", "PUT", "DELETE", "CONNECT", "OPTIONS", "TRACE")
+
+if hasattr(bytearray, "find"):
+    def _find(buffer, sub, start, end):
+        """ Return the position of single byte sub in buffer[start:end], or -1 """
+        return buffer.find(sub, start, end)
+else:  # MicroPython's bytearray has no find()
+    def _find(buffer, sub, start, end):
+        """ Return the position of single byte sub in buffer[start:end], or -1 """
+        char = sub[0]
+        for i in range(start, end):
+            if buffer[i] == char:
+                return i
+        return -1
+
+
+_WHITESPACE = (0x20, 0x09, 0x0D, 0x0A)  # SP, HT, CR, LF
+
+
+def _strip(buffer, start, end):
+    """ Return (start, end) of buffer[start:end] without surrounding white space """
+    while start < end and buffer[start] in _WHITESPACE:
+        start += 1
+    while end > start and buffer[end - 1] in _WHITESPACE:
+        end -= 1
+    return start, end
+
+
 class HTTPRequest:
 
-    def __init__(self, request_line) -> None:
+    def __init__(self, request_line, length=None) -> None:
         """ Separate an HTTP request line in its elements.
 
-            :param bytes request_line: the complete HTTP request line
+            Nothing is copied or decoded here, only the position of each element in
+            request_line is recorded. An element is decoded when first accessed, so
+            a buffer passed as request_line may not be reused while the request is
+            being handled.
+
+            :param bytes request_line: the complete HTTP request line, or a buffer (bytearray)
+                                       which starts with the request line followed by the
+                                       header field lines of the request
+            :param int length: number of bytes of request_line to use, default all
             :return Request: instance containing
                     method      the request method ("GET", "PUT", ...)
                     url         the request URL, including the query string (if any)
@@ -40,32 +76,119 @@ class HTTPRequest:
                     query       the query string from the URL (if any, else "")
                     version     the HTTP version
                     parameters  dictionary with key-value pairs from the query string
-                    header      empty dict, placeholder for key-value pairs from request header fields
+                    header      dictionary with name-value pairs (both bytes) from the request
+                                header fields, empty if only a request line was passed
             :raises InvalidRequest: if line does not contain exactly 3 components separated by spaces
                                     if method is not in IETF standardized set
                                     aside from these no other checks done here
         """
-        try:
-            self.method, self.url, self.version = request_line.decode("utf-8").split()
-            # note that method, url and version are str, not bytes
-        except ValueError:
-            raise InvalidRequest(f"Expected 3 elements in {request_line}")
-
-        if self.version.find("/") != -1:
-            self.version = self.version.split("/", 1)[1]
-
-        if self.method not in ["GET", "HEAD", "POST", "PUT", "DELETE", "CONNECT", "OPTIONS", "TRACE"]:
-            raise InvalidRequest(f"Invalid method {self.method} in {request_line}")
-
-        if self.url.find("?") != -1:
-            self.path, self.query = self.url.split("?", 1)
-            self.parameters = query(self.query)
-        else:
-            self.path = self.url
-            self.query = ""
-            self.parameters = dict()
-
-        self.header = dict()
+        self._buffer = request_line
+        self._length = len(request_line) if length is None else length
+
+        end = _find(request_line, b"\n", 0, self._length)
+        if end == -1:
+            end = self._length
+        self._fields = end + 1  # header field lines start after the request line
+
+        # locate the white space separated elements of the request line
+        elements = []
+        start, end = _strip(request_line, 0, end)
+        while start < end and len(elements) < 4:
+            stop = start
+            while stop < end and request_line[stop] not in _WHITESPACE:
+                stop += 1
+            elements.append((start, stop))
+            start, end = _strip(request_line, stop, end)
+
+        if len(elements) != 3:
+            raise InvalidRequest(f"Expected 3 elements in {bytes(request_line[:self._fields])}")
+
+        self._spans = elements  # (start, end) of method, url and version
+        self._method = None
+        self._url = None
+        self._path = None
+        self._query = None
+        self._version = None
+        self._parameters = None
+        self._header = None
+
+        if self.method not in METHODS:
+            raise InvalidRequest(f"Invalid method {self.method} in {bytes(request_line[:self._fields])}")
+
+    def _decode(self, start, end):
+        return bytes(self._buffer[start:end]).decode("utf-8")
+        # note that method, url and version are str, not bytes
+
+    @property
+    def method(self):
+        if self._method is None:
+            self._method = self._decode(*self._spans[0])
+        return self._method
+
+    @property
+    def url(self):
+        if self._url is None:
+            self._url = self._decode(*self._spans[1])
+        return self._url
+
+    @property
+    def path(self):
+        if self._path is None:
+            start, end = self._spans[1]
+            separator = _find(self._buffer, b"?", start, end)
+            self._path = self._decode(start, end if separator == -1 else separator)
+        return self._path
+
+    @property
+    def query(self):
+        if self._query is None:
+            start, end = self._spans[1]
+            separator = _find(self._buffer, b"?", start, end)
+            self._query = "" if separator == -1 else self._decode(separator + 1, end)
+        return self._query
+
+    @property
+    def version(self):
+        if self._version is None:
+            start, end = self._spans[2]
+            separator = _find(self._buffer, b"/", start, end)
+            self._version = self._decode(start if separator == -1 else separator + 1, end)
+        return self._version
+
+    @property
+    def parameters(self):
+        if self._parameters is None:
+            self._parameters = query(self.query)
+        return self._parameters
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._header = dict()
+            buffer = self._buffer
+            start = self._fields
+            while start < self._length:
+                end = _find(buffer, b"\n", start, self._length)
+                if end == -1:
+                    end = self._length
+                separator = _find(buffer, b":", start, end)
+                if separator != -1:
+                    value_start, value_end = _strip(buffer, separator + 1, end)
+                    self._header[bytes(buffer[start:separator])] = bytes(buffer[value_start:value_end])
+                start = end + 1
+        return self._header
+
+    def get_header(self, name, default=None):
+        """ Return the value of a header field, ignoring the case of its name.
+
+        :param bytes name: header field name in lowercase, e.g. b"content-length"
+        :param default: value returned if the header field is not present
+        :return bytes: header field value
+        """
+        for key, value in self.header.items():
+            if key.lower() == name:
+                return value
+        return default
 
 
 def query(query):
@@ -0,0 +1,216 @@
+"""
+MicroWebSrv2 thread pool vs asyncio benchmark
+
+Serves the "/api/status" and "/api/leds" routes of main_microwebsrv2.py,
+with the hardware access replaced by a wait of HW_WAIT_MS, once with plain
+handlers on a pool of THREADS threads (StartManaged) and once with
+"async def" handlers on the asyncio loop (StartManagedAsync, one thread).
+CLIENTS clients run in parallel and the requests/s and the mean latency of
+both modes are reported.
+
+Each mode first checks that a POST to "/api/leds" gets back the posted JSON
+(the body has to stay readable in "async def" handlers).
+
+Runs on CPython (python bench_async.py) and on MicroPython
+(mpremote run bench_async.py with MicroWebSrv2 on the device, the loopback
+interface is used).
+"""
+
+import socket
+from time     import sleep
+from _thread  import allocate_lock, start_new_thread
+
+from MicroWebSrv2 import *
+
+try :
+    import asyncio
+except ImportError :
+    import uasyncio as asyncio
+
+try :
+    from time import perf_counter
+except ImportError :
+    from time import ticks_us, ticks_diff
+    _T0 = ticks_us()
+    def perf_counter() :
+        return ticks_diff(ticks_us(), _T0) / 1000000
+
+# ============================================================================
+# ===( Configuration Constants )=============================================
+# ============================================================================
+
+HOST                = '127.0.0.1'
+PORT                = 8090      # port of the first mode, the next one is PORT+1
+THREADS             = 2         # threads of the pool in thread mode
+CLIENTS             = 8         # clients sending requests at the same time
+REQUESTS_PER_CLIENT = 10        # requests sent one after the other by a client
+HW_WAIT_MS          = 20        # simulated LED / button access per request
+
+LEDS_BODY = b'{"led": 2, "value": 1}'
+
+# ============================================================================
+# ===( Routes )===============================================================
+# ============================================================================
+
+_leds = { 1 : 0, 2 : 0, 3 : 0 }
+
+@WebRoute(GET, '/thread/api/status')
+def thread_api_status(microWebSrv2, request) :
+    sleep(HW_WAIT_MS / 1000)
+    request.Response.ReturnOkJSON({ "leds" : _leds })
+
+@WebRoute(POST, '/thread/api/leds')
+def thread_api_set_led(microWebSrv2, request) :
+    body = request.GetPostedJSONObject()
+    if not body :
+        request.Response.ReturnJSON(400, { "error" : "bad request" })
+        return
+    sleep(HW_WAIT_MS / 1000)
+    _leds[int(body["led"])] = 1 if body["value"] else 0
+    request.Response.ReturnOkJSON({ "ok" : True, "led" : body["led"], "value" : body["value"] })
+
+@WebRoute(GET, '/async/api/status')
+async def async_api_status(microWebSrv2, request) :
+    await asyncio.sleep(HW_WAIT_MS / 1000)
+    await request.Response.ReturnOkJSON({ "leds" : _leds })
+
+@WebRoute(POST, '/async/api/leds')
+async def async_api_set_led(microWebSrv2, request) :
+    body = request.GetPostedJSONObject()
+    if not body :
+        await request.Response.ReturnJSON(400, { "error" : "bad request" })
+        return
+    await asyncio.sleep(HW_WAIT_MS / 1000)
+    _leds[int(body["led"])] = 1 if body["value"] else 0
+    await request.Response.ReturnOkJSON({ "ok" : True, "led" : body["led"], "value" : body["value"] })
+
+# ============================================================================
+# ===( Benchmark )============================================================
+# ============================================================================
+
+def http_request(port, method, path, body=b'') :
+    # Returns the status code and the content of the response
+    s = socket.socket()
+    try :
+        s.connect(socket.getaddrinfo(HOST, port)[0][-1])
+        data = b'%s %s HTTP/1.1\r\nHost: %s\r\nConnection: close\r\n' \
+               b'Content-Type: application/json\r\nContent-Length: %d\r\n\r\n' \
+               % (method.encode(), path.encode(), HOST.encode(), len(body)) + body
+        while data :
+            data = data[s.send(data):]
+        resp = b''
+        while True :
+            chunk = s.recv(1024)
+            if not chunk :
+                break
+            resp += chunk
+    finally :
+        s.close()
+    head, _, content = resp.partition(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1]), content
+
+def check(port, prefix) :
+    code, content = http_request(port, 'POST', prefix + '/api/leds', LEDS_BODY)
+    if code != 200 or content.find(b'"led": 2') < 0 :
+        raise Exception('Bad response to the POST on %s/api/leds: %s %s' % (prefix, code, content))
+
+class Clients :
+
+    def __init__(self, port, prefix) :
+        self._port     = port
+        self._prefix   = prefix
+        self._lock     = allocate_lock()
+        self._running  = CLIENTS
+        self._latency  = 0
+        self._errors   = 0
+        self._start    = None
+        self.elapsed   = None
+        self.error     = None
+        # Started from a thread, the asyncio loop has to go on meanwhile
+        start_new_thread(self._run, ())
+
+    def _run(self) :
+        try :
+            check(self._port, self._prefix)
+        except Exception as ex :
+            self.error   = ex
+            self.elapsed = 0
+            return
+        self._start = perf_counter()
+        for _ in range(CLIENTS) :
+            start_new_thread(self._client, ())
+
+    def _client(self) :
+        latency = 0
+        errors  = 0
+        for i in range(REQUESTS_PER_CLIENT) :
+            t = perf_counter()
+            try :
+                if i % 2 :
+                    code, _ = http_request(self._port, 'POST', self._prefix + '/api/leds', LEDS_BODY)
+                else :
+                    code, _ = http_request(self._port, 'GET', self._prefix + '/api/status')
+                if code != 200 :
+                    errors += 1
+            except Exception :
+                errors += 1
+            latency += perf_counter() - t
+        with self._lock :
+            self._latency += latency
+            self._errors  += errors
+            self._running -= 1
+            if not self._running :
+                self.elapsed = perf_counter() - self._start
+
+    def Done(self) :
+        return self.elapsed is not None
+
+    def Report(self, mode) :
+        if self.error :
+            raise self.error
+        count = CLIENTS * REQUESTS_PER_CLIENT
+        print( '%-8s %10.1f %10.1f %8d' % ( mode,
+                                            count / self.elapsed,
+                                            self._latency / count * 1000,
+                                            self._errors ) )
+
+def new_server(port) :
+    mws2             = MicroWebSrv2()
+    mws2.BindAddress = (HOST, port)
+    mws2.RootPath    = '.'
+    mws2.SetEmbeddedConfig()
+    mws2.LogLevel    = MicroWebSrv2.WARNING
+    return mws2
+
+def run_thread_pool(port) :
+    mws2 = new_server(port)
+    mws2.StartManaged(parllProcCount=THREADS)
+    try :
+        clients = Clients(port, '/thread')
+        while not clients.Done() :
+            sleep(0.05)
+    finally :
+        mws2.Stop()
+    clients.Report('threads')
+
+async def run_asyncio(port) :
+    mws2 = new_server(port)
+    task = asyncio.create_task(mws2.StartManagedAsync(parllProcCount=1))
+    await asyncio.sleep(0.2)
+    try :
+        clients = Clients(port, '/async')
+        while not clients.Done() :
+            await asyncio.sleep(0.05)
+    finally :
+        mws2.Stop()
+        await task
+    clients.Report('asyncio')
+
+def main() :
+    print('%d clients x %d requests, %d ms of hardware wait per request'
+          % (CLIENTS, REQUESTS_PER_CLIENT, HW_WAIT_MS))
+    print('mode      requests/s  latency ms   errors')
+    run_thread_pool(PORT)
+    asyncio.run(run_asyncio(PORT + 1))
+
+main()
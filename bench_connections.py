@@ -0,0 +1,126 @@
+"""
+MicroWebSrv2 idle connections benchmark
+
+Opens 10, then 100, 1000 and 5000 idle connections to the server (nothing
+is ever sent on them) and, for each count, times REQUESTS requests sent one
+after the other on another keep-alive connection. The pool only works on
+the sockets with events, so the latency per request has to stay flat
+whatever the number of idle connections.
+
+Runs on CPython (python bench_connections.py, the limit of open files is
+raised when possible) and on MicroPython (mpremote run bench_connections.py
+with MicroWebSrv2 on the device), where the counting stops at the first
+connection that cannot be opened.
+"""
+
+import socket
+
+from MicroWebSrv2 import *
+
+try :
+    from time import perf_counter
+except ImportError :
+    from time import ticks_us, ticks_diff
+    _T0 = ticks_us()
+    def perf_counter() :
+        return ticks_diff(ticks_us(), _T0) / 1000000
+
+# ============================================================================
+# ===( Configuration Constants )=============================================
+# ============================================================================
+
+HOST        = '127.0.0.1'
+PORT        = 8090
+CONN_COUNTS = (10, 100, 1000, 5000) # idle connections opened per measure
+REQUESTS    = 500                   # requests timed on the keep-alive connection
+
+# ============================================================================
+# ===( Benchmark )============================================================
+# ============================================================================
+
+@WebRoute(GET, '/ping')
+def ping(microWebSrv2, request) :
+    request.Response.ReturnOk('pong')
+
+def raise_files_limit(count) :
+    # Client and server sides of each connection are both in this process
+    try :
+        import resource
+    except ImportError :
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    need = 2 * count + 64
+    if soft < need :
+        if hard != resource.RLIM_INFINITY :
+            need = min(need, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (need, hard))
+
+def connect() :
+    s = socket.socket()
+    s.connect(socket.getaddrinfo(HOST, PORT)[0][-1])
+    return s
+
+def recv_response(s) :
+    # Reads one response with a "Content-Length" header
+    data = b''
+    while data.find(b'\r\n\r\n') < 0 :
+        chunk = s.recv(1024)
+        if not chunk :
+            raise Exception('Connection closed by the server')
+        data += chunk
+    head, _, content = data.partition(b'\r\n\r\n')
+    length = 0
+    for line in head.split(b'\r\n') :
+        if line.lower().startswith(b'content-length:') :
+            length = int(line[15:])
+    while len(content) < length :
+        content += s.recv(1024)
+    return head
+
+def mean_latency_us() :
+    s = connect()
+    try :
+        req = b'GET /ping HTTP/1.1\r\nHost: %s\r\nConnection: keep-alive\r\n\r\n' % HOST.encode()
+        # The first request is only sent once all the connections opened
+        # before are accepted, it is not timed
+        s.send(req)
+        recv_response(s)
+        t = perf_counter()
+        for _ in range(REQUESTS) :
+            s.send(req)
+            if recv_response(s).find(b' 200 ') < 0 :
+                raise Exception('Bad response to GET /ping')
+        return (perf_counter() - t) / REQUESTS * 1000000
+    finally :
+        s.close()
+
+def main() :
+    maxCount = CONN_COUNTS[-1]
+    raise_files_limit(maxCount)
+    mws2                      = MicroWebSrv2()
+    mws2.BindAddress          = (HOST, PORT)
+    mws2.RootPath             = '.'
+    mws2.SetLightConfig()
+    mws2.ConnQueueCapacity    = 512
+    mws2.BufferSlotsCount     = 2 * (maxCount + 8)
+    mws2.KeepAllocBufferSlots = False
+    mws2.RequestsTimeoutSec   = 3600
+    mws2.LogLevel             = MicroWebSrv2.WARNING
+    mws2.StartManaged()
+    idle = [ ]
+    try :
+        print('idle connections  latency us/request')
+        for count in CONN_COUNTS :
+            try :
+                while len(idle) < count :
+                    idle.append(connect())
+            except OSError :
+                print('%16d  cannot open more connections' % len(idle))
+                break
+            print('%16d  %18.1f' % (count, mean_latency_us()))
+    finally :
+        for s in idle :
+            s.close()
+        mws2.Stop()
+
+main()
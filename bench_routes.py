@@ -0,0 +1,58 @@
+"""
+MicroWebSrv2 route resolution benchmark
+
+Registers 10 and then 200 routes, half of them static ("/api/rN") and half
+with an argument ("/api/rN/<id>"), and reports how many ResolveRoute()
+lookups per second are done for the last static route, the last route with
+an argument and a path matching no route.
+
+Runs on CPython (python bench_routes.py) and on MicroPython
+(mpremote run bench_routes.py with MicroWebSrv2 on the device).
+"""
+
+from MicroWebSrv2.webRoute import RegisterRoute, ResolveRoute
+
+try :
+    from time import perf_counter
+except ImportError :
+    from time import ticks_us, ticks_diff
+    _T0 = ticks_us()
+    def perf_counter() :
+        return ticks_diff(ticks_us(), _T0) / 1000000
+
+# ============================================================================
+# ===( Configuration Constants )=============================================
+# ============================================================================
+
+ROUTES_COUNTS = (10, 200)   # total number of registered routes per run
+LOOKUPS       = 20000       # ResolveRoute() calls per measure
+
+# ============================================================================
+# ===( Benchmark )============================================================
+# ============================================================================
+
+def handler(microWebSrv2, request) :
+    pass
+
+def lookups_per_sec(path) :
+    t = perf_counter()
+    for _ in range(LOOKUPS) :
+        ResolveRoute('GET', path)
+    return LOOKUPS / (perf_counter() - t)
+
+def main() :
+    registered = 0
+    print('routes  static/s    param/s     miss/s')
+    for count in ROUTES_COUNTS :
+        # Routes are only added, the previous ones stay registered
+        while registered < count // 2 :
+            RegisterRoute(handler, 'GET', '/api/r%d' % registered)
+            RegisterRoute(handler, 'GET', '/api/r%d/<id>' % registered)
+            registered += 1
+        last = registered - 1
+        print( '%6d %10.0f %10.0f %10.0f' % ( count,
+                                              lookups_per_sec('/api/r%d' % last),
+                                              lookups_per_sec('/api/r%d/42' % last),
+                                              lookups_per_sec('/nothing/here') ) )
+
+main()
@@ -0,0 +1,80 @@
+"""
+MicroWebSrv2 WebSocket unmasking benchmark
+
+First checks that the unmasking of the WebSockets module gives the same
+result as a per byte XOR loop, for every length up to 70 bytes at every
+offset from 0 to 7 in a buffer (unaligned heads and tails), then reports
+the MB/s of both on a 64 KB payload.
+
+On MicroPython the module unmasks with its viper function, so this is also
+the check of that path (mpremote run bench_unmask.py with MicroWebSrv2 on
+the device), on CPython the big integers path is checked.
+"""
+
+from os import urandom
+
+from MicroWebSrv2.mods import WebSockets
+
+try :
+    from time import perf_counter
+except ImportError :
+    from time import ticks_us, ticks_diff
+    _T0 = ticks_us()
+    def perf_counter() :
+        return ticks_diff(ticks_us(), _T0) / 1000000
+
+# ============================================================================
+# ===( Configuration Constants )=============================================
+# ============================================================================
+
+CHECK_MAX_LEN    = 70       # lengths checked, from 0 to this one
+CHECK_MAX_OFFSET = 7        # offsets checked in the buffer, from 0 to this one
+PAYLOAD_LEN      = 65536    # payload unmasked by the benchmark
+ROUNDS           = 10       # unmaskings per measure
+
+# ============================================================================
+# ===( Benchmark )============================================================
+# ============================================================================
+
+def unmask_per_byte(data, maskingKey) :
+    # Unmasking as it was done before, used as the reference
+    for i in range(len(data)) :
+        data[i] ^= maskingKey[i % 4]
+
+def check() :
+    maskingKey = bytearray(urandom(4))
+    src        = urandom(CHECK_MAX_LEN + CHECK_MAX_OFFSET)
+    for offset in range(CHECK_MAX_OFFSET + 1) :
+        for length in range(CHECK_MAX_LEN + 1) :
+            expected = bytearray(src)
+            view     = memoryview(expected)[offset:offset+length]
+            unmask_per_byte(view, maskingKey)
+            buf  = bytearray(src)
+            view = memoryview(buf)[offset:offset+length]
+            WebSockets._unmask(view, maskingKey)
+            if buf != expected :
+                raise Exception('Bad unmasking of %s bytes at offset %s' % (length, offset))
+    print('unmasking checked for lengths 0..%s at offsets 0..%s'
+          % (CHECK_MAX_LEN, CHECK_MAX_OFFSET))
+
+def mb_per_sec(unmask) :
+    maskingKey = bytearray(urandom(4))
+    buf        = bytearray(urandom(PAYLOAD_LEN))
+    view       = memoryview(buf)
+    t = perf_counter()
+    for _ in range(ROUNDS) :
+        unmask(view, maskingKey)
+    return PAYLOAD_LEN * ROUNDS / (perf_counter() - t) / 1000000
+
+def main() :
+    check()
+    if WebSockets._unmaskViper :
+        path = 'viper'
+    elif WebSockets._bigIntXOR :
+        path = 'big integers'
+    else :
+        path = 'per byte'
+    print('per byte loop : %8.1f MB/s' % mb_per_sec(unmask_per_byte))
+    print('_unmask       : %8.1f MB/s (%s)' % (mb_per_sec(WebSockets._unmask), path))
+
+main()
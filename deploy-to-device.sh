@@ -28,7 +28,7 @@ show_help() {
     echo "This script will:"
     echo "  1. Clean the local /www/ folder"
     echo "  2. Build the Angular application"
-    echo "  3. Copy build artifacts to local /www/"
+    echo "  3. Copy build artifacts to local /www/, create .gz sidecars and the file manifest"
     echo "  4. Connect to MicroPython device"
     echo "  5. Deploy /www/ folder to the device"
     echo
@@ -111,6 +111,17 @@ cp -r dist/mcu-control-app/browser/* ../www/
 echo -e "${GREEN}✓ Angular app built and copied to local /www/${NC}"
 
 cd ..
+
+# Create precompressed sidecars, served instead of the original to clients accepting gzip
+echo "Creating gzip sidecars for text assets..."
+find www -type f \( -name '*.html' -o -name '*.js' -o -name '*.css' -o -name '*.svg' -o -name '*.json' -o -name '*.ico' \) \
+    -exec gzip -9 -k -n -f {} \;
+echo -e "${GREEN}✓ Created .gz sidecars in local /www/${NC}"
+
+# Index the files so the server can answer requests without stat calls on the device
+echo "Writing static file manifest..."
+python3 ahttpserver/manifest.py www
+echo -e "${GREEN}✓ Created www/static-manifest.json${NC}"
 echo
 
 # Step 3: Check MicroPython device connection
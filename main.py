@@ -25,7 +25,8 @@ import uasyncio as asyncio
 from machine import Pin, PWM, Timer
 
 # Import the async HTTP server
-from ahttpserver import HTTPResponse, HTTPServer, sendfile
+from ahttpserver import BufferPool, CannedResponse, FileCache, HTTPResponse, HTTPServer, Manifest, logger, sendbuffer, sendfile
+from ahttpserver.log import INFO
 
 # ============================================================================
 # ===( Configuration Constants )=============================================
@@ -35,6 +36,15 @@ from ahttpserver import HTTPResponse, HTTPServer, sendfile
 LARGE_FILE_THRESHOLD = 50000    # 50KB - threshold for logging large file access
 HUGE_FILE_THRESHOLD = 300000    # 300KB - threshold for network optimization headers
 CHUNK_SIZE = 32768              # 32KB - chunk size for fallback chunked reading
+SEND_BUFFER_SIZE = 8192         # 8KB - buffer size per static file transfer
+SEND_BUFFER_COUNT = 4           # maximum concurrent static file transfers
+FILE_CACHE_BUDGET = 262144      # 256KB - RAM used to keep hot static files out of SD card reads
+LOG_LEVEL = INFO                # DEBUG also logs every request, written to the console by a background task
+FILE_CACHE_MAX_SIZE = 131072    # 128KB - larger files are always streamed from storage
+
+# HTTP keep-alive configuration
+KEEPALIVE_TIMEOUT = 5           # seconds an idle connection is kept open (Angular app polls every 2s)
+MAX_KEEPALIVE_REQUESTS = 100    # requests served on one connection before it is closed
 
 # Web files storage configuration
 USE_SD_CARD = True              # True = use SD card (/sd/www), False = use flash memory (/www)
@@ -308,6 +318,9 @@ def setup_web_storage():
 # Setup web storage
 web_storage_ready = setup_web_storage()
 
+# Index of the web files, filled in main() before the server starts
+static_files = Manifest(get_web_root())
+
 # ============================================================================
 # ===( Network Configuration )===============================================
 # ============================================================================
@@ -408,28 +421,51 @@ print(f"  Lamp PWM: P111-P115, P608")
 # ============================================================================
 
 # Create async HTTP server instance
-app = HTTPServer(host="0.0.0.0", port=80, timeout=30)
+app = HTTPServer(host="0.0.0.0", port=80, timeout=30,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, max_requests=MAX_KEEPALIVE_REQUESTS)
+
+# Send buffers shared by all static file transfers
+send_buffers = BufferPool(count=SEND_BUFFER_COUNT, size=SEND_BUFFER_SIZE)
+
+# Recently served static files kept in RAM, keyed by path and ETag
+file_cache = FileCache(budget=FILE_CACHE_BUDGET, max_size=FILE_CACHE_MAX_SIZE)
+
+async def send_json(writer, status, data):
+    """Send a JSON response with Content-Length so the connection can be kept alive"""
+    body = json.dumps(data).encode("utf-8")
+    response = HTTPResponse(status, "application/json", close=False, header={"Content-Length": len(body)})
+    await response.send(writer)
+    writer.write(body)
+    await writer.drain()
+
+def canned_json(status, data):
+    """Serialize a fixed JSON response once, it is then sent with a single write"""
+    return CannedResponse(status, "application/json", json.dumps(data).encode("utf-8"), close=False)
+
+# Fixed error responses, built at startup instead of on every request
+BAD_REQUEST = canned_json(400, {"error": "bad request"})
+INVALID_LED = canned_json(400, {"error": "invalid led"})
+NOT_FOUND = canned_json(404, {"error": "not found"})
+FILE_NOT_FOUND = canned_json(404, {"error": "file not found"})
+SERVER_ERROR = canned_json(500, {"error": "server error"})
+FILE_READ_ERROR = canned_json(500, {"error": "file read error"})
 
 # ============================================================================
 # ===( API Endpoints )=======================================================
 # ============================================================================
 
-# CORS preflight handler for all API endpoints
-@app.route("OPTIONS", "/api/status")
-@app.route("OPTIONS", "/api/leds")
-@app.route("OPTIONS", "/api/lamp")
-@app.route("OPTIONS", "/api/network")
-async def api_options(reader, writer, request):
-    """Handle CORS preflight requests"""
-    cors_headers = {
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type",
-        "Access-Control-Max-Age": "86400"
-    }
-    response = HTTPResponse(200, "text/plain", close=True, header=cors_headers)
-    await response.send(writer)
-    await writer.drain()
+API_PATHS = ("/api/status", "/api/leds", "/api/lamp", "/api/network")
+
+# CORS preflight for all API endpoints, answered by the server without running a handler
+CORS_PREFLIGHT = CannedResponse(200, "text/plain", close=False, header={
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Max-Age": "86400"
+})
+
+for api_path in API_PATHS:
+    app.canned("OPTIONS", api_path, CORS_PREFLIGHT)
 
 @app.route("GET", "/api/status")
 async def api_status(reader, writer, request):
@@ -446,43 +482,30 @@ async def api_status(reader, writer, request):
         }
     }
 
-    response = HTTPResponse(200, "application/json", close=True)
-    await response.send(writer)
-    writer.write(json.dumps(data))
-    await writer.drain()
+    await send_json(writer, 200, data)
 
 @app.route("POST", "/api/leds")
 async def api_set_led(reader, writer, request):
     """Control LEDs"""
     try:
         # Read the request body
-        content_length = 0
-        if b'content-length' in request.header:
-            content_length = int(request.header[b'content-length'])
-        elif b'Content-Length' in request.header:
-            content_length = int(request.header[b'Content-Length'])
+        content_length = int(request.get_header(b'content-length', 0))
 
         if content_length > 0:
-            body_data = await reader.read(content_length)
+            body_data = await reader.readexactly(content_length)
             body = json.loads(body_data.decode('utf-8'))
         else:
             body = {}
 
         if not body:
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "bad request"}))
-            await writer.drain()
+            await BAD_REQUEST.send(writer)
             return
 
         led = int(body.get("led", 0))
         val = 1 if body.get("value") else 0
 
     except Exception as e:
-        response = HTTPResponse(400, "application/json", close=True)
-        await response.send(writer)
-        writer.write(json.dumps({"error": "bad request"}))
-        await writer.drain()
+        await BAD_REQUEST.send(writer)
         return
 
     if led == 1:
@@ -492,17 +515,11 @@ async def api_set_led(reader, writer, request):
     elif led == 3:
         LED3.value(val)
     else:
-        response = HTTPResponse(400, "application/json", close=True)
-        await response.send(writer)
-        writer.write(json.dumps({"error": "invalid led"}))
-        await writer.drain()
+        await INVALID_LED.send(writer)
         return
 
     response_data = {"ok": True, "led": led, "value": val}
-    response = HTTPResponse(200, "application/json", close=True)
-    await response.send(writer)
-    writer.write(json.dumps(response_data))
-    await writer.drain()
+    await send_json(writer, 200, response_data)
 
 @app.route("GET", "/api/lamp")
 async def api_get_lamp_status(reader, writer, request):
@@ -546,10 +563,7 @@ async def api_get_lamp_status(reader, writer, request):
         }
     }
 
-    response = HTTPResponse(200, "application/json", close=True)
-    await response.send(writer)
-    writer.write(json.dumps(data))
-    await writer.drain()
+    await send_json(writer, 200, data)
 
 @app.route("POST", "/api/lamp")
 async def api_set_lamp(reader, writer, request):
@@ -558,27 +572,19 @@ async def api_set_lamp(reader, writer, request):
 
     try:
         # Read the request body
-        content_length = 0
-        if b'content-length' in request.header:
-            content_length = int(request.header[b'content-length'])
-        elif b'Content-Length' in request.header:
-            content_length = int(request.header[b'Content-Length'])
+        content_length = int(request.get_header(b'content-length', 0))
 
         if content_length > 0:
-            body_data = await reader.read(content_length)
+            body_data = await reader.readexactly(content_length)
             body = json.loads(body_data.decode('utf-8'))
         else:
             body = {}
 
         if not body:
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "Missing request body"}))
-            await writer.drain()
+            await send_json(writer, 400, {"error": "Missing request body"})
             return
 
-        print("=== LAMP REQUEST DEBUG ===")
-        print("Full request body:", body)
+        logger.debug("lamp request body: %s", body)
 
         # Handle the actual request structure - data is wrapped in "request" object
         if "request" in body:
@@ -588,24 +594,18 @@ async def api_set_lamp(reader, writer, request):
 
         # Validate that the request contains nearInfraredStatus
         if not request_data or "nearInfraredStatus" not in request_data:
-            print("ERROR: Missing nearInfraredStatus in request body")
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "Missing nearInfraredStatus in request body"}))
-            await writer.drain()
+            logger.warning("Missing nearInfraredStatus in request body")
+            await send_json(writer, 400, {"error": "Missing nearInfraredStatus in request body"})
             return
 
         # Extract nearInfraredStatus object
         near_ir_st = request_data["nearInfraredStatus"]
-        print("nearInfraredStatus:", near_ir_st)
+        logger.debug("nearInfraredStatus: %s", near_ir_st)
 
         # Validate required fields
         if not isinstance(near_ir_st, dict):
-            print("Error: nearInfraredStatus must be an object")
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "nearInfraredStatus must be an object"}))
-            await writer.drain()
+            logger.warning("nearInfraredStatus must be an object")
+            await send_json(writer, 400, {"error": "nearInfraredStatus must be an object"})
             return
 
         # Extract lamp parameters with validation
@@ -619,48 +619,33 @@ async def api_set_lamp(reader, writer, request):
         # Normalize and validate power (case-insensitive)
         power = power.upper() if power else "OFF"
         if power not in ["ON", "OFF", "PAUSE"]:
-            print(f"Error: Invalid power value: {power}")
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "power must be 'ON', 'OFF', or 'PAUSE'"}))
-            await writer.drain()
+            logger.warning("Invalid power value: %s", power)
+            await send_json(writer, 400, {"error": "power must be 'ON', 'OFF', or 'PAUSE'"})
             return
 
         # Normalize and validate mode (case-insensitive)
         mode = mode.upper() if mode else "STATIC"
         if mode not in ["STATIC", "WAVE", "PULSE"]:
-            print(f"Error: Invalid mode value: {mode}")
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "mode must be 'STATIC', 'WAVE', or 'PULSE'"}))
-            await writer.drain()
+            logger.warning("Invalid mode value: %s", mode)
+            await send_json(writer, 400, {"error": "mode must be 'STATIC', 'WAVE', or 'PULSE'"})
             return
 
         # Validate brightness (0-100)
         if not isinstance(brightness, (int, float)) or brightness < 0 or brightness > 100:
-            print(f"Error: Invalid brightness value: {brightness}")
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "brightness must be a number between 0-100"}))
-            await writer.drain()
+            logger.warning("Invalid brightness value: %s", brightness)
+            await send_json(writer, 400, {"error": "brightness must be a number between 0-100"})
             return
 
         # Validate speed (0-100 seconds, 0 means no wave/pulse effect)
         if not isinstance(speed, (int, float)) or speed < 0 or speed > 100:
-            print(f"Error: Invalid speed value: {speed}")
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "speed must be a number between 0-100 seconds"}))
-            await writer.drain()
+            logger.warning("Invalid speed value: %s", speed)
+            await send_json(writer, 400, {"error": "speed must be a number between 0-100 seconds"})
             return
 
         # Validate timer (must be positive)
         if not isinstance(timer, (int, float)) or timer < 0:
-            print(f"Error: Invalid timer value: {timer}")
-            response = HTTPResponse(400, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "timer must be a positive number"}))
-            await writer.drain()
+            logger.warning("Invalid timer value: %s", timer)
+            await send_json(writer, 400, {"error": "timer must be a positive number"})
             return
 
         # Update global variables
@@ -669,7 +654,7 @@ async def api_set_lamp(reader, writer, request):
         timer_sw = int(timer)
         timer_sw_buf = timer_sw
 
-        print(f"Updated globals: pwm={pwm}, wave_speed={wave_speed}, timer_sw={timer_sw}")
+        logger.debug("Updated globals: pwm=%s, wave_speed=%s, timer_sw=%s", pwm, wave_speed, timer_sw)
 
         # Set state based on power and mode
         if power == "OFF":
@@ -686,7 +671,7 @@ async def api_set_lamp(reader, writer, request):
             else:
                 state = ST_STATIC  # fallback
 
-        print(f"State set to: {state}")
+        logger.debug("State set to: %s", state)
 
         # Trigger state machine update
         stmachine(EV_UPDATE)
@@ -704,17 +689,11 @@ async def api_set_lamp(reader, writer, request):
             }
         }
 
-        response = HTTPResponse(200, "application/json", close=True)
-        await response.send(writer)
-        writer.write(json.dumps(response_data))
-        await writer.drain()
+        await send_json(writer, 200, response_data)
 
     except Exception as e:
-        print(f"Error in set_lamp: {e}")
-        response = HTTPResponse(500, "application/json", close=True)
-        await response.send(writer)
-        writer.write(json.dumps({"error": f"Server error: {str(e)}"}))
-        await writer.drain()
+        logger.error("Error in set_lamp: %s", e)
+        await send_json(writer, 500, {"error": f"Server error: {str(e)}"})
 
 @app.route("GET", "/api/network")
 async def api_get_network_status(reader, writer, request):
@@ -745,91 +724,186 @@ async def api_get_network_status(reader, writer, request):
             except:
                 pass
 
-        response = HTTPResponse(200, "application/json", close=True)
-        await response.send(writer)
-        writer.write(json.dumps(network_info))
-        await writer.drain()
+        await send_json(writer, 200, network_info)
 
     except Exception as e:
-        print(f"Error in get_network_status: {e}")
-        response = HTTPResponse(500, "application/json", close=True)
-        await response.send(writer)
-        writer.write(json.dumps({"error": f"Server error: {str(e)}"}))
-        await writer.drain()
+        logger.error("Error in get_network_status: %s", e)
+        await send_json(writer, 500, {"error": f"Server error: {str(e)}"})
 
 # ============================================================================
 # ===( Static File Serving )=================================================
 # ============================================================================
 
-def get_content_type(filename):
-    """Get MIME type based on file extension"""
-    if filename.endswith('.html'):
-        return 'text/html'
-    elif filename.endswith('.js'):
-        return 'application/javascript'
-    elif filename.endswith('.css'):
-        return 'text/css'
-    elif filename.endswith('.ico'):
-        return 'image/x-icon'
-    elif filename.endswith('.png'):
-        return 'image/png'
-    elif filename.endswith('.jpg') or filename.endswith('.jpeg'):
-        return 'image/jpeg'
-    elif filename.endswith('.svg'):
-        return 'image/svg+xml'
-    elif filename.endswith('.json'):
-        return 'application/json'
-    else:
-        return 'text/plain'
+def is_fingerprinted(filename):
+    """Check for a content hash in the file name, e.g. chunk-ZLVXN7CX.js from the Angular build"""
+    name = filename.rsplit("/", 1)[-1].split(".", 1)[0]
+    if "-" not in name:
+        return False
+    digest = name.rsplit("-", 1)[1]
+    return len(digest) >= 8 and all(c.isdigit() or c.isupper() for c in digest)
+
+def get_cache_control(filename):
+    """Hashed bundles never change under the same name, everything else is revalidated via ETag"""
+    if is_fingerprinted(filename):
+        return "public, max-age=31536000, immutable"
+    return "no-cache"
+
+def is_not_modified(request, etag, last_modified):
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current validators"""
+    if_none_match = request.get_header(b"if-none-match")
+    if if_none_match is not None:
+        for tag in if_none_match.decode().split(","):
+            tag = tag.strip()
+            if tag == "*" or tag == etag or tag == "W/" + etag:
+                return True
+        return False
+    # browsers echo the Last-Modified value back verbatim, so no date parsing is needed
+    return request.get_header(b"if-modified-since") == last_modified.encode()
+
+def get_range(request, file_size, etag, last_modified):
+    """Parse a single "Range: bytes=first-last" header
+
+    Returns (first, last) for a satisfiable range, None when the whole file must be sent
+    (no range, multiple ranges, stale If-Range or unparsable) and False when unsatisfiable.
+    """
+    value = request.get_header(b"range")
+    if value is None or not value.startswith(b"bytes=") or b"," in value:
+        return None
+    if_range = request.get_header(b"if-range")
+    if if_range is not None and if_range.decode() not in (etag, last_modified):
+        return None
+    try:
+        first, last = value[6:].split(b"-", 1)
+        if not first.strip():
+            # suffix range: the last N bytes
+            first = max(file_size - int(last), 0)
+            if first == file_size:
+                return False
+            last = file_size - 1
+        else:
+            first = int(first)
+            last = min(int(last), file_size - 1) if last.strip() else file_size - 1
+    except ValueError:
+        return None
+    if first > last or first >= file_size:
+        return False
+    return first, last
+
+def accepts_gzip(request):
+    """Check if the client accepts gzip content encoding (and did not rate it q=0)"""
+    for encoding in request.get_header(b"accept-encoding", b"").split(b","):
+        params = encoding.split(b";")
+        if params[0].strip() == b"gzip":
+            for param in params[1:]:
+                param = param.strip()
+                if param.startswith(b"q="):
+                    try:
+                        return float(param[2:]) > 0
+                    except ValueError:
+                        return False
+            return True
+    return False
 
-async def serve_file_chunked(writer, file_path, content_type):
-    """Serve files with chunked delivery for memory efficiency"""
+async def serve_file_chunked(writer, request, path, entry):
+    """Serve files with chunked delivery for memory efficiency
+
+    entry is the static_files manifest entry of path, so no filesystem access is needed before opening the file
+    """
+    response = None
+    file_path = get_web_root() + path
     try:
-        # Get file size
-        file_size = os.stat(file_path)[6]
+        content_type, file_size, etag, last_modified, gz = entry
+        headers = {"Vary": "Accept-Encoding", "Cache-Control": get_cache_control(path)}
+
+        # Prefer a precompressed .gz sidecar created at deploy time, it has its own ETag
+        if gz is not None and accepts_gzip(request):
+            file_path += ".gz"
+            file_size, etag, last_modified = gz
+            headers["Content-Encoding"] = "gzip"
+
+        headers["ETag"] = etag
+        headers["Last-Modified"] = last_modified
+
+        if is_not_modified(request, etag, last_modified):
+            response = HTTPResponse(304, None, close=False, header=headers)
+            await response.send(writer)
+            return
+
+        # Resumable downloads and parallel fetches ask for a byte window of the file
+        headers["Accept-Ranges"] = "bytes"
+        status = 200
+        offset = 0
+        length = file_size
+        byte_range = get_range(request, file_size, etag, last_modified)
+        if byte_range is False:
+            response = HTTPResponse(416, None, close=False,
+                                    header={"Content-Range": f"bytes */{file_size}", "Content-Length": 0})
+            await response.send(writer)
+            return
+        if byte_range:
+            status = 206
+            offset = byte_range[0]
+            length = byte_range[1] - offset + 1
+            headers["Content-Range"] = f"bytes {offset}-{byte_range[1]}/{file_size}"
+        headers["Content-Length"] = length
+
+        # Hot files come from RAM, the ETag changes with the file so stale content is never served
+        data = file_cache.get(file_path, etag, file_size)
 
         # Log file access
         if file_size > LARGE_FILE_THRESHOLD:
-            print(f"Loading large file {file_path} ({file_size} bytes)")
+            logger.info("Loading large file %s (%d bytes%s)", file_path, file_size, ", cached" if data is not None else "")
 
         # Set response headers
-        response = HTTPResponse(200, content_type, close=True)
+        response = HTTPResponse(status, content_type, close=False, header=headers)
         await response.send(writer)
 
-        # Use the efficient sendfile function for chunked transfer
-        await sendfile(writer, file_path)
+        if data is not None:
+            sent, rate = await sendbuffer(writer, data, offset, length, SEND_BUFFER_SIZE)
+        else:
+            # Use the efficient sendfile function for chunked transfer
+            sent, rate = await sendfile(writer, file_path, send_buffers, offset, length)
         await writer.drain()
 
+        if file_size > LARGE_FILE_THRESHOLD:
+            logger.info("Sent %s (%d bytes, %d bytes/sec)", file_path, sent, rate)
+
     except Exception as e:
-        print(f"Error serving file {file_path}: {e}")
-        response = HTTPResponse(500, "application/json", close=True)
-        await response.send(writer)
-        writer.write(json.dumps({"error": "file read error"}))
-        await writer.drain()
+        logger.error("Error serving file %s: %s", file_path, e)
+        if response is None:
+            await FILE_READ_ERROR.send(writer)
+        else:
+            # Headers already sent, the body is incomplete so the connection must be closed
+            writer.keep_alive = False
 
 @app.route("GET", "/")
 async def serve_index(reader, writer, request):
     """Serve the main Angular application"""
     try:
-        web_root = get_web_root()
-        file_path = f'{web_root}/index.html'
-
-        # Check if file exists
-        try:
-            os.stat(file_path)
-            await serve_file_chunked(writer, file_path, 'text/html')
-        except:
+        entry = static_files.get('/index.html')
+        if entry is not None:
+            await serve_file_chunked(writer, request, '/index.html', entry)
+        else:
             # Fallback HTML if Angular files not found
             await serve_fallback_html(writer)
     except Exception as e:
-        print(f"Error serving index: {e}")
+        logger.error("Error serving index: %s", e)
         await serve_fallback_html(writer)
 
+fallback_response = None  # built on first use, the web root is only known after startup
+
 async def serve_fallback_html(writer):
     """Serve fallback HTML when Angular files are not found"""
+    global fallback_response
+    if fallback_response is None:
+        fallback_response = CannedResponse(200, "text/html", make_fallback_html().encode("utf-8"), close=False)
+    await fallback_response.send(writer)
+
+def make_fallback_html():
+    """Build the fallback page which lists the API endpoints"""
     web_root = get_web_root()
     storage_type = "SD card" if USE_SD_CARD else "flash memory"
-    fallback_html = f"""<!DOCTYPE html>
+    return f"""<!DOCTYPE html>
 <html>
 <head>
     <title>MCU Server</title>
@@ -855,139 +929,33 @@ async def serve_fallback_html(writer):
 </body>
 </html>"""
 
-    response = HTTPResponse(200, 'text/html', close=True)
-    await response.send(writer)
-    writer.write(fallback_html)
-    await writer.drain()
-
-# Custom request handler for static file serving
-original_handle_request = app._handle_request
-
-async def custom_handle_request(reader, writer):
-    """Custom request handler with catch-all static file serving"""
-    # Import required classes at the beginning to avoid import issues in exception handling
-    from ahttpserver import url
-    HTTPRequest = url.HTTPRequest
-    InvalidRequest = url.InvalidRequest
-
-    request = None  # Initialize request variable to prevent UnboundLocalError
-    try:
-        request_line = await asyncio.wait_for(reader.readline(), app.timeout)
-
-        if request_line in [b"", b"\r\n"]:
-            print(f"empty request line from {writer.get_extra_info('peername')[0]}")
-            return
-
-        print(f"request_line {request_line} from {writer.get_extra_info('peername')[0]}")
-
-        try:
-            request = HTTPRequest(request_line)
-        except InvalidRequest as e:
-            while True:
-                # read and discard header fields
-                if await asyncio.wait_for(reader.readline(), app.timeout) in [b"", b"\r\n"]:
-                    break
-            response = HTTPResponse(400, "text/plain", close=True)
-            await response.send(writer)
-            writer.write(repr(e).encode("utf-8"))
-            return
-        except Exception as e:
-            # Handle any other exception during request parsing
-            print(f"Error parsing request: {e}")
-            response = HTTPResponse(400, "text/plain", close=True)
-            await response.send(writer)
-            writer.write(b"Bad Request")
-            return
-
-        while True:
-            # read header fields and add name / value to dict 'header'
-            line = await asyncio.wait_for(reader.readline(), app.timeout)
-
-            if line in [b"", b"\r\n"]:
-                break
-            else:
-                if line.find(b":") != -1:
-                    name, value = line.split(b':', 1)
-                    request.header[name] = value.strip()
-
-        # Ensure request was successfully parsed before using it
-        if request is not None:
-            # search function which is connected to (method, path)
-            func = app._routes.get((request.method, request.path))
-            if func:
-                await func(reader, writer, request)
-            else:
-                # Handle static files for any unmatched GET request
-                if request.method == "GET" and not request.path.startswith("/api/"):
-                    await serve_static_file(reader, writer, request)
-                else:
-                    # Return 404 for non-GET requests or API paths not found
-                    response = HTTPResponse(404, "application/json", close=True)
-                    await response.send(writer)
-                    writer.write(json.dumps({"error": "not found"}))
-        else:
-            # Request parsing failed, send error response
-            response = HTTPResponse(400, "text/plain", close=True)
-            await response.send(writer)
-            writer.write(b"Bad Request")
-
-    except asyncio.TimeoutError:
-        pass
-    except Exception as e:
-        import errno
-        if type(e) is OSError and e.errno == errno.ECONNRESET:  # connection reset by client
-            pass
-        else:
-            print(f"Request handling error: {e}")
-    finally:
-        await writer.drain()
-        writer.close()
-        await writer.wait_closed()
+@app.fallback()
+async def serve_unrouted(reader, writer, request):
+    """Catch-all handler: static files for unmatched GET requests, 404 otherwise"""
+    if request.method == "GET" and not request.path.startswith("/api/"):
+        await serve_static_file(reader, writer, request)
+    else:
+        # Return 404 for non-GET requests or API paths not found
+        await NOT_FOUND.send(writer)
 
 async def serve_static_file(reader, writer, request):
     """Serve static files for any path not handled by API routes"""
     try:
-        web_root = get_web_root()
-        # Remove leading slash and clean the path
-        filename = request.path[1:] if request.path.startswith('/') else request.path
-
-        # Prevent directory traversal
-        if '..' in filename or filename.startswith('/'):
-            response = HTTPResponse(403, "application/json", close=True)
-            await response.send(writer)
-            writer.write(json.dumps({"error": "forbidden"}))
-            await writer.drain()
-            return
-
-        file_path = f'{web_root}/{filename}'
-
-        # Check if file exists
-        try:
-            os.stat(file_path)
-            # Determine content type based on file extension
-            content_type = get_content_type(filename)
-            await serve_file_chunked(writer, file_path, content_type)
-        except:
+        # Only files listed in the manifest are served, which also rules out directory traversal
+        path = request.path
+        entry = static_files.get(path)
+        if entry is None:
             # If file not found, serve the main index.html for Angular routing
-            try:
-                index_path = f'{web_root}/index.html'
-                os.stat(index_path)
-                await serve_file_chunked(writer, index_path, 'text/html')
-            except:
-                response = HTTPResponse(404, "application/json", close=True)
-                await response.send(writer)
-                writer.write(json.dumps({"error": "file not found"}))
-                await writer.drain()
+            path = '/index.html'
+            entry = static_files.get(path)
+        if entry is not None:
+            await serve_file_chunked(writer, request, path, entry)
+        else:
+            await FILE_NOT_FOUND.send(writer)
 
     except Exception as e:
-        print(f"Error serving static file {request.path}: {e}")
-        response = HTTPResponse(500, "application/json", close=True)
-        await response.send(writer)
-        writer.write(json.dumps({"error": "server error"}))
-        await writer.drain()
-
-# Replace the server's request handler with our custom one
-app._handle_request = custom_handle_request
+        logger.error("Error serving static file %s: %s", request.path, e)
+        await SERVER_ERROR.send(writer)
 
 # ============================================================================
 # ===( Memory Management )====================================================
@@ -1001,12 +969,19 @@ def print_memory_info():
         micropython.mem_info()
     except:
         pass
+    print(f"File cache: {len(file_cache)} files, {file_cache.size} bytes, "
+          f"{file_cache.hits} hits, {file_cache.misses} misses, {file_cache.evictions} evictions")
 
 async def memory_management_task():
     """Background task for memory management"""
     while True:
         gc.collect()
         gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+        # Give cached files back when the application needs the memory
+        file_cache.trim()
+        # Pick up a static-manifest.json replaced by a new deployment
+        if static_files.refresh():
+            print(f"Reloaded static file manifest ({len(static_files)} files)")
         await asyncio.sleep(5)
 
 # ============================================================================
@@ -1039,6 +1014,16 @@ async def main():
     print("Static files served with async chunked streaming")
     print("Hardware: 3 LEDs (P006-P008), 2 Buttons (P009-P010), 6 PWM Lamps (P111-P115, P608)")
 
+    # Index the web files once, requests are then served without stat calls
+    if static_files.load():
+        print(f"Loaded static file manifest ({len(static_files)} files)")
+    else:
+        try:
+            static_files.build()
+            print(f"Built static file manifest ({len(static_files)} files)")
+        except OSError as e:
+            print(f"Could not index web files in {web_root}: {e}")
+
     # Print initial memory info
     print_memory_info()
 
@@ -1050,6 +1035,8 @@ async def main():
         print("Starting MCU Async HTTP Server...")
 
         # Create background tasks
+        logger.level = LOG_LEVEL
+        log_task = asyncio.create_task(logger.run())
         memory_task = asyncio.create_task(memory_management_task())
         server_task = asyncio.create_task(app.start())
 
@@ -1057,7 +1044,7 @@ async def main():
         print("Server is using asyncio for efficient memory usage")
 
         # Wait for tasks to complete (they run forever)
-        await asyncio.gather(memory_task, server_task)
+        await asyncio.gather(log_task, memory_task, server_task)
 
     except KeyboardInterrupt:
         print("Keyboard interrupt received")
@@ -621,8 +621,9 @@ def serve_index(microWebSrv2, request):
         request.Response.Return(200, fallback_html)
 
 @WebRoute(GET, '/<path:filename>')
-def serve_static_files(microWebSrv2, request, filename):
+def serve_static_files(microWebSrv2, request, args):
     """Serve static files with chunked streaming for memory efficiency"""
+    filename = args['filename']
     try:
         web_root = get_web_root()
         file_path = f'{web_root}/{filename}'
@@ -679,6 +680,9 @@ def main():
     # Configure for embedded use
     mws2.SetEmbeddedConfig()
 
+    # Only INFO and above, skips formatting and printing a line for every request
+    mws2.LogLevel = MicroWebSrv2.INFO
+
     # Set the root path for static files based on configuration
     web_root = get_web_root()
     mws2._rootPath = web_root
@@ -12,8 +12,8 @@ from MicroWebSrv2 import *
 
 # File serving configuration - easily adjustable thresholds
 LARGE_FILE_THRESHOLD = 50000    # 50KB - threshold for logging large file access
-HUGE_FILE_THRESHOLD = 300000    # 300KB - threshold for network optimization headers
-CHUNK_SIZE = 32768              # 32KB - chunk size for fallback chunked reading
+FILE_CACHE_BUDGET = 262144      # 256KB - RAM used to keep hot static files out of SD card reads
+FILE_CACHE_MAX_SIZE = 131072    # 128KB - larger files are always streamed from storage
 
 # Web files storage configuration
 USE_SD_CARD = True              # True = use SD card (/sd/www), False = use flash memory (/www)
@@ -688,69 +688,13 @@ def serve_file_chunked(request, file_path, content_type):
 
         # Log file access
         if file_size > LARGE_FILE_THRESHOLD:
-            print(f"Loading large file {file_path} ({file_size} bytes) - reading entire file at once")
+            print(f"Streaming large file {file_path} ({file_size} bytes)")
 
-        # Read entire file at once - we tested that MCU can allocate up to 7.5MB
-        try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
-
-            print(f"Successfully loaded {len(content)} bytes into memory")
-
-            # Set content type and headers
-            request.Response.ContentType = content_type
-
-            # For large files, add network optimization headers
-            if len(content) > HUGE_FILE_THRESHOLD:
-                print(f"Large file ({len(content)} bytes) - optimizing network transmission")
-                request.Response.SetHeader('Connection', 'close')  # Close connection after transfer
-                request.Response.SetHeader('Accept-Ranges', 'none')  # Disable range requests to simplify
-
-            request.Response.SetHeader('Cache-Control', 'public, max-age=3600')
-            request.Response.Return(200, content)
-
-        except MemoryError as e:
-            print(f"Memory error loading {file_path}: {e}")
-            print("Falling back to chunked reading...")
-
-            # Fallback to chunked reading only if memory allocation fails
-            try:
-                content_parts = []
-                bytes_read = 0
-
-                with open(file_path, 'rb') as f:
-                    while bytes_read < file_size:
-                        remaining = min(CHUNK_SIZE, file_size - bytes_read)
-                        chunk = f.read(remaining)
-
-                        if not chunk:
-                            break
-
-                        content_parts.append(chunk)
-                        bytes_read += len(chunk)
-
-                        # Less frequent garbage collection
-                        if len(content_parts) % 10 == 0:
-                            gc.collect()
-
-                    # Join all parts
-                    content = b''.join(content_parts)
-                    content_parts.clear()
-                    gc.collect()
-
-                request.Response.ContentType = content_type
-                request.Response.SetHeader('Cache-Control', 'public, max-age=3600')
-                request.Response.Return(200, content)
-
-            except Exception as fallback_error:
-                print(f"Fallback chunked reading also failed: {fallback_error}")
-                gc.collect()
-                request.Response.ReturnJSON(500, {"error": "file read error"})
-
-        except Exception as e:
-            print(f"Error reading file {file_path}: {e}")
-            gc.collect()
-            request.Response.ReturnJSON(500, {"error": "file read error"})
+        # ReturnFile streams through the connection's send buffer instead of loading the file into RAM,
+        # and answers Range requests with 206 so interrupted transfers can resume
+        request.Response.ContentType = content_type
+        request.Response.AllowCaching = True
+        request.Response.ReturnFile(file_path)
 
     except Exception as e:
         print(f"Error serving file {file_path}: {e}")
@@ -797,8 +741,9 @@ def serve_index(microWebSrv2, request):
         request.Response.Return(200, fallback_html)
 
 @WebRoute(GET, '/<path:filename>')
-def serve_static_files(microWebSrv2, request, filename):
+def serve_static_files(microWebSrv2, request, args):
     """Serve static files with chunked streaming for memory efficiency"""
+    filename = args['filename']
     try:
         web_root = get_web_root()
         file_path = f'{web_root}/{filename}'
@@ -830,7 +775,10 @@ def serve_static_files(microWebSrv2, request, filename):
 # ===( Memory Management )====================================================
 # ============================================================================
 
-def print_memory_info():
+# Recently served static files kept in RAM, keyed by path and mtime
+file_cache = FileCache(budget=FILE_CACHE_BUDGET, maxSize=FILE_CACHE_MAX_SIZE)
+
+def print_memory_info(mws2=None):
     """Print current memory usage for debugging"""
     try:
         import micropython
@@ -838,6 +786,17 @@ def print_memory_info():
         micropython.mem_info()
     except:
         pass
+    print(f"File cache: {len(file_cache)} files, {file_cache.Size} bytes, "
+          f"{file_cache.Hits} hits, {file_cache.Misses} misses, {file_cache.Evictions} evictions")
+    slots = mws2.BufferSlots if mws2 else None
+    if slots:
+        print(f"Buffer slots: {slots.InUseCount}/{slots.SlotsCount} in use, "
+              f"high-water {slots.HighWaterMark}, exhausted {slots.ExhaustedCount} times")
+    workers = mws2.Workers if mws2 else None
+    if workers and workers.JobsDoneCount:
+        print(f"Workers: {workers.Count} ({workers.MinCount}-{workers.MaxCount}), {workers.JobsDoneCount} jobs, "
+              f"avg wait {workers.JobsWaitSec / workers.JobsDoneCount * 1000:.1f} ms, "
+              f"avg run {workers.JobsRunSec / workers.JobsDoneCount * 1000:.1f} ms")
 
 # ============================================================================
 # ===( Server Startup )=======================================================
@@ -855,6 +814,9 @@ def main():
     # Configure for embedded use
     mws2.SetEmbeddedConfig()
 
+    # Only INFO and above, skips formatting and printing a line for every request
+    mws2.LogLevel = MicroWebSrv2.INFO
+
     # Set the root path for static files based on configuration
     web_root = get_web_root()
     mws2._rootPath = web_root
@@ -865,6 +827,9 @@ def main():
     # Allow all origins for CORS
     mws2.AllowAllOrigins = True
 
+    # Serve hot static files from RAM instead of reading them again from storage
+    mws2.FileCache = file_cache
+
     print("Server configuration:")
     print(f"  Network: {'WiFi' if USE_WIFI else 'Ethernet'}")
     print(f"  IP Address: {net_cfg[0]}")
@@ -901,7 +866,7 @@ def main():
 
     except Exception as e:
         print(f"Server error: {e}")
-        print_memory_info()
+        print_memory_info(mws2)
     finally:
         print("Stopping server...")
         try:
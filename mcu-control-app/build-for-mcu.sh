@@ -22,6 +22,15 @@ if [ $? -eq 0 ]; then
     
     # Copy build files to deployment directory
     cp -r dist/mcu-control-app/* deployment/www/
+
+    # Precompressed sidecars, served instead of the original to clients accepting gzip
+    echo "🗜️  Creating gzip sidecars for text assets..."
+    find deployment/www -type f \( -name '*.html' -o -name '*.js' -o -name '*.css' -o -name '*.svg' -o -name '*.json' -o -name '*.ico' \) \
+        -exec gzip -9 -k -n -f {} \;
+
+    # File index loaded at boot, so requests are served without stat calls on the device
+    echo "🗂️  Writing static file manifest..."
+    python3 ../ahttpserver/manifest.py deployment/www
     
     echo "📁 Deployment files ready in: deployment/www/"
     echo ""